@@ -1,11 +1,38 @@
 from django.contrib import admin
-from .models import Consulta
+from .models import Consulta, ConsultaNarrativa, Operador, Sustancia, Tarea
+
+
+class ConsultaNarrativaInline(admin.StackedInline):
+    model = ConsultaNarrativa
+    can_delete = False
 
 
 @admin.register(Consulta)
 class ConsultaAdmin(admin.ModelAdmin):
     list_display = ['fecha', 'zona', 'operador', 'apellido_nombre_usuario', 'consulta', 'ciudad']
     list_filter = ['zona', 'consulta', 'sexo', 'tiempo_consumo', 'tratamiento_anterior', 'fecha']
-    search_fields = ['apellido_nombre_usuario', 'apellido_nombre_interlocutor', 'ciudad', 'operador']
+    list_select_related = ['operador']
+    search_fields = ['apellido_nombre_usuario', 'apellido_nombre_interlocutor', 'ciudad', 'operador__nombre']
     date_hierarchy = 'fecha'
     ordering = ['-fecha']
+    inlines = [ConsultaNarrativaInline]
+
+
+@admin.register(Operador)
+class OperadorAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'usuario']
+    list_select_related = ['usuario']
+    search_fields = ['nombre']
+
+
+@admin.register(Sustancia)
+class SustanciaAdmin(admin.ModelAdmin):
+    list_display = ['nombre']
+    search_fields = ['nombre']
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'procesadas', 'total', 'creado_por', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['tipo', 'estado']
+    readonly_fields = ['procesadas', 'total', 'archivo', 'resultado', 'error', 'fecha_creacion', 'fecha_inicio', 'fecha_fin']
@@ -0,0 +1,233 @@
+"""
+Benchmark de las vistas y procesos principales.
+
+Cada escenario hace un request con el cliente de pruebas de Django (o llama a
+la función correspondiente) varias veces y registra la duración y las
+consultas SQL de cada repetición. Los resultados se guardan en JSON para
+compararlos entre corridas: cada cambio de rendimiento se mide contra una
+corrida anterior sobre los mismos datos.
+
+La importación se mide dentro de una transacción que se revierte, así que el
+benchmark no modifica los datos.
+"""
+import csv
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .cache import invalidar_datos
+from .datos_sinteticos import asegurar_operadores, consulta_al_azar
+from .graficos import CACHE_GRAFICOS, GRAFICOS
+from .importacion import COLUMNAS_CSV, importar_csv
+from .metricas import MedicionSQL, percentil
+from .models import Consulta
+from .paginacion import PaginadorCursor
+
+
+USUARIO_BENCHMARK = 'benchmark_admin'
+
+FILAS_IMPORTACION = 2000
+
+
+class Escenario:
+    """Un caso medido: `ejecutar` devuelve opcionalmente un dict con datos extra (bytes, filas)"""
+
+    def __init__(self, nombre, ejecutar, preparar=None):
+        self.nombre = nombre
+        self.ejecutar = ejecutar
+        self.preparar = preparar
+
+
+def medir(escenario, repeticiones):
+    """Ejecuta el escenario `repeticiones` veces y resume duración y consultas SQL"""
+    duraciones = []
+    consultas_sql = []
+    extra = {}
+    for _ in range(repeticiones):
+        if escenario.preparar:
+            escenario.preparar()
+        medicion = MedicionSQL()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medicion))
+            inicio = time.perf_counter()
+            extra = escenario.ejecutar() or {}
+            duraciones.append(time.perf_counter() - inicio)
+        consultas_sql.append(medicion.consultas)
+
+    duraciones.sort()
+    resultado = {
+        'repeticiones': repeticiones,
+        'min_ms': round(duraciones[0] * 1000, 2),
+        'mediana_ms': round(statistics.median(duraciones) * 1000, 2),
+        'p90_ms': round(percentil(duraciones, 0.9) * 1000, 2),
+        'max_ms': round(duraciones[-1] * 1000, 2),
+        'consultas_sql': max(consultas_sql),
+    }
+    resultado.update(extra)
+    if 'filas' in extra:
+        resultado['filas_por_segundo'] = round(extra['filas'] / statistics.median(duraciones), 1)
+    return resultado
+
+
+def obtener(cliente, url, **parametros):
+    """Hace un GET y consume la respuesta completa (también si es por streaming); devuelve los bytes"""
+    respuesta = cliente.get(url, parametros)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f'{url} respondió {respuesta.status_code}')
+    if respuesta.streaming:
+        tamanio = sum(len(bloque) for bloque in respuesta.streaming_content)
+    else:
+        tamanio = len(respuesta.content)
+    return {'bytes': tamanio}
+
+
+def escribir_csv_importacion(ruta, filas, semilla=1):
+    """Escribe un CSV con el formato del formulario de carga con consultas sintéticas"""
+    rng = random.Random(semilla)
+    operadores = asegurar_operadores()
+    hoy = datetime.now().date()
+    campos = list(COLUMNAS_CSV.items())
+    with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+        writer = csv.writer(archivo)
+        writer.writerow([columna for columna, _ in campos])
+        for _ in range(filas):
+            consulta = consulta_al_azar(rng, hoy, rng.choice(operadores))
+            valores = []
+            for _, campo in campos:
+                valor = getattr(consulta, campo)
+                valores.append(valor.strftime('%d/%m/%Y') if campo == 'fecha' else ('' if valor is None else valor))
+            writer.writerow(valores)
+
+
+def medir_importacion(ruta):
+    """Importa el CSV dentro de una transacción que se revierte"""
+    with transaction.atomic():
+        resumen = importar_csv(ruta)
+        transaction.set_rollback(True)
+    # La versión de la caché sí se incrementó: no afecta a los datos
+    invalidar_datos()
+    return {'filas': resumen['creadas']}
+
+
+def escenarios(cliente, ruta_importacion, filas_importacion):
+    """Escenarios del benchmark en el orden en que se ejecutan"""
+    operador = (
+        Consulta.objects.filter(operador__usuario__isnull=False).order_by().values('operador')
+        .annotate(cantidad=Count('id')).order_by('-cantidad').values_list('operador', flat=True).first()
+    )
+    operador = User.objects.filter(operador__pk=operador).first()
+    cliente_operador = Client()
+    if operador:
+        cliente_operador.force_login(operador)
+
+    ultima = Consulta.objects.order_by('-fecha').values_list('fecha', flat=True).first()
+    filtros = {'zona': 'Sur', 'sexo': 'Mujer'}
+    if ultima:
+        filtros['fecha_desde'] = ultima.replace(day=1, month=1).isoformat()
+
+    # Cursor de la segunda página, para medir una página que no es la primera
+    cursor = PaginadorCursor(Consulta.objects.all()).get_page().cursor_siguiente
+    segunda_pagina = {'cursor': cursor} if cursor else {}
+
+    def pedir_graficos():
+        tamanio = 0
+        for nombre in GRAFICOS:
+            tamanio += obtener(cliente, reverse('grafico_informes', args=[nombre]))['bytes']
+        return {'bytes': tamanio}
+
+    lista = [
+        Escenario('informes', lambda: obtener(cliente, reverse('informes'))),
+        Escenario('informes_filtrado', lambda: obtener(cliente, reverse('informes'), **filtros)),
+        Escenario('informes_segunda_pagina', lambda: obtener(cliente, reverse('informes'), **segunda_pagina)),
+        Escenario('informes_graficos_sin_cache', pedir_graficos, preparar=CACHE_GRAFICOS.limpiar),
+        Escenario('informes_graficos_con_cache', pedir_graficos),
+        Escenario('cargar_consulta_formulario', lambda: obtener(cliente, reverse('cargar_consulta'))),
+        # Exportación filtrada (zona, sexo y último año): acota la duración con muchos datos
+        Escenario('exportar_csv', lambda: obtener(cliente, reverse('exportar_datos'), **filtros)),
+    ]
+    if operador:
+        lista += [
+            Escenario('mis_consultas', lambda: obtener(cliente_operador, reverse('mis_consultas'))),
+            Escenario('mis_consultas_busqueda', lambda: obtener(cliente_operador, reverse('mis_consultas'), q='alcohol rosario')),
+        ]
+    if filas_importacion:
+        lista.append(Escenario('importacion_csv', lambda: medir_importacion(ruta_importacion)))
+    return lista
+
+
+def version_git():
+    """Commit actual del repositorio, si está disponible"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def ejecutar_benchmark(repeticiones=5, solo=None, filas_importacion=FILAS_IMPORTACION, progreso=None):
+    """
+    Ejecuta los escenarios (todos, o los de `solo`) y devuelve los resultados.
+    `progreso`, si se indica, se llama con (nombre del escenario, resultado).
+    """
+    admin, creado = User.objects.get_or_create(username=USUARIO_BENCHMARK, defaults={'is_staff': True})
+    if creado:
+        admin.set_unusable_password()
+        admin.save(update_fields=['password'])
+    cliente = Client()
+    cliente.force_login(admin)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio, override_settings(ALLOWED_HOSTS=['testserver']):
+        ruta_importacion = os.path.join(directorio, 'importacion.csv')
+        if filas_importacion and (not solo or 'importacion_csv' in solo):
+            escribir_csv_importacion(ruta_importacion, filas_importacion)
+        for escenario in escenarios(cliente, ruta_importacion, filas_importacion):
+            if solo and escenario.nombre not in solo:
+                continue
+            # Una ejecución previa sin medir: carga plantillas, módulos y caché de la base
+            if escenario.preparar:
+                escenario.preparar()
+            escenario.ejecutar()
+            resultados[escenario.nombre] = medir(escenario, repeticiones)
+            if progreso:
+                progreso(escenario.nombre, resultados[escenario.nombre])
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': version_git(),
+        'motor': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'consultas': Consulta.objects.count(),
+        'repeticiones': repeticiones,
+        'resultados': resultados,
+    }
+
+
+def comparar(anterior, actual, clave='mediana_ms'):
+    """Filas (escenario, valor anterior, valor actual, variación %) de los escenarios en común"""
+    filas = []
+    for nombre, resultado in actual['resultados'].items():
+        previo = anterior.get('resultados', {}).get(nombre)
+        # Con otra cantidad de filas (importación) las duraciones no son comparables
+        if not previo or clave not in previo or previo.get('filas') != resultado.get('filas'):
+            continue
+        variacion = (resultado[clave] - previo[clave]) / previo[clave] * 100 if previo[clave] else None
+        filas.append((nombre, previo[clave], resultado[clave], variacion))
+    return filas
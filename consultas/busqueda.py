@@ -0,0 +1,227 @@
+"""
+Búsqueda de texto libre sobre las consultas.
+
+- SQLite: tabla virtual FTS5 (consultas_consulta_busqueda) con tokenizador
+  unicode61 sin acentos, mantenida por triggers sobre consultas_consulta y
+  consultas_consultanarrativa.
+- PostgreSQL: índices GIN sobre to_tsvector con la configuración consultas_es
+  (español + unaccent), uno por tabla; cada palabra debe aparecer en alguna
+  de las dos.
+- Otros motores: icontains sobre cada columna.
+
+Cada palabra buscada se trata como prefijo y todas deben aparecer.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import CAMPOS_NARRATIVA
+
+
+# Columnas indexadas para la búsqueda de texto libre
+CAMPOS_BUSQUEDA = [
+    'apellido_nombre_usuario',
+    'apellido_nombre_interlocutor',
+    'dni',
+    'ciudad',
+    'barrio',
+    'telefono',
+    'telefono_interlocutor',
+    'motivo_consulta',
+    'tipo_sustancia',
+    'intervencion_propuesta',
+    'zona',
+    'consulta',
+    'caracteristica_judicial',
+]
+
+TABLA_FTS = 'consultas_consulta_busqueda'
+CONFIGURACION_PG = 'consultas_es'
+
+
+def separar_palabras(texto):
+    """Separa el texto buscado en palabras, descartando signos de puntuación"""
+    return re.findall(r'\w+', texto or '')
+
+
+# --- SQLite (FTS5) ---------------------------------------------------------
+
+def sql_fila_fts(condicion):
+    """INSERT de la fila FTS5 de las consultas que cumplen `condicion`, uniendo consulta y narrativa"""
+    columnas = ', '.join(CAMPOS_BUSQUEDA)
+    valores = ', '.join(f'n.{campo}' if campo in CAMPOS_NARRATIVA else f'c.{campo}' for campo in CAMPOS_BUSQUEDA)
+    return (
+        f'INSERT INTO {TABLA_FTS}(rowid, {columnas}) SELECT c.id, {valores} '
+        f'FROM consultas_consulta c LEFT JOIN consultas_consultanarrativa n ON n.consulta_id = c.id WHERE {condicion}'
+    )
+
+
+def sql_triggers_sqlite():
+    """
+    Sentencias que crean los triggers que mantienen sincronizada la tabla FTS5.
+    Cada cambio en una consulta o en su narrativa vuelve a armar la fila completa.
+    """
+    columnas_consulta = ', '.join(campo for campo in CAMPOS_BUSQUEDA if campo not in CAMPOS_NARRATIVA)
+    columnas_narrativa = ', '.join(campo for campo in CAMPOS_BUSQUEDA if campo in CAMPOS_NARRATIVA)
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON consultas_consulta BEGIN
+            {sql_fila_fts('c.id = new.id')};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON consultas_consulta BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF {columnas_consulta} ON consultas_consulta BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+            {sql_fila_fts('c.id = new.id')};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_narrativa_ai AFTER INSERT ON consultas_consultanarrativa BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = new.consulta_id;
+            {sql_fila_fts('c.id = new.consulta_id')};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_narrativa_ad AFTER DELETE ON consultas_consultanarrativa BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.consulta_id;
+            {sql_fila_fts('c.id = old.consulta_id')};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_narrativa_au AFTER UPDATE OF {columnas_narrativa} ON consultas_consultanarrativa BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.consulta_id;
+            {sql_fila_fts('c.id = new.consulta_id')};
+        END""",
+    ]
+
+
+def reconstruir_indice_sqlite(cursor):
+    """Vuelve a cargar la tabla FTS5 completa desde consultas_consulta y sus narrativas"""
+    cursor.execute(f'DELETE FROM {TABLA_FTS}')
+    cursor.execute(sql_fila_fts('1 = 1'))
+
+
+def asegurar_indice_busqueda(sender, using='default', **kwargs):
+    """
+    Recrea los triggers de búsqueda si faltan (post_migrate).
+
+    En SQLite, las migraciones que reconstruyen consultas_consulta (o la tabla
+    de narrativas) eliminan sus triggers; en ese caso se recrean y se recarga
+    el índice completo.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # Sin la tabla FTS o la de narrativas (migraciones a medio aplicar) no hay nada que recrear
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, 'consultas_consultanarrativa')",
+            [TABLA_FTS],
+        )
+        if cursor.fetchone()[0] < 2:
+            return
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{TABLA_FTS}_%'])
+        if cursor.fetchone()[0] == len(sql_triggers_sqlite()):
+            return
+        for sentencia in sql_triggers_sqlite():
+            cursor.execute(sentencia)
+        reconstruir_indice_sqlite(cursor)
+
+
+def expresion_fts(palabras, campos=None):
+    """Arma la expresión MATCH de FTS5: todas las palabras como prefijo, opcionalmente en ciertas columnas"""
+    expresion = ' AND '.join('"{}"*'.format(palabra.replace('"', '""')) for palabra in palabras)
+    if campos:
+        expresion = '{%s} : (%s)' % (' '.join(campos), expresion)
+    return expresion
+
+
+def buscar_sqlite(queryset, palabras, campos, ordenar):
+    expresion = expresion_fts(palabras, campos)
+    if not ordenar:
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [expresion]
+        ))
+    # Con orden por relevancia, la tabla FTS5 se une una sola vez: el MATCH se
+    # resuelve con su índice y el rango (bm25, más bajo es más relevante) se lee
+    # de la fila unida, en lugar de repetir el MATCH por cada consulta candidata
+    return queryset.extra(
+        tables=[TABLA_FTS],
+        where=[f'consultas_consulta.id = +{TABLA_FTS}.rowid', f'{TABLA_FTS} MATCH %s'],
+        params=[expresion],
+    ).annotate(
+        rango=RawSQL(f'{TABLA_FTS}.rank', [], output_field=FloatField()),
+    ).order_by('rango', '-fecha', '-marca_temporal')
+
+
+# --- PostgreSQL (tsvector) -------------------------------------------------
+
+def sql_documento_pg(campos, tabla):
+    """Expresión tsvector de las columnas; con todas las de la tabla coincide con la de su índice GIN"""
+    texto = " || ' ' || ".join(f"coalesce({tabla}.{campo}, '')" for campo in campos)
+    return f"to_tsvector('{CONFIGURACION_PG}'::regconfig, {texto})"
+
+
+def buscar_postgresql(queryset, palabras, campos, ordenar):
+    campos = campos or CAMPOS_BUSQUEDA
+    campos_consulta = [campo for campo in campos if campo not in CAMPOS_NARRATIVA]
+    campos_narrativa = [campo for campo in campos if campo in CAMPOS_NARRATIVA]
+    documento = sql_documento_pg(campos_consulta, 'consultas_consulta') if campos_consulta else None
+    documento_narrativa = sql_documento_pg(campos_narrativa, 'consultas_consultanarrativa') if campos_narrativa else None
+    tsquery = f"to_tsquery('{CONFIGURACION_PG}'::regconfig, %s)"
+
+    # Cada palabra en la consulta o en su narrativa: cada lado usa su índice
+    for palabra in palabras:
+        partes = []
+        if documento:
+            partes.append(f'{documento} @@ {tsquery}')
+        if documento_narrativa:
+            partes.append(
+                f'consultas_consulta.id IN (SELECT consulta_id FROM consultas_consultanarrativa '
+                f'WHERE {documento_narrativa} @@ {tsquery})'
+            )
+        condicion = '(' + ' OR '.join(partes) + ')'
+        queryset = queryset.filter(RawSQL(condicion, [f'{palabra}:*'] * len(partes), output_field=BooleanField()))
+
+    if ordenar:
+        # ts_rank sobre el documento completo: valores más altos son más relevantes
+        documentos = [documento] if documento else []
+        if documento_narrativa:
+            documentos.append(
+                f'coalesce((SELECT {documento_narrativa} FROM consultas_consultanarrativa '
+                f"WHERE consulta_id = consultas_consulta.id), ''::tsvector)"
+            )
+        documento_completo = ' || '.join(documentos)
+        consulta_ts = ' & '.join(f'{palabra}:*' for palabra in palabras)
+        queryset = queryset.annotate(rango=RawSQL(
+            f'ts_rank({documento_completo}, {tsquery})', [consulta_ts], output_field=FloatField(),
+        )).order_by('-rango', '-fecha', '-marca_temporal')
+    return queryset
+
+
+# --- Otros motores ---------------------------------------------------------
+
+def buscar_icontains(queryset, palabras, campos, ordenar):
+    for palabra in palabras:
+        condicion = Q()
+        for campo in campos or CAMPOS_BUSQUEDA:
+            ruta = f'narrativa__{campo}' if campo in CAMPOS_NARRATIVA else campo
+            condicion |= Q(**{f'{ruta}__icontains': palabra})
+        queryset = queryset.filter(condicion)
+    return queryset
+
+
+BACKENDS = {
+    'sqlite': buscar_sqlite,
+    'postgresql': buscar_postgresql,
+}
+
+
+def buscar(queryset, texto, campos=None, ordenar=True):
+    """
+    Filtra el queryset por texto libre usando el índice de búsqueda del motor.
+
+    Con `campos` la búsqueda se limita a esas columnas de CAMPOS_BUSQUEDA; con
+    `ordenar` los resultados se ordenan por relevancia (anotada como `rango`).
+    """
+    palabras = separar_palabras(texto)
+    if not palabras:
+        return queryset.none()
+    backend = BACKENDS.get(connections[queryset.db].vendor, buscar_icontains)
+    return backend(queryset, palabras, campos, ordenar)
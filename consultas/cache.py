@@ -0,0 +1,104 @@
+"""
+Caché de datos derivados de las consultas.
+
+Todo lo cacheado se guarda con la versión actual de los datos; las señales de
+Consulta reemplazan esa versión por una nueva, por lo que cualquier escritura
+invalida de una vez todas las entradas anteriores sin tener que borrarlas.
+La versión es un valor al azar escrito con cache.set y no un contador: en la
+caché de archivos incr no es atómico entre procesos y dos invalidaciones
+simultáneas podían dejar la misma versión; con set, gane la que gane, la
+versión es distinta de todas las anteriores.
+
+CacheLRU es una caché en memoria del proceso, con vencimiento y desalojo de la
+entrada menos usada, para valores caros de serializar que se piden muchas veces
+seguidas (los gráficos del panel de informes).
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+CLAVE_VERSION = 'consultas:version_datos'
+
+
+def version_datos():
+    """Devuelve la versión actual de los datos de consultas"""
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # add: si otro proceso la creó a la vez, todos usan la suya
+        cache.add(CLAVE_VERSION, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_datos():
+    """Reemplaza la versión de los datos por una nueva, invalidando todo lo cacheado"""
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, timeout=None)
+
+
+def obtener_cacheado(nombre, calcular, timeout=None):
+    """Devuelve el valor cacheado para la versión actual o lo calcula y lo guarda"""
+    return cache.get_or_set(f'consultas:{nombre}', calcular, timeout, version=version_datos())
+
+
+def clave_filtros(datos):
+    """Hash canónico de los datos limpios de un filtro: ignora vacíos y el orden de los campos"""
+    datos = {nombre: valor for nombre, valor in datos.items() if valor not in (None, '', [])}
+    texto = json.dumps(datos, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class CacheLRU:
+    """Caché en memoria con vencimiento por entrada y desalojo de la menos usada"""
+
+    def __init__(self, max_entradas=64, timeout=300):
+        self.max_entradas = max_entradas
+        self.timeout = timeout
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave, calcular):
+        """Devuelve el valor de la clave, o lo calcula y lo guarda si no está o venció"""
+        ahora = time.monotonic()
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self.entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+
+        # Se calcula fuera del lock; dos pedidos simultáneos pueden calcular lo mismo
+        valor = calcular()
+
+        with self.lock:
+            self.entradas[clave] = (time.monotonic() + self.timeout, valor)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+                self.desalojos += 1
+        return valor
+
+    def limpiar(self):
+        with self.lock:
+            self.entradas.clear()
+
+    def estadisticas(self):
+        """Aciertos, fallos, desalojos y entradas actuales"""
+        with self.lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self.entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else None,
+            }
@@ -0,0 +1,261 @@
+"""
+Generador de consultas sintéticas para medir el rendimiento a escala.
+
+Las consultas se generan con distribuciones parecidas a las reales (zona,
+sexo, edades, ciudades, sustancias, operadores y textos libres) y se insertan
+con bulk_create en lotes ordenados por fecha, de modo que cada lote toca pocos
+días del resumen diario. Con la misma semilla se generan los mismos datos.
+
+Las consultas sintéticas llevan una huella que empieza con PREFIJO_HUELLA
+(que no puede aparecer en una huella SHA-256 real), para poder borrarlas
+junto con los usuarios y operadores sintéticos.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import invalidar_datos
+from .edades import asignar_edades
+from .models import (
+    Consulta, Operador, actualizar_resumen_diario, guardar_narrativas, operador_de_usuario, recalcular_resumen_pendiente,
+    sincronizar_sustancias,
+)
+
+
+PREFIJO_HUELLA = 'sint'
+
+TAMANIO_LOTE = 5000
+
+# (apellido, nombre) de los operadores sintéticos; se crean como usuarios con su operador
+OPERADORES = [
+    ('Vogel', 'Gonzalo'), ('Botta', 'Gabriela'), ('Ferreyra', 'Lucía'), ('Acosta', 'Martín'),
+    ('Benítez', 'Carla'), ('Sosa', 'Julián'), ('Romero', 'Valeria'), ('Giménez', 'Pablo'),
+    ('Molina', 'Florencia'), ('Ríos', 'Emiliano'), ('Medina', 'Sofía'), ('Herrera', 'Nicolás'),
+]
+
+# Pocos operadores cargan la mayoría de las consultas
+PESOS_OPERADORES = [30, 28, 10, 8, 6, 5, 4, 3, 2, 2, 1, 1]
+
+CIUDADES = {
+    'Centro - Norte': [
+        ('Santa Fe', 40), ('Rafaela', 15), ('Reconquista', 10), ('Esperanza', 6), ('Santo Tomé', 8),
+        ('San Justo', 4), ('Vera', 3), ('Avellaneda', 4), ('Sunchales', 4), ('No especificada', 6),
+    ],
+    'Sur': [
+        ('Rosario', 50), ('Venado Tuerto', 10), ('Villa Gobernador Gálvez', 8), ('Casilda', 5),
+        ('Firmat', 3), ('Cañada de Gómez', 4), ('San Lorenzo', 6), ('Rufino', 2), ('No especificada', 6),
+    ],
+}
+
+BARRIOS = [
+    'Centro', 'Barrio Norte', 'San Martín', 'Belgrano', 'Villa del Parque', 'Las Flores', 'Alberdi',
+    'Candioti', 'Barranquitas', 'Empalme Graneros', 'Ludueña', 'Tablada', 'Las Delicias', 'Fisherton',
+]
+
+NOMBRES = [
+    'Juan', 'María', 'José', 'Ana', 'Carlos', 'Laura', 'Diego', 'Paula', 'Matías', 'Camila', 'Lucas',
+    'Micaela', 'Franco', 'Agustina', 'Leandro', 'Rocío', 'Facundo', 'Marina', 'Brian', 'Daiana',
+]
+
+APELLIDOS = [
+    'González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez', 'García',
+    'Sánchez', 'Romero', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores', 'Acosta', 'Benítez',
+]
+
+SUSTANCIAS = [('Alcohol', 45), ('Marihuana', 35), ('Cocaína', 35), ('Pasta base', 20), ('Tabaco', 12), ('Psicofármacos', 8)]
+
+VINCULOS = [('Madre', 40), ('Padre', 15), ('Hermano/a', 12), ('Pareja', 12), ('Hijo/a', 8), ('Amigo/a', 5), ('Institución', 8)]
+
+MOTIVOS = [
+    'Solicita información sobre tratamiento por consumo de {sustancia}.',
+    'Refiere consumo problemático de {sustancia} desde hace varios años.',
+    'Consulta por un familiar que consume {sustancia} y no quiere iniciar tratamiento.',
+    'Pide orientación para internación por consumo de {sustancia}.',
+    'Manifiesta angustia y deseos de dejar el consumo de {sustancia}.',
+    'Llama luego de un episodio de violencia asociado al consumo de {sustancia}.',
+]
+
+DETALLES = [
+    'Vive con su familia.', 'Se encuentra sin trabajo.', 'Tuvo tratamientos anteriores que abandonó.',
+    'Tiene hijos a cargo.', 'Refiere deudas por consumo.', 'Solicita que lo llamen más tarde.',
+    'Está en situación de calle.', 'Concurre a la escuela de manera irregular.',
+]
+
+INTERVENCIONES = [
+    'Se deriva a {efector} para admisión.', 'Se brinda contención y se acuerda nuevo llamado.',
+    'Se informa sobre dispositivos de atención cercanos ({efector}).', 'Se da aviso a guardia de {efector}.',
+    'Se orienta a la familia sobre cómo acompañar el tratamiento.',
+]
+
+EFECTORES = ['CAPS del barrio', 'Hospital Provincial', 'Centro de Día', 'Hospital Regional', 'Dispositivo territorial']
+
+OCUPACIONES = ['Desocupado/a', 'Albañil', 'Empleado/a de comercio', 'Estudiante', 'Changas', 'Ama de casa', 'Jubilado/a']
+
+OBRAS_SOCIALES = ['IAPOS', 'PAMI', 'OSDE', 'OSECAC', 'Swiss Medical', 'Incluir Salud']
+
+
+def elegir(rng, opciones):
+    """Elige una opción de una lista de (valor, peso)"""
+    valores, pesos = zip(*opciones)
+    return rng.choices(valores, weights=pesos)[0]
+
+
+def nombre_al_azar(rng):
+    return f'{rng.choice(APELLIDOS)} {rng.choice(NOMBRES)}'
+
+
+def telefono_al_azar(rng):
+    return f'{rng.choice(["342", "341", "3492", "3482"])}{rng.randint(4000000, 6999999)}'
+
+
+def nombre_usuario(apellido, nombre):
+    return f'op_{apellido}_{nombre}'.lower().translate(str.maketrans('áéíóúñ', 'aeioun'))
+
+
+def asegurar_operadores():
+    """Crea los usuarios y operadores sintéticos que falten; devuelve la lista de Operador"""
+    operadores = []
+    for apellido, nombre in OPERADORES:
+        username = nombre_usuario(apellido, nombre)
+        user, creado = User.objects.get_or_create(username=username, defaults={'first_name': nombre, 'last_name': apellido})
+        if creado:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        operadores.append(operador_de_usuario(user))
+    return operadores
+
+
+def consulta_al_azar(rng, fecha, operador):
+    """Arma una consulta sintética (sin guardar) para la fecha y el operador indicados"""
+    zona = elegir(rng, [('Centro - Norte', 55), ('Sur', 45)])
+    indirecta = rng.random() < 0.35
+    sexo = elegir(rng, [('Hombre', 62), ('Mujer', 34), ('Otro', 1), ('No corresponde', 2), ('No corresponde al tipo de llamada', 1)])
+    edad = max(12, min(80, int(rng.gauss(29, 11))))
+    nacimiento = fecha - timedelta(days=edad * 365 + rng.randint(0, 364))
+
+    cantidad_sustancias = elegir(rng, [(0, 8), (1, 55), (2, 27), (3, 10)])
+    sustancias = []
+    while len(sustancias) < cantidad_sustancias:
+        sustancia = elegir(rng, SUSTANCIAS)
+        if sustancia not in sustancias:
+            sustancias.append(sustancia)
+    principal = sustancias[0].lower() if sustancias else 'sustancias'
+
+    situaciones = [valor for valor, probabilidad in [
+        ('Situación de Calle', 0.08), ('Infancia', 0.06), ('Violencia', 0.12), ('Pueblos Originarios', 0.02), ('Judicializado', 0.07),
+    ] if rng.random() < probabilidad]
+    tratamiento = elegir(rng, [('SI', 35), ('No', 55), (None, 10)])
+    obra_social = elegir(rng, [('SI', 40), ('No', 50), (None, 10)])
+    escolarizado = elegir(rng, [('SI', 25), ('No', 60), (None, 15)])
+    efector = rng.choice(EFECTORES)
+
+    return Consulta(
+        fecha=fecha,
+        zona=zona,
+        operador=operador,
+        apellido_nombre_interlocutor=nombre_al_azar(rng),
+        consulta='Indirecta' if indirecta else 'Directa',
+        telefono_interlocutor=telefono_al_azar(rng),
+        tipo_vinculo=elegir(rng, VINCULOS) if indirecta else None,
+        motivo_consulta=' '.join([rng.choice(MOTIVOS).format(sustancia=principal)] + rng.sample(DETALLES, rng.randint(0, 3))),
+        apellido_nombre_usuario=nombre_al_azar(rng),
+        dni=str(rng.randint(20000000, 50000000)) if rng.random() < 0.7 else None,
+        fecha_nacimiento=nacimiento.strftime('%d/%m/%Y') if rng.random() < 0.6 else None,
+        edad=str(edad) if rng.random() < 0.85 else None,
+        sexo=sexo,
+        ciudad=elegir(rng, CIUDADES[zona]),
+        barrio=rng.choice(BARRIOS) if rng.random() < 0.6 else None,
+        direccion=f'Calle {rng.randint(1, 300)} {rng.randint(100, 9999)}' if rng.random() < 0.4 else None,
+        telefono=telefono_al_azar(rng) if rng.random() < 0.7 else None,
+        escolarizado=escolarizado,
+        etapa_escolar=rng.choice(Consulta.ETAPA_ESCOLAR_CHOICES)[0] if rng.random() < 0.5 else None,
+        obra_social=obra_social,
+        nombre_obra_social=rng.choice(OBRAS_SOCIALES) if obra_social == 'SI' else None,
+        ocupacion=rng.choice(OCUPACIONES) if rng.random() < 0.5 else None,
+        apellido_nombre_referencia=nombre_al_azar(rng) if rng.random() < 0.3 else None,
+        tiempo_consumo=elegir(rng, [(valor, peso) for (valor, _), peso in zip(Consulta.TIEMPO_CONSUMO_CHOICES, [15, 35, 25, 15])] + [(None, 10)]),
+        tipo_sustancia=', '.join(sustancias) or None,
+        tratamiento_anterior=tratamiento,
+        tipo_tratamiento_anterior=f'Tratamiento ambulatorio en {rng.choice(EFECTORES)}' if tratamiento == 'SI' else None,
+        efector_salud_referencia=efector if rng.random() < 0.5 else None,
+        riesgo_inminente=elegir(rng, [('Ninguno', 80), ('Urgencia', 12), ('Emergencia', 4), (None, 4)]),
+        institucion_derivado=efector if rng.random() < 0.4 else None,
+        seguimiento=elegir(rng, [('24hs', 20), ('48hs', 30), (None, 50)]),
+        situacion_social=', '.join(situaciones) or None,
+        situacion_social_flags=Consulta.mascara_situacion_social(', '.join(situaciones)),
+        caracteristica_judicial='Judicializado' if 'Judicializado' in situaciones else None,
+        intervencion_propuesta=rng.choice(INTERVENCIONES).format(efector=efector),
+        huella=f'{PREFIJO_HUELLA}{rng.getrandbits(240):060x}',
+    )
+
+
+def generar_consultas(cantidad, desde=None, hasta=None, semilla=0, tamanio_lote=TAMANIO_LOTE, progreso=None):
+    """
+    Genera e inserta `cantidad` consultas sintéticas entre `desde` y `hasta`
+    (por defecto, los últimos dos años). Devuelve la cantidad insertada.
+    `progreso`, si se indica, se llama con (insertadas, cantidad) por lote.
+    """
+    rng = random.Random(semilla)
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=730)
+    dias = (hasta - desde).days + 1
+
+    operadores = asegurar_operadores()
+    pesos_operadores = PESOS_OPERADORES[:len(operadores)]
+
+    # Fechas ordenadas, con menos consultas los fines de semana
+    fechas = []
+    while len(fechas) < cantidad:
+        fecha = desde + timedelta(days=rng.randrange(dias))
+        if fecha.weekday() < 5 or rng.random() < 0.4:
+            fechas.append(fecha)
+    fechas.sort()
+
+    insertadas = 0
+    for inicio in range(0, cantidad, tamanio_lote):
+        consultas = []
+        for fecha in fechas[inicio:inicio + tamanio_lote]:
+            operador = rng.choices(operadores, weights=pesos_operadores)[0]
+            consultas.append(consulta_al_azar(rng, fecha, operador))
+        asignar_edades(consultas)
+        with transaction.atomic():
+            Consulta.objects.bulk_create(consultas, batch_size=1000)
+            guardar_narrativas(consultas)
+            sincronizar_sustancias(consultas)
+            actualizar_resumen_diario({consulta.fecha for consulta in consultas})
+        insertadas += len(consultas)
+        if progreso:
+            progreso(insertadas, cantidad)
+
+    # bulk_create no dispara post_save: invalidar la caché a mano
+    invalidar_datos()
+    return insertadas
+
+
+def borrar_consultas_sinteticas(tamanio_lote=TAMANIO_LOTE):
+    """
+    Borra las consultas sintéticas, y los usuarios y operadores sintéticos que
+    quedan sin consultas; devuelve la cantidad de consultas borradas.
+
+    Se borra con delete() por lotes en una sola transacción: las señales
+    juntan los días afectados, cuyo resumen diario se recalcula una sola vez
+    al terminar (antes de borrar los operadores, que el resumen referencia),
+    y la caché se invalida una vez al confirmar.
+    """
+    sinteticas = Consulta.objects.filter(huella__startswith=PREFIJO_HUELLA)
+    usuarios = User.objects.filter(username__in=[nombre_usuario(apellido, nombre) for apellido, nombre in OPERADORES])
+    cantidad = 0
+    with transaction.atomic():
+        while True:
+            pks = list(sinteticas.values_list('pk', flat=True)[:tamanio_lote])
+            if not pks:
+                break
+            Consulta.objects.filter(pk__in=pks).delete()
+            cantidad += len(pks)
+        recalcular_resumen_pendiente()
+        # Un operador sintético con consultas reales se conserva, con su usuario
+        Operador.objects.filter(usuario__in=usuarios, consultas__isnull=True).delete()
+        usuarios.filter(operador__isnull=True).delete()
+    return cantidad
@@ -0,0 +1,145 @@
+"""
+Fecha de nacimiento y edad tipadas de las consultas.
+
+Los campos fecha_nacimiento y edad son texto libre ("1990-05-02",
+"02/05/1985", "40 años", "8 meses"). De ellos se derivan las columnas
+nacimiento (fecha) y edad_anios (entero), que son las que se filtran y se
+agrupan en los informes.
+
+La edad escrita tiene prioridad; si falta o no se entiende, se calcula con la
+fecha de nacimiento a la fecha de la consulta. En la edad escrita se leen
+primero los años ("1 año y 8 meses" son 1), después los meses y los días.
+
+Para un lote (importación, datos sintéticos) o para toda la tabla
+(completar_edades) los cálculos son por columna con pandas; para una sola
+consulta (save), calcular_edad hace lo mismo sin armar un DataFrame.
+"""
+import re
+from datetime import date, datetime
+
+import pandas as pd
+
+
+# La carga manual guarda la fecha ISO del input type=date; los CSV, día/mes/año
+FORMATOS_FECHA_NACIMIENTO = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y']
+
+EDAD_MAXIMA = 110
+
+# Nacimientos anteriores se consideran errores de carga
+ANIO_MINIMO_NACIMIENTO = 1900
+
+# Partes de la edad escrita (sobre el texto en minúsculas)
+PATRON_ANIOS = r'(?<!\d)(\d{1,3})\s*a(?:ñ|ni)o'
+PATRON_MESES = r'(?<!\d)(\d{1,3})\s*mes'
+PATRON_DIAS = r'\d\s*d[ií]a'
+PATRON_NUMERO = r'^(\d{1,3})(?!\d)'
+
+
+def parsear_nacimientos(textos):
+    """Convierte una columna de fechas de nacimiento en texto a datetime64 (NaT si no se entiende)"""
+    texto = pd.Series(textos, dtype='string').str.strip().str.split().str[0]
+    fechas = pd.Series(pd.NaT, index=texto.index, dtype='datetime64[ns]')
+    for formato in FORMATOS_FECHA_NACIMIENTO:
+        fechas = fechas.fillna(pd.to_datetime(texto, format=formato, errors='coerce'))
+    return fechas.where(fechas.dt.year >= ANIO_MINIMO_NACIMIENTO)
+
+
+def parsear_edades(textos):
+    """Convierte una columna de edades en texto a años enteros (<NA> si no se entiende)"""
+    texto = pd.Series(textos, dtype='string').str.strip().str.lower()
+
+    def numero(patron):
+        return pd.to_numeric(texto.str.extract(patron, expand=False), errors='coerce').astype('Int64')
+
+    # "1 año y 8 meses" son 1; "18 meses", 1; "15 días", 0; "40", 40
+    anios = numero(PATRON_ANIOS).fillna(numero(PATRON_MESES) // 12)
+    anios = anios.mask(anios.isna() & texto.str.contains(PATRON_DIAS, regex=True, na=False), 0)
+    anios = anios.fillna(numero(PATRON_NUMERO))
+    return anios.where(anios <= EDAD_MAXIMA)
+
+
+def parsear_nacimiento(texto):
+    """Fecha de nacimiento (date) de un texto, o None si no se entiende (como parsear_nacimientos)"""
+    partes = '' if texto is None else str(texto).split()
+    if not partes:
+        return None
+    for formato in FORMATOS_FECHA_NACIMIENTO:
+        try:
+            nacimiento = datetime.strptime(partes[0], formato).date()
+        except ValueError:
+            continue
+        return nacimiento if nacimiento.year >= ANIO_MINIMO_NACIMIENTO else None
+    return None
+
+
+def parsear_edad(texto):
+    """Años enteros de una edad en texto, o None si no se entiende (como parsear_edades)"""
+    texto = '' if texto is None else str(texto).strip().lower()
+    anios = re.search(PATRON_ANIOS, texto)
+    meses = re.search(PATRON_MESES, texto)
+    numero = re.search(PATRON_NUMERO, texto)
+    if anios:
+        edad = int(anios.group(1))
+    elif meses:
+        edad = int(meses.group(1)) // 12
+    elif re.search(PATRON_DIAS, texto):
+        edad = 0
+    elif numero:
+        edad = int(numero.group(1))
+    else:
+        return None
+    return edad if edad <= EDAD_MAXIMA else None
+
+
+def calcular_edad(edad, fecha_nacimiento, fecha):
+    """(nacimiento, edad_anios) de una consulta, como calcular_edades para una sola fila"""
+    nacimiento = parsear_nacimiento(fecha_nacimiento)
+    if isinstance(fecha, str):
+        fecha = pd.to_datetime(fecha, errors='coerce')
+        fecha = None if pd.isna(fecha) else fecha.date()
+    # Un nacimiento posterior a la consulta es un error de carga
+    if nacimiento and fecha and nacimiento > fecha:
+        nacimiento = None
+
+    anios = parsear_edad(edad)
+    if anios is None and nacimiento and fecha:
+        anios = fecha.year - nacimiento.year - ((fecha.month, fecha.day) < (nacimiento.month, nacimiento.day))
+        anios = anios if anios <= EDAD_MAXIMA else None
+    return nacimiento, anios
+
+
+def calcular_edades(edades, nacimientos, fechas):
+    """
+    Deriva (nacimiento, edad_anios) de las columnas de texto de edad y de
+    fecha de nacimiento y de la fecha de cada consulta.
+
+    Devuelve dos Series de objetos alineadas con las entradas: fechas (date)
+    y años (int), con None donde no hay dato.
+    """
+    nacimiento = parsear_nacimientos(nacimientos)
+    indice = nacimiento.index
+    fecha = pd.to_datetime(pd.Series(list(fechas), index=indice), errors='coerce')
+    # Un nacimiento posterior a la consulta es un error de carga
+    nacimiento = nacimiento.where(~(nacimiento > fecha))
+
+    cumplio = (fecha.dt.month * 100 + fecha.dt.day) >= (nacimiento.dt.month * 100 + nacimiento.dt.day)
+    edad_calculada = (fecha.dt.year - nacimiento.dt.year - (~cumplio).astype(int)).astype('Int64')
+    edad = parsear_edades(pd.Series(list(edades), index=indice)).fillna(edad_calculada)
+    edad = edad.where(edad <= EDAD_MAXIMA)
+
+    fechas_nacimiento = nacimiento.dt.date.astype(object).where(nacimiento.notna(), None)
+    return fechas_nacimiento, edad.astype(object).where(edad.notna(), None)
+
+
+def asignar_edades(consultas):
+    """Completa nacimiento y edad_anios de consultas en memoria (antes de guardarlas)"""
+    if not consultas:
+        return
+    nacimientos, edades = calcular_edades(
+        [consulta.edad for consulta in consultas],
+        [consulta.fecha_nacimiento for consulta in consultas],
+        [consulta.fecha for consulta in consultas],
+    )
+    for consulta, nacimiento, edad in zip(consultas, nacimientos, edades):
+        consulta.nacimiento = nacimiento
+        consulta.edad_anios = edad
@@ -0,0 +1,385 @@
+"""
+Motor de agregación del panel de informes.
+
+Calcula todos los desgloses del panel con una única consulta agrupada sobre
+el queryset filtrado, en lugar de un GROUP BY por gráfico. La situación social
+se agrupa por su máscara de bits y se reparte por categoría, y las sustancias
+se cuentan aparte sobre la tabla intermedia indexada.
+
+Cuando los filtros activos lo permiten, los desgloses se suman sobre los
+resúmenes diarios, cuyo tamaño depende de la cantidad de días del rango y no
+de la cantidad de consultas: ResumenDiario (día, zona y operador) para el
+total, la serie y esas dos dimensiones, con filtros de fecha, zona y
+operador; ResumenDiarioDimension (día, dimensión y valor) para las demás,
+solo con filtros de fecha.
+
+La distribución por edad agrupa la columna edad_anios en rangos con un CASE
+en la misma consulta SQL. El operador se agrupa por su clave y los nombres
+se leen después de la tabla de operadores.
+
+La serie temporal agrupa por día, semana o mes con Trunc (sobre el resumen
+diario cuando los filtros lo permiten), completa los períodos sin consultas
+y pasa a semanas o meses si el rango es largo, también con un período pedido.
+La carga por hora de la semana agrupa marca_temporal por día ISO y hora.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, TruncDay, TruncMonth, TruncWeek
+
+from .models import Consulta, ConsultaSustancia, Operador, ResumenDiario, ResumenDiarioDimension
+
+
+# Columnas que se agrupan en la pasada única
+DIMENSIONES = [
+    'zona',
+    'sexo',
+    'tiempo_consumo',
+    'consulta',
+    'tratamiento_anterior',
+    'ciudad',
+    'situacion_social_flags',
+    'operador',
+]
+
+# Dimensiones en las que los valores nulos o vacíos no se grafican
+DIMENSIONES_SIN_VACIOS = [
+    'sexo',
+    'tiempo_consumo',
+    'tratamiento_anterior',
+    'ciudad',
+    'operador',
+]
+
+# Filtros de ConsultaFilter que se pueden aplicar tal cual sobre ResumenDiario
+FILTROS_RESUMEN_DIARIO = {
+    'fecha_desde',
+    'fecha_hasta',
+    'zona',
+    'operador',
+}
+
+# Filtros de ConsultaFilter que se pueden aplicar tal cual sobre ResumenDiarioDimension
+FILTROS_RESUMEN_DIMENSION = {
+    'fecha_desde',
+    'fecha_hasta',
+}
+
+# Dimensiones que se suman sobre ResumenDiario; las demás, sobre ResumenDiarioDimension
+DIMENSIONES_RESUMEN_DIARIO = {'zona', 'operador'}
+
+# Valor de ResumenDiarioDimension.dimension para cada columna agrupada
+DIMENSION_RESUMEN = {
+    'consulta': 'consulta',
+    'sexo': 'sexo',
+    'tiempo_consumo': 'tiempo_consumo',
+    'tratamiento_anterior': 'tratamiento_anterior',
+    'ciudad': 'ciudad',
+    'situacion_social_flags': 'situacion_social',
+}
+
+TOP_CIUDADES = 10
+TOP_SUSTANCIAS = 10
+
+# Rangos de edad del gráfico: (etiqueta, desde, hasta sin incluir; None sin límite)
+RANGOS_EDAD = [
+    ('0-17', 0, 18),
+    ('18-24', 18, 25),
+    ('25-34', 25, 35),
+    ('35-44', 35, 45),
+    ('45-59', 45, 60),
+    ('60 o más', 60, None),
+]
+SIN_EDAD = 'Sin dato'
+
+# Granularidades de la serie temporal, de la más fina a la más gruesa
+PERIODOS = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+# Puntos máximos de la serie antes de pasar a una granularidad más gruesa, automática o pedida
+MAX_PUNTOS_SERIE = 180
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+@dataclass
+class ResumenInformes:
+    """Desgloses del panel de informes: listas de (valor, cantidad) ordenadas por cantidad"""
+    total: int = 0
+    zona: list[tuple[str | None, int]] = field(default_factory=list)
+    sexo: list[tuple[str, int]] = field(default_factory=list)
+    tiempo_consumo: list[tuple[str, int]] = field(default_factory=list)
+    consulta: list[tuple[str | None, int]] = field(default_factory=list)
+    tratamiento_anterior: list[tuple[str, int]] = field(default_factory=list)
+    ciudad: list[tuple[str, int]] = field(default_factory=list)
+    situacion_social: list[tuple[str, int]] = field(default_factory=list)
+    operador: list[tuple[str, int]] = field(default_factory=list)
+    sustancias: list[tuple[str, int]] = field(default_factory=list)
+
+
+def calcular_resumen(consultas, dimensiones=DIMENSIONES, sustancias=True):
+    """
+    Calcula los desgloses del panel en una sola pasada sobre el queryset.
+
+    Con `dimensiones` se agrupa solo por esas columnas (las demás quedan
+    vacías); sin ninguna, solo se cuenta el total.
+    """
+    # order_by() vacío para que el ordenamiento del modelo no entre en el GROUP BY
+    consultas = consultas.order_by()
+    if dimensiones:
+        filas = consultas.values(*dimensiones).annotate(cantidad=Count('id'))
+    else:
+        filas = [consultas.aggregate(cantidad=Count('id'))]
+    return armar_resumen(filas, dimensiones, (lambda: contar_sustancias(consultas)) if sustancias else None)
+
+
+def calcular_resumen_diario(filterset, dimensiones=DIMENSIONES, sustancias=True):
+    """
+    Calcula los desgloses del panel sumando los resúmenes diarios filtrados;
+    los filtros activos tienen que cumplir usa_resumen_diario.
+    """
+    resumenes = filterset.filter_queryset(ResumenDiario.objects.all()).order_by()
+    contadores = {}
+    for dimension in dimensiones:
+        if dimension in DIMENSIONES_RESUMEN_DIARIO:
+            filas = resumenes.values_list(dimension).annotate(cantidad=Sum('cantidad'))
+        else:
+            filas = resumenes_dimension(filterset, DIMENSION_RESUMEN[dimension]).values_list('valor').annotate(cantidad=Sum('cantidad'))
+        contadores[dimension] = Counter(dict(filas))
+    # La situación social ya viene repartida por categoría
+    situaciones = contadores.pop('situacion_social_flags', Counter())
+
+    total = resumenes.aggregate(cantidad=Sum('cantidad'))['cantidad'] or 0
+    calcular_sustancias = (lambda: sumar_sustancias(resumenes_dimension(filterset, 'sustancia'))) if sustancias else None
+    return desglosar(total, contadores, situaciones, calcular_sustancias)
+
+
+def resumenes_dimension(filterset, dimension):
+    """Filas de ResumenDiarioDimension de una dimensión, con los filtros de fecha aplicados"""
+    return filterset.filter_queryset(ResumenDiarioDimension.objects.filter(dimension=dimension)).order_by()
+
+
+def calcular_resumen_filtrado(filterset, dimensiones=DIMENSIONES, sustancias=True):
+    """
+    Calcula los desgloses del panel para un ConsultaFilter, usando los
+    resúmenes diarios si todos los filtros activos lo permiten.
+    """
+    if usa_resumen_diario(filterset, dimensiones, sustancias):
+        return calcular_resumen_diario(filterset, dimensiones, sustancias)
+    return calcular_resumen(filterset.qs, dimensiones, sustancias)
+
+
+def usa_resumen_diario(filterset, dimensiones=(), sustancias=False):
+    """
+    Indica si los desgloses pedidos se pueden sumar sobre los resúmenes
+    diarios con los filtros activos: las dimensiones de ResumenDiario admiten
+    filtros de fecha, zona y operador; las demás y las sustancias, solo de fecha.
+    """
+    if not filterset.is_valid():
+        return False
+    activos = {nombre for nombre, valor in filterset.form.cleaned_data.items() if valor not in (None, '')}
+    if sustancias or not set(dimensiones) <= DIMENSIONES_RESUMEN_DIARIO:
+        return activos <= FILTROS_RESUMEN_DIMENSION
+    return activos <= FILTROS_RESUMEN_DIARIO
+
+
+def armar_resumen(filas, dimensiones, calcular_sustancias=None):
+    """Arma el ResumenInformes a partir de filas agrupadas por `dimensiones` con su cantidad"""
+    contadores = {dimension: Counter() for dimension in dimensiones}
+    total = 0
+
+    for fila in filas:
+        cantidad = fila['cantidad'] or 0
+        total += cantidad
+        for dimension in dimensiones:
+            contadores[dimension][fila[dimension]] += cantidad
+
+    # Cada consulta cuenta una vez en cada una de sus situaciones sociales
+    situaciones = Counter()
+    for mascara, cantidad in contadores.pop('situacion_social_flags', Counter()).items():
+        for situacion in Consulta.situaciones_de_mascara(mascara):
+            situaciones[situacion] += cantidad
+
+    return desglosar(total, contadores, situaciones, calcular_sustancias)
+
+
+def desglosar(total, contadores, situaciones, calcular_sustancias=None):
+    """
+    Arma el ResumenInformes con los contadores por columna y el de situaciones
+    sociales por categoría; descarta los vacíos de DIMENSIONES_SIN_VACIOS.
+    """
+    contadores = {dimension: contadores.get(dimension, Counter()) for dimension in DIMENSIONES}
+    for dimension in DIMENSIONES_SIN_VACIOS:
+        contadores[dimension].pop(None, None)
+        contadores[dimension].pop('', None)
+
+    return ResumenInformes(
+        total=total,
+        zona=mas_frecuentes(contadores['zona']),
+        sexo=mas_frecuentes(contadores['sexo']),
+        tiempo_consumo=mas_frecuentes(contadores['tiempo_consumo']),
+        consulta=mas_frecuentes(contadores['consulta']),
+        tratamiento_anterior=mas_frecuentes(contadores['tratamiento_anterior']),
+        ciudad=mas_frecuentes(contadores['ciudad'], TOP_CIUDADES),
+        situacion_social=mas_frecuentes(situaciones),
+        operador=nombres_operadores(mas_frecuentes(contadores['operador'])),
+        sustancias=calcular_sustancias() if total and calcular_sustancias else [],
+    )
+
+
+def mas_frecuentes(contador, limite=None):
+    """(valor, cantidad) de mayor a menor cantidad y, en los empates, por valor, para no depender del orden de las filas"""
+    return sorted(contador.items(), key=lambda item: (-item[1], str(item[0])))[:limite]
+
+
+def nombres_operadores(desglose):
+    """
+    Reemplaza las claves de operador de un desglose por sus nombres; el
+    operador sin nombre no se grafica, igual que los vacíos de las demás
+    dimensiones.
+    """
+    if not desglose:
+        return desglose
+    nombres = dict(Operador.objects.filter(pk__in=[pk for pk, _ in desglose]).values_list('pk', 'nombre'))
+    return [(nombres.get(pk, pk), cantidad) for pk, cantidad in desglose if nombres.get(pk, pk) != '']
+
+
+def contar_sustancias(consultas, limite=TOP_SUSTANCIAS):
+    """Cuenta las consultas por sustancia con un GROUP BY sobre la tabla intermedia"""
+    filas = ConsultaSustancia.objects.filter(
+        consulta__in=consultas.order_by().values('pk')
+    ).values('sustancia__nombre').annotate(cantidad=Count('id')).order_by('-cantidad', 'sustancia__nombre')[:limite]
+    return [(fila['sustancia__nombre'], fila['cantidad']) for fila in filas]
+
+
+def sumar_sustancias(resumenes_sustancia, limite=TOP_SUSTANCIAS):
+    """Suma las consultas por sustancia sobre las filas ya filtradas de ResumenDiarioDimension"""
+    filas = resumenes_sustancia.order_by().values('valor').annotate(
+        cantidad=Sum('cantidad')
+    ).order_by('-cantidad', 'valor')[:limite]
+    return [(fila['valor'], fila['cantidad']) for fila in filas]
+
+
+def expresion_rango_edad():
+    """CASE que clasifica edad_anios en los RANGOS_EDAD (SIN_EDAD si no hay edad)"""
+    casos = []
+    for etiqueta, desde, hasta in RANGOS_EDAD:
+        condicion = {'edad_anios__gte': desde}
+        if hasta is not None:
+            condicion['edad_anios__lt'] = hasta
+        casos.append(When(**condicion, then=Value(etiqueta)))
+    return Case(*casos, default=Value(SIN_EDAD), output_field=CharField())
+
+
+def contar_rangos_edad(consultas):
+    """Cantidad de consultas por rango de edad con un GROUP BY sobre el CASE, en el orden de RANGOS_EDAD"""
+    filas = consultas.order_by().annotate(rango_edad=expresion_rango_edad()).values('rango_edad').annotate(cantidad=Count('id'))
+    cantidades = {fila['rango_edad']: fila['cantidad'] for fila in filas}
+    orden = [etiqueta for etiqueta, _, _ in RANGOS_EDAD] + [SIN_EDAD]
+    return [(etiqueta, cantidades[etiqueta]) for etiqueta in orden if cantidades.get(etiqueta)]
+
+
+def inicio_periodo(fecha, periodo):
+    """Primer día del período (día, semana desde el lunes o mes) que contiene la fecha"""
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def siguiente_periodo(fecha, periodo):
+    """Primer día del período siguiente a uno que empieza en `fecha`"""
+    if periodo == 'semana':
+        return fecha + timedelta(days=7)
+    if periodo == 'mes':
+        return (fecha.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return fecha + timedelta(days=1)
+
+
+def contar_por_periodo(filterset, periodo):
+    """{inicio del período: cantidad} con un GROUP BY sobre Trunc, en el resumen diario si es posible"""
+    if usa_resumen_diario(filterset):
+        filas = filterset.filter_queryset(ResumenDiario.objects.all()).order_by()
+        cantidad = Sum('cantidad')
+    else:
+        filas = filterset.qs.order_by()
+        cantidad = Count('id')
+    filas = filas.annotate(inicio=PERIODOS[periodo]('fecha')).values('inicio').annotate(cantidad=cantidad)
+    return {fila['inicio']: fila['cantidad'] for fila in filas}
+
+
+def contar_periodos(desde, hasta, periodo):
+    """Cantidad de períodos entre las fechas, ambas incluidas, sin recorrerlos"""
+    desde, hasta = inicio_periodo(desde, periodo), inicio_periodo(hasta, periodo)
+    if periodo == 'mes':
+        return (hasta.year - desde.year) * 12 + hasta.month - desde.month + 1
+    return (hasta - desde).days // (7 if periodo == 'semana' else 1) + 1
+
+
+def completar_serie(cantidades, periodo, desde=None, hasta=None):
+    """Lista [(inicio, cantidad)] de todos los períodos entre desde y hasta, con 0 en los que faltan"""
+    if not cantidades:
+        return []
+    actual = inicio_periodo(desde or min(cantidades), periodo)
+    ultimo = inicio_periodo(hasta or max(cantidades), periodo)
+    serie = []
+    while actual <= ultimo:
+        serie.append((actual, cantidades.get(actual, 0)))
+        actual = siguiente_periodo(actual, periodo)
+    return serie
+
+
+def serie_temporal(filterset, periodo=None):
+    """
+    Cantidad de consultas por período para los filtros, sin huecos.
+
+    Sin `periodo` (automático) se agrupa por día y, si la serie supera
+    MAX_PUNTOS_SERIE puntos, se reagrupa por semana o por mes. Con un
+    `periodo` pedido rige el mismo tope: si el rango no entra, se pasa al
+    siguiente más grueso. Si ni por mes entra, el rango se recorta a las
+    fechas con consultas. Devuelve (período usado, [(inicio, cantidad)]).
+    """
+    datos = filterset.form.cleaned_data if filterset.is_valid() else {}
+    periodos = list(PERIODOS)
+    if periodo in PERIODOS:
+        periodos = periodos[periodos.index(periodo):]
+
+    cantidades = contar_por_periodo(filterset, 'dia')
+    if not cantidades:
+        return periodos[0], []
+    desde = datos.get('fecha_desde') or min(cantidades)
+    hasta = datos.get('fecha_hasta') or max(cantidades)
+    if contar_periodos(desde, hasta, periodos[-1]) > MAX_PUNTOS_SERIE:
+        desde, hasta = max(desde, min(cantidades)), min(hasta, max(cantidades))
+
+    for periodo in periodos:
+        if contar_periodos(desde, hasta, periodo) <= MAX_PUNTOS_SERIE:
+            break
+    agrupadas = Counter()
+    for fecha, cantidad in cantidades.items():
+        agrupadas[inicio_periodo(fecha, periodo)] += cantidad
+    return periodo, completar_serie(agrupadas, periodo, desde, hasta)
+
+
+def carga_por_hora_semana(consultas):
+    """
+    Matriz de 7 x 24 (lunes a domingo, horas 0 a 23) con la cantidad de
+    consultas según marca_temporal, en la zona horaria del sistema.
+
+    Solo cuenta las consultas registradas el mismo día de la llamada: en las
+    importadas, marca_temporal es el momento de la importación.
+    """
+    filas = consultas.order_by().filter(marca_temporal__date=F('fecha')).annotate(
+        dia=ExtractIsoWeekDay('marca_temporal'),
+        hora=ExtractHour('marca_temporal'),
+    ).values('dia', 'hora').annotate(cantidad=Count('id'))
+    matriz = [[0] * 24 for _ in DIAS_SEMANA]
+    for fila in filas:
+        matriz[fila['dia'] - 1][fila['hora']] = fila['cantidad']
+    return matriz
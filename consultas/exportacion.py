@@ -0,0 +1,277 @@
+"""
+Exportación de consultas.
+
+Las filas se leen por bloques con values_list(...).iterator() y el CSV se
+genera de a bloques, de modo que la memoria usada no depende de la cantidad
+de consultas exportadas.
+
+Además de CSV se exporta a Parquet y Arrow (lotes columnares con fechas y
+categorías tipadas, con pyarrow) y a Excel (openpyxl en modo de solo
+escritura). Esas dependencias son opcionales y se importan solo al usarlas.
+"""
+import csv
+import importlib
+import io
+
+from django.db import models
+from django.db.models.constants import LOOKUP_SEP
+
+from .models import Consulta
+
+
+# Encabezado del archivo y campo del modelo de cada columna exportada
+# (los textos largos se leen de la narrativa con un LEFT JOIN)
+COLUMNAS_EXPORTACION = [
+    ('ID', 'id'),
+    ('Fecha', 'fecha'),
+    ('Zona', 'zona'),
+    ('Operador', 'operador__nombre'),
+    ('Interlocutor', 'apellido_nombre_interlocutor'),
+    ('Consulta', 'consulta'),
+    ('Tel. Interlocutor', 'telefono_interlocutor'),
+    ('Tipo Vínculo', 'tipo_vinculo'),
+    ('Motivo', 'narrativa__motivo_consulta'),
+    ('Usuario', 'apellido_nombre_usuario'),
+    ('DNI', 'dni'),
+    ('Fecha Nac.', 'fecha_nacimiento'),
+    ('Edad', 'edad'),
+    ('Edad (años)', 'edad_anios'),
+    ('Sexo', 'sexo'),
+    ('Nacionalidad', 'nacionalidad'),
+    ('Ciudad', 'ciudad'),
+    ('Barrio', 'barrio'),
+    ('Dirección', 'narrativa__direccion'),
+    ('Teléfono', 'telefono'),
+    ('Escolarizado', 'escolarizado'),
+    ('Etapa Escolar', 'etapa_escolar'),
+    ('Obra Social', 'obra_social'),
+    ('Nombre OS', 'nombre_obra_social'),
+    ('Ocupación', 'ocupacion'),
+    ('Ref. Afectiva', 'apellido_nombre_referencia'),
+    ('DNI Ref.', 'dni_referencia'),
+    ('Tel. Ref.', 'telefono_referencia'),
+    ('Tiempo Consumo', 'tiempo_consumo'),
+    ('Sustancia', 'tipo_sustancia'),
+    ('Trat. Anterior', 'tratamiento_anterior'),
+    ('Tipo Trat. Anterior', 'narrativa__tipo_tratamiento_anterior'),
+    ('Efector Salud', 'efector_salud_referencia'),
+    ('Riesgo', 'riesgo_inminente'),
+    ('Institución Derivado', 'institucion_derivado'),
+    ('Seguimiento', 'seguimiento'),
+    ('Sit. Social', 'situacion_social'),
+    ('Car. Judicial', 'caracteristica_judicial'),
+    ('Intervención', 'narrativa__intervencion_propuesta'),
+]
+
+# Filas leídas de la base de datos por cada viaje
+TAMANIO_BLOQUE = 2000
+
+
+class Eco:
+    """Pseudo-archivo que devuelve lo que se le escribe, para usar csv.writer como generador"""
+
+    def write(self, valor):
+        return valor
+
+
+def filas_exportacion(consultas, tamanio_bloque=TAMANIO_BLOQUE):
+    """Itera las filas a exportar como tuplas, leyéndolas por bloques"""
+    campos = [campo for _, campo in COLUMNAS_EXPORTACION]
+    return consultas.values_list(*campos).iterator(chunk_size=tamanio_bloque)
+
+
+def bloques_filas(consultas, tamanio_bloque=TAMANIO_BLOQUE):
+    """Itera las filas a exportar en listas de hasta `tamanio_bloque` tuplas"""
+    bloque = []
+    for fila in filas_exportacion(consultas, tamanio_bloque):
+        bloque.append(fila)
+        if len(bloque) >= tamanio_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def generar_csv(consultas, tamanio_bloque=TAMANIO_BLOQUE, progreso=None):
+    """Genera el CSV de las consultas en bloques de texto"""
+    writer = csv.writer(Eco())
+    yield '\ufeff' + writer.writerow([encabezado for encabezado, _ in COLUMNAS_EXPORTACION])  # BOM para UTF-8
+    
+    for bloque in bloques_filas(consultas, tamanio_bloque):
+        yield ''.join(writer.writerow(fila) for fila in bloque)
+        if progreso:
+            progreso(len(bloque))
+
+
+# --- Formatos columnares (pyarrow) y Excel (openpyxl) ----------------------
+
+# Filas por lote de Arrow (cada lote es un row group del Parquet)
+TAMANIO_LOTE_COLUMNAR = 20000
+
+
+class FormatoNoDisponible(Exception):
+    """El formato pedido necesita una dependencia que no está instalada"""
+
+
+def importar_dependencia(modulo):
+    """Importa la dependencia opcional de un formato, solo cuando se usa"""
+    try:
+        return importlib.import_module(modulo)
+    except ImportError:
+        raise FormatoNoDisponible(f'Para este formato hace falta instalar {modulo.split(".")[0]}')
+
+
+class BufferSalida(io.RawIOBase):
+    """Archivo de solo escritura que acumula lo escrito hasta que se lo vacía, para generar bytes por bloques"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def campo_modelo(ruta):
+    """Campo del modelo al que apunta una ruta de values_list (por ejemplo 'narrativa__direccion')"""
+    modelo = Consulta
+    *relaciones, nombre = ruta.split(LOOKUP_SEP)
+    for relacion in relaciones:
+        modelo = modelo._meta.get_field(relacion).related_model
+    return modelo._meta.get_field(nombre)
+
+
+def esquema_arrow():
+    """Esquema Arrow de la exportación: fechas como date32 y campos con opciones como categorías"""
+    pa = importar_dependencia('pyarrow')
+    campos = []
+    for encabezado, campo in COLUMNAS_EXPORTACION:
+        field = campo_modelo(campo)
+        if isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField):
+            tipo = pa.date32()
+        elif isinstance(field, (models.AutoField, models.IntegerField)):
+            tipo = pa.int64()
+        elif field.choices:
+            tipo = pa.dictionary(pa.int32(), pa.string())
+        else:
+            tipo = pa.string()
+        campos.append(pa.field(encabezado, tipo))
+    return pa.schema(campos)
+
+
+def lotes_arrow(consultas, esquema, tamanio_bloque=TAMANIO_LOTE_COLUMNAR, progreso=None):
+    """Convierte las filas exportadas en RecordBatch de Arrow, columna por columna"""
+    pa = importar_dependencia('pyarrow')
+    for bloque in bloques_filas(consultas, tamanio_bloque):
+        columnas = []
+        for indice, campo in enumerate(esquema):
+            valores = [fila[indice] for fila in bloque]
+            if pa.types.is_dictionary(campo.type):
+                columnas.append(pa.array(valores, type=pa.string()).dictionary_encode())
+            else:
+                columnas.append(pa.array(valores, type=campo.type))
+        yield pa.RecordBatch.from_arrays(columnas, schema=esquema)
+        if progreso:
+            progreso(len(bloque))
+
+
+def generar_parquet(consultas, tamanio_bloque=TAMANIO_LOTE_COLUMNAR, progreso=None):
+    """Genera el archivo Parquet de las consultas en bloques de bytes (un row group por lote)"""
+    pa = importar_dependencia('pyarrow')
+    pq = importar_dependencia('pyarrow.parquet')
+    esquema = esquema_arrow()
+    salida = BufferSalida()
+    with pq.ParquetWriter(pa.PythonFile(salida, mode='w'), esquema, compression='zstd') as writer:
+        for lote in lotes_arrow(consultas, esquema, tamanio_bloque, progreso):
+            writer.write_batch(lote)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def generar_arrow(consultas, tamanio_bloque=TAMANIO_LOTE_COLUMNAR, progreso=None):
+    """Genera el stream IPC de Arrow de las consultas en bloques de bytes"""
+    pa = importar_dependencia('pyarrow')
+    esquema = esquema_arrow()
+    salida = BufferSalida()
+    with pa.ipc.new_stream(pa.PythonFile(salida, mode='w'), esquema) as writer:
+        for lote in lotes_arrow(consultas, esquema, tamanio_bloque, progreso):
+            writer.write_batch(lote)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def escribir_xlsx(consultas, archivo, tamanio_bloque=TAMANIO_BLOQUE, progreso=None):
+    """
+    Escribe el Excel de las consultas en `archivo` con el modo de solo escritura
+    de openpyxl, que no mantiene las celdas en memoria.
+    """
+    openpyxl = importar_dependencia('openpyxl')
+    caracteres_ilegales = importar_dependencia('openpyxl.cell.cell').ILLEGAL_CHARACTERS_RE
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet('Consultas')
+    hoja.append([encabezado for encabezado, _ in COLUMNAS_EXPORTACION])
+    for bloque in bloques_filas(consultas, tamanio_bloque):
+        for fila in bloque:
+            hoja.append([caracteres_ilegales.sub('', valor) if isinstance(valor, str) else valor for valor in fila])
+        if progreso:
+            progreso(len(bloque))
+    libro.save(archivo)
+
+
+# Formatos de exportación: extensión, tipo de contenido, generador por bloques
+# (None si el archivo no se puede generar por bloques) y dependencia opcional
+FORMATOS_EXPORTACION = {
+    'csv': ('csv', 'text/csv', generar_csv, None),
+    'parquet': ('parquet', 'application/vnd.apache.parquet', generar_parquet, 'pyarrow'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream', generar_arrow, 'pyarrow'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', None, 'openpyxl'),
+}
+
+
+def verificar_formato(formato):
+    """Lanza FormatoNoDisponible si el formato no existe o le falta su dependencia"""
+    if formato not in FORMATOS_EXPORTACION:
+        raise FormatoNoDisponible(f'Formato de exportación desconocido: {formato}')
+    dependencia = FORMATOS_EXPORTACION[formato][3]
+    if dependencia:
+        importar_dependencia(dependencia)
+
+
+def exportar_archivo(consultas, ruta, formato='csv', progreso=None):
+    """
+    Escribe la exportación de las consultas en `ruta` y devuelve la cantidad de filas.
+    `progreso`, si se indica, se llama con (filas escritas, filas totales) por bloque.
+    """
+    total = consultas.count()
+    escritas = 0
+
+    def contar(filas):
+        nonlocal escritas
+        escritas += filas
+        if progreso:
+            progreso(min(escritas, total), total)
+
+    verificar_formato(formato)
+    generar = FORMATOS_EXPORTACION[formato][2]
+    if generar is None:
+        escribir_xlsx(consultas, ruta, progreso=contar)
+    elif formato == 'csv':
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            archivo.writelines(generar(consultas, progreso=contar))
+    else:
+        with open(ruta, 'wb') as archivo:
+            archivo.writelines(generar(consultas, progreso=contar))
+    return escritas
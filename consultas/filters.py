@@ -1,17 +1,20 @@
 import django_filters
-from .models import Consulta
+from .busqueda import buscar
+from .models import Consulta, Operador
 
 
 class ConsultaFilter(django_filters.FilterSet):
     fecha_desde = django_filters.DateFilter(field_name='fecha', lookup_expr='gte', label='Fecha desde')
     fecha_hasta = django_filters.DateFilter(field_name='fecha', lookup_expr='lte', label='Fecha hasta')
-    apellido_nombre_usuario = django_filters.CharFilter(lookup_expr='icontains', label='Usuario (contiene)')
-    apellido_nombre_interlocutor = django_filters.CharFilter(lookup_expr='icontains', label='Interlocutor (contiene)')
-    ciudad = django_filters.CharFilter(lookup_expr='icontains', label='Ciudad (contiene)')
-    tipo_sustancia = django_filters.CharFilter(lookup_expr='icontains', label='Sustancia (contiene)')
-    operador = django_filters.CharFilter(lookup_expr='exact', label='Operador')
-    situacion_social = django_filters.CharFilter(lookup_expr='icontains', label='Situación Social (contiene)')
-    caracteristica_judicial = django_filters.CharFilter(lookup_expr='icontains', label='Característica Judicial (contiene)')
+    apellido_nombre_usuario = django_filters.CharFilter(method='filtrar_texto', label='Usuario (contiene)')
+    apellido_nombre_interlocutor = django_filters.CharFilter(method='filtrar_texto', label='Interlocutor (contiene)')
+    ciudad = django_filters.CharFilter(method='filtrar_texto', label='Ciudad (contiene)')
+    tipo_sustancia = django_filters.CharFilter(field_name='sustancias__nombre', lookup_expr='exact', label='Sustancia')
+    operador = django_filters.ModelChoiceFilter(queryset=Operador.objects.all(), label='Operador')
+    situacion_social = django_filters.CharFilter(method='filtrar_situacion_social', label='Situación Social')
+    caracteristica_judicial = django_filters.CharFilter(method='filtrar_texto', label='Característica Judicial (contiene)')
+    edad_desde = django_filters.NumberFilter(field_name='edad_anios', lookup_expr='gte', label='Edad desde')
+    edad_hasta = django_filters.NumberFilter(field_name='edad_anios', lookup_expr='lte', label='Edad hasta')
     
     class Meta:
         model = Consulta
@@ -26,3 +29,11 @@ class ConsultaFilter(django_filters.FilterSet):
             'riesgo_inminente': ['exact'],
             'seguimiento': ['exact'],
         }
+    
+    def filtrar_texto(self, queryset, name, value):
+        """Filtra una columna de texto con el índice de búsqueda (palabras como prefijo, sin acentos)"""
+        return buscar(queryset, value, campos=[name], ordenar=False)
+    
+    def filtrar_situacion_social(self, queryset, name, value):
+        """Filtra por situación social con un IN sobre la máscara de bits indexada"""
+        return queryset.filter(situacion_social_flags__in=Consulta.mascaras_con_situacion(value))
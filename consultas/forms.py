@@ -1,10 +1,12 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Consulta
+from .cache import obtener_cacheado
+from .edades import EDAD_MAXIMA, parsear_edades
+from .models import CAMPOS_NARRATIVA, Consulta, Sustancia, nombre_operador, operador_de_usuario, separar_valores
 
 
-def get_tipo_vinculo_choices():
+def consultar_tipo_vinculo_choices():
     """Obtiene los tipos de vínculo únicos de la base de datos"""
     vinculos = Consulta.objects.exclude(
         tipo_vinculo__isnull=True
@@ -18,27 +20,20 @@ def get_tipo_vinculo_choices():
     return choices
 
 
+def consultar_tipo_sustancia_choices():
+    """Obtiene los tipos de sustancia desde la tabla de sustancias"""
+    nombres = Sustancia.objects.order_by('nombre').values_list('nombre', flat=True)
+    return [(nombre, nombre) for nombre in nombres]
+
+
+def get_tipo_vinculo_choices():
+    """Tipos de vínculo cacheados hasta la próxima modificación de consultas"""
+    return obtener_cacheado('opciones:tipo_vinculo', consultar_tipo_vinculo_choices)
+
+
 def get_tipo_sustancia_choices():
-    """Obtiene los tipos de sustancia únicos de la base de datos"""
-    sustancias_raw = Consulta.objects.exclude(
-        tipo_sustancia__isnull=True
-    ).exclude(
-        tipo_sustancia=''
-    ).values_list('tipo_sustancia', flat=True)
-    
-    # Extraer sustancias individuales (pueden estar separadas por comas)
-    todas = set()
-    for registro in sustancias_raw:
-        if registro:
-            for s in str(registro).split(','):
-                s = s.strip()
-                if s:
-                    todas.add(s)
-    
-    choices = []
-    for sustancia in sorted(todas):
-        choices.append((sustancia, sustancia))
-    return choices
+    """Tipos de sustancia cacheados hasta la próxima modificación de consultas"""
+    return obtener_cacheado('opciones:tipo_sustancia', consultar_tipo_sustancia_choices)
 
 
 class ConsultaForm(forms.ModelForm):
@@ -47,8 +42,11 @@ class ConsultaForm(forms.ModelForm):
         label="Fecha"
     )
     
+    # Solo se muestra: la consulta queda a nombre del operador del usuario logueado
     operador = forms.CharField(
         widget=forms.TextInput(attrs={'class': 'form-control', 'readonly': 'readonly'}),
+        required=False,
+        disabled=True,
         label="Operador"
     )
     
@@ -73,15 +71,42 @@ class ConsultaForm(forms.ModelForm):
         label="Situación Social"
     )
     
+    # Campos de la narrativa (tabla aparte): se copian a la consulta al guardar
+    motivo_consulta = forms.CharField(
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+        label="Motivo de la Consulta"
+    )
+    
+    direccion = forms.CharField(
+        max_length=200,
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+        required=False,
+        empty_value=None,
+        label="Dirección"
+    )
+    
+    tipo_tratamiento_anterior = forms.CharField(
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
+        required=False,
+        empty_value=None,
+        label="Tipo de Tratamiento Anterior"
+    )
+    
+    intervencion_propuesta = forms.CharField(
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
+        required=False,
+        empty_value=None,
+        label="Intervención Propuesta"
+    )
+    
     class Meta:
         model = Consulta
-        exclude = ['marca_temporal', 'creado_por', 'fecha_creacion', 'fecha_modificacion']
+        exclude = ['marca_temporal', 'operador', 'creado_por', 'fecha_creacion', 'fecha_modificacion']
         widgets = {
             'zona': forms.Select(attrs={'class': 'form-select'}),
             'apellido_nombre_interlocutor': forms.TextInput(attrs={'class': 'form-control'}),
             'consulta': forms.Select(attrs={'class': 'form-select'}),
             'telefono_interlocutor': forms.TextInput(attrs={'class': 'form-control'}),
-            'motivo_consulta': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'apellido_nombre_usuario': forms.TextInput(attrs={'class': 'form-control'}),
             'dni': forms.TextInput(attrs={'class': 'form-control'}),
             'fecha_nacimiento': forms.DateInput(attrs={'class': 'form-control', 'type': 'date', 'id': 'id_fecha_nacimiento'}),
@@ -90,7 +115,6 @@ class ConsultaForm(forms.ModelForm):
             'nacionalidad': forms.TextInput(attrs={'class': 'form-control'}),
             'ciudad': forms.TextInput(attrs={'class': 'form-control'}),
             'barrio': forms.TextInput(attrs={'class': 'form-control'}),
-            'direccion': forms.TextInput(attrs={'class': 'form-control'}),
             'telefono': forms.TextInput(attrs={'class': 'form-control'}),
             'escolarizado': forms.Select(attrs={'class': 'form-select'}),
             'etapa_escolar': forms.Select(attrs={'class': 'form-select'}),
@@ -102,17 +126,16 @@ class ConsultaForm(forms.ModelForm):
             'telefono_referencia': forms.TextInput(attrs={'class': 'form-control'}),
             'tiempo_consumo': forms.Select(attrs={'class': 'form-select'}),
             'tratamiento_anterior': forms.Select(attrs={'class': 'form-select'}),
-            'tipo_tratamiento_anterior': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
             'efector_salud_referencia': forms.TextInput(attrs={'class': 'form-control'}),
             'riesgo_inminente': forms.Select(attrs={'class': 'form-select'}),
             'institucion_derivado': forms.TextInput(attrs={'class': 'form-control'}),
             'seguimiento': forms.Select(attrs={'class': 'form-select'}),
             'caracteristica_judicial': forms.TextInput(attrs={'class': 'form-control'}),
-            'intervencion_propuesta': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
         }
     
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.user = user
         # Cargar opciones de tipo de vínculo desde la base de datos
         self.fields['tipo_vinculo'].choices = get_tipo_vinculo_choices()
         
@@ -124,7 +147,7 @@ class ConsultaForm(forms.ModelForm):
         
         # Si estamos editando, cargar las sustancias seleccionadas
         if self.instance and self.instance.pk and self.instance.tipo_sustancia:
-            sustancias_guardadas = [s.strip() for s in self.instance.tipo_sustancia.split(',') if s.strip()]
+            sustancias_guardadas = separar_valores(self.instance.tipo_sustancia)
             self.initial['tipo_sustancia'] = sustancias_guardadas
         
         # Si estamos editando, cargar las situaciones sociales seleccionadas
@@ -132,12 +155,17 @@ class ConsultaForm(forms.ModelForm):
             situaciones_guardadas = [s.strip() for s in self.instance.situacion_social.split(',') if s.strip()]
             self.initial['situacion_social'] = situaciones_guardadas
         
-        # Si hay usuario logueado, usar su nombre como operador
-        if user and user.is_authenticated:
-            nombre_operador = f"{user.last_name} {user.first_name}".strip()
-            if not nombre_operador:
-                nombre_operador = user.username
-            self.fields['operador'].initial = nombre_operador
+        # Si estamos editando, cargar los textos de la narrativa
+        if self.instance and self.instance.pk:
+            for campo in CAMPOS_NARRATIVA:
+                self.initial.setdefault(campo, getattr(self.instance, campo))
+        
+        # Operador de la consulta editada, o el del usuario logueado (si todavía no tiene, su nombre)
+        if self.instance.operador_id:
+            self.fields['operador'].initial = self.instance.operador.nombre
+        elif user and user.is_authenticated:
+            operador = getattr(user, 'operador', None)
+            self.fields['operador'].initial = operador.nombre if operador else nombre_operador(user)
     
     def clean_tipo_sustancia(self):
         """Convierte la lista de sustancias seleccionadas a texto separado por comas"""
@@ -146,12 +174,27 @@ class ConsultaForm(forms.ModelForm):
             return ', '.join(sustancias)
         return ''
     
+    def clean_edad(self):
+        """Valida que la edad se pueda llevar a años (por ejemplo "34", "40 años" o "8 meses")"""
+        edad = self.cleaned_data.get('edad')
+        if edad and parsear_edades([edad]).isna().iloc[0]:
+            raise forms.ValidationError(f'Ingrese la edad en años (entre 0 y {EDAD_MAXIMA}).')
+        return edad
+    
     def clean_situacion_social(self):
         """Convierte la lista de situaciones sociales seleccionadas a texto separado por comas"""
         situaciones = self.cleaned_data.get('situacion_social', [])
         if situaciones:
             return ', '.join(situaciones)
         return ''
+    
+    def save(self, commit=True):
+        """Copia los textos de la narrativa y asigna el operador del usuario; Consulta.save guarda ambas tablas"""
+        for campo in CAMPOS_NARRATIVA:
+            setattr(self.instance, campo, self.cleaned_data.get(campo))
+        if not self.instance.operador_id and self.user and self.user.is_authenticated:
+            self.instance.operador = operador_de_usuario(self.user)
+        return super().save(commit)
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -170,3 +213,22 @@ class CustomUserCreationForm(UserCreationForm):
         super().__init__(*args, **kwargs)
         self.fields['password1'].widget.attrs['class'] = 'form-control'
         self.fields['password2'].widget.attrs['class'] = 'form-control'
+
+
+class ImportacionForm(forms.Form):
+    """CSV del formulario de carga para importar en segundo plano"""
+    archivo = forms.FileField(
+        label='Archivo CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
+    actualizar = forms.BooleanField(
+        required=False,
+        label='Actualizar las filas ya importadas (en lugar de omitirlas)',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith('.csv'):
+            raise forms.ValidationError('El archivo tiene que ser un CSV')
+        return archivo
@@ -0,0 +1,168 @@
+"""
+Gráficos del panel de informes.
+
+Cada gráfico se arma a partir de los desgloses de ResumenInformes como un
+diccionario con las trazas y el diseño que espera Plotly.newPlot en el
+navegador; el servidor no construye figuras de Plotly. Los desgloses y los
+gráficos se guardan en una caché LRU en memoria, con clave en los filtros
+normalizados y la versión de los datos.
+
+El panel pide cada gráfico por separado (vista grafico_informes), así que cada
+uno agrupa solo por la columna que necesita. La tendencia admite además el
+período (día, semana, mes o automático), que forma parte de la clave.
+"""
+from .cache import CacheLRU, clave_filtros, version_datos
+from .estadisticas import (
+    DIAS_SEMANA, PERIODOS, calcular_resumen_filtrado, carga_por_hora_semana, contar_rangos_edad, serie_temporal,
+)
+
+
+# Caché de cada proceso: pocas combinaciones de filtros se repiten mucho
+CACHE_GRAFICOS = CacheLRU(max_entradas=64, timeout=15 * 60)
+
+MARGEN = {'l': 20, 'r': 20, 't': 40, 'b': 20}
+
+# Lo esencial de la plantilla "plotly" que aplicaba plotly.py: colores, fondo y grilla
+DISENIO_BASE = {
+    'colorway': ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A', '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'],
+    'plot_bgcolor': '#E5ECF6',
+    'paper_bgcolor': 'white',
+    'font': {'color': '#2a3f5f'},
+    'xaxis': {'gridcolor': 'white', 'zerolinecolor': 'white', 'automargin': True},
+    'yaxis': {'gridcolor': 'white', 'zerolinecolor': 'white', 'automargin': True},
+}
+
+
+def datos_filtros(filterset):
+    """Clave de caché de los filtros: versión de los datos y hash de los filtros normalizados"""
+    filterset.is_valid()  # cleaned_data de los filtros
+    return version_datos(), clave_filtros(filterset.form.cleaned_data)
+
+
+def total_informes(filterset):
+    """Cantidad de consultas que cumplen los filtros (sin calcular desgloses)"""
+    return CACHE_GRAFICOS.obtener(
+        (*datos_filtros(filterset), 'total'),
+        lambda: calcular_resumen_filtrado(filterset, dimensiones=[], sustancias=False).total,
+    )
+
+
+def grafico_informes(filterset, nombre, periodo=None):
+    """
+    Devuelve el gráfico `nombre` para los filtros, o None si no hay datos para
+    graficar. `periodo` (una clave de PERIODOS) solo se usa en la tendencia.
+    """
+    dimension, construir = GRAFICOS[nombre]
+    periodo = periodo if dimension == 'serie_temporal' and periodo in PERIODOS else None
+
+    def calcular():
+        if dimension == 'serie_temporal':
+            desglose = serie_temporal(filterset, periodo)
+            desglose = desglose if desglose[1] else None
+        elif dimension == 'hora_semana':
+            desglose = carga_por_hora_semana(filterset.qs)
+            desglose = desglose if any(map(any, desglose)) else None
+        elif dimension == 'rango_edad':
+            # La edad no está en el resumen diario: se agrupa sobre las consultas filtradas
+            desglose = contar_rangos_edad(filterset.qs)
+        elif dimension == 'sustancias':
+            desglose = calcular_resumen_filtrado(filterset, dimensiones=[]).sustancias
+        else:
+            resumen = calcular_resumen_filtrado(filterset, dimensiones=[COLUMNAS[dimension]], sustancias=False)
+            desglose = getattr(resumen, dimension)
+        return construir(desglose) if desglose else None
+
+    return CACHE_GRAFICOS.obtener((*datos_filtros(filterset), nombre, periodo), calcular)
+
+
+def disenio(titulo, eje_x=None, eje_y=None, angulo_x=None):
+    """Diseño de un gráfico sobre DISENIO_BASE"""
+    layout = {**DISENIO_BASE, 'title': {'text': titulo}, 'margin': MARGEN}
+    if eje_x is not None:
+        layout['xaxis'] = {**DISENIO_BASE['xaxis'], 'title': {'text': eje_x}}
+        if angulo_x is not None:
+            layout['xaxis']['tickangle'] = angulo_x
+    if eje_y is not None:
+        layout['yaxis'] = {**DISENIO_BASE['yaxis'], 'title': {'text': eje_y}}
+    return layout
+
+
+def grafico_torta(titulo, desglose, etiqueta=str, agujero=None):
+    traza = {
+        'type': 'pie',
+        'labels': [etiqueta(valor) for valor, _ in desglose],
+        'values': [cantidad for _, cantidad in desglose],
+    }
+    if agujero:
+        traza['hole'] = agujero
+    return {'data': [traza], 'layout': disenio(titulo)}
+
+
+def grafico_barras(titulo, desglose, color, eje_x, eje_y='Cantidad', angulo_x=None):
+    traza = {
+        'type': 'bar',
+        'x': [valor for valor, _ in desglose],
+        'y': [cantidad for _, cantidad in desglose],
+        'marker': {'color': color},
+    }
+    return {'data': [traza], 'layout': disenio(titulo, eje_x, eje_y, angulo_x)}
+
+
+def grafico_tendencia(desglose):
+    periodo, serie = desglose
+    titulos = {'dia': 'Consultas por Día', 'semana': 'Consultas por Semana', 'mes': 'Consultas por Mes'}
+    traza = {
+        'type': 'scatter',
+        'mode': 'lines',
+        'x': [inicio.isoformat() for inicio, _ in serie],
+        'y': [cantidad for _, cantidad in serie],
+        'line': {'color': '#4e73df'},
+        'fill': 'tozeroy',
+    }
+    return {'data': [traza], 'layout': disenio(titulos[periodo], 'Fecha', 'Cantidad')}
+
+
+def grafico_mapa_calor(matriz):
+    traza = {
+        'type': 'heatmap',
+        'z': matriz,
+        'x': [f'{hora:02d}' for hora in range(24)],
+        'y': DIAS_SEMANA,
+        'colorscale': 'Blues',
+    }
+    # marca_temporal de las importadas es la hora de la importación: solo entran las cargadas el día de la llamada
+    layout = disenio('Carga por Hora de la Semana<br><sup>Solo consultas cargadas el mismo día de la llamada; no incluye las importadas</sup>', 'Hora')
+    layout['margin'] = {**MARGEN, 't': 60}
+    # Lunes arriba
+    layout['yaxis'] = {**layout['yaxis'], 'autorange': 'reversed'}
+    return {'data': [traza], 'layout': layout}
+
+
+# Columna agrupada para cada desglose de ResumenInformes
+COLUMNAS = {
+    'zona': 'zona',
+    'sexo': 'sexo',
+    'tiempo_consumo': 'tiempo_consumo',
+    'consulta': 'consulta',
+    'tratamiento_anterior': 'tratamiento_anterior',
+    'ciudad': 'ciudad',
+    'situacion_social': 'situacion_social_flags',
+    'operador': 'operador',
+}
+
+# Gráficos del panel, en orden: nombre -> (desglose de ResumenInformes, constructor)
+GRAFICOS = {
+    'zona': ('zona', lambda desglose: grafico_torta('Consultas por Zona', desglose, lambda zona: zona or 'Sin zona', agujero=0.4)),
+    'sexo': ('sexo', lambda desglose: grafico_barras('Consultas por Sexo', desglose, '#4e73df', 'Sexo')),
+    'consulta': ('consulta', lambda desglose: grafico_torta('Tipo de Consulta (Directa/Indirecta)', desglose, lambda tipo: tipo or 'Sin especificar')),
+    'tiempo_consumo': ('tiempo_consumo', lambda desglose: grafico_barras('Tiempo de Consumo', desglose, '#36b9cc', 'Tiempo')),
+    'tratamiento': ('tratamiento_anterior', lambda desglose: grafico_torta('¿Tuvo Tratamiento Anterior?', desglose, lambda trat: 'Sí' if trat == 'SI' else 'No')),
+    'situacion_social': ('situacion_social', lambda desglose: grafico_torta('Situación Social', desglose)),
+    'ciudad': ('ciudad', lambda desglose: grafico_barras('Top 10 Ciudades con más Consultas', desglose, '#4e73df', 'Ciudad', angulo_x=-45)),
+    'sustancias': ('sustancias', lambda desglose: grafico_barras('Sustancias más Reportadas', desglose, '#f6c23e', 'Sustancia', 'Menciones', angulo_x=-45)),
+    'operador': ('operador', lambda desglose: grafico_barras('Consultas por Operador', desglose, '#6f42c1', 'Operador', angulo_x=-45)),
+    'edad': ('rango_edad', lambda desglose: grafico_barras('Consultas por Rango de Edad', desglose, '#1cc88a', 'Edad')),
+    'tendencia': ('serie_temporal', grafico_tendencia),
+    'carga_horaria': ('hora_semana', grafico_mapa_calor),
+}
+
@@ -0,0 +1,306 @@
+"""
+Importación masiva de consultas desde el CSV del formulario de carga.
+
+La limpieza y el parseo de fechas se hacen por columna con pandas, y las
+filas se insertan con bulk_create en lotes, cada uno dentro de su propia
+transacción.
+
+Cada fila lleva una huella (SHA-256 de sus valores normalizados) con índice
+único, de modo que reimportar el mismo archivo solo procesa las filas nuevas.
+"""
+import hashlib
+import re
+import time
+from datetime import date
+
+import pandas as pd
+from django.db import transaction
+
+from .cache import invalidar_datos
+from .edades import calcular_edades
+from .models import (
+    CAMPOS_NARRATIVA, Consulta, actualizar_resumen_diario, guardar_narrativas, ids_operadores, sincronizar_sustancias,
+)
+
+
+# Mapeo de columnas del CSV a campos del modelo
+COLUMNAS_CSV = {
+    'FECHA': 'fecha',
+    'ZONA': 'zona',
+    'OPERADOR': 'operador',
+    'APELLIDO Y NOMBRE INTERLOCUTOR': 'apellido_nombre_interlocutor',
+    'CONSULTA': 'consulta',
+    'TELÉFONO  INTERLOCUTOR': 'telefono_interlocutor',
+    'TIPO DE VÍNCULO CONSULTA INDIRECTA': 'tipo_vinculo',
+    'MOTIVO DE LA CONSULTA': 'motivo_consulta',
+    'APELLIDO y NOMBRE USUARIO': 'apellido_nombre_usuario',
+    'DNI': 'dni',
+    'FECHA DE NACIMIENTO': 'fecha_nacimiento',
+    'EDAD': 'edad',
+    'SEXO': 'sexo',
+    'NACIONALIDAD': 'nacionalidad',
+    'CIUDAD': 'ciudad',
+    'BARRIO': 'barrio',
+    'DIRECCION': 'direccion',
+    'TELEFONO': 'telefono',
+    'ESCOLARIZADO': 'escolarizado',
+    'ETAPA ESCOLAR': 'etapa_escolar',
+    'OBRA SOCIAL': 'obra_social',
+    'NOMBRE OBRA SOCIAL': 'nombre_obra_social',
+    'OCUPACION ': 'ocupacion',
+    'APELLIDO Y NOMBRE REFERENCIA AFECTIVA': 'apellido_nombre_referencia',
+    'DNI  REFERENCIA AFECTIVA': 'dni_referencia',
+    'TELEFONO  REFERENCIA AFECTIVA': 'telefono_referencia',
+    'TIEMPO DE CONSUMO ': 'tiempo_consumo',
+    'TIPO DE SUSTANCIA QUE CONSUME ': 'tipo_sustancia',
+    'TRATAMIENTO ANTERIOR': 'tratamiento_anterior',
+    'TIPO DE TRATAMIENTO ANTERIOR': 'tipo_tratamiento_anterior',
+    'EFECTOR DE SALUD DE REFERENCIA': 'efector_salud_referencia',
+    'RIESGO INMINENTE': 'riesgo_inminente',
+    'INSTITUCION / EFECTOR DERIVADO': 'institucion_derivado',
+    'SEGUIMIENTO': 'seguimiento',
+    'SITUACION SOCIAL': 'situacion_social',
+    'CARACTERÍSTICA JUDICIAL': 'caracteristica_judicial',
+    'INTERVENCIÓN PROPUESTA': 'intervencion_propuesta',
+}
+
+# Valores por defecto de los campos obligatorios que vienen vacíos
+VALORES_POR_DEFECTO = {
+    'zona': 'Sur',
+    'operador': 'Sistema',
+    'apellido_nombre_interlocutor': 'No especificado',
+    'consulta': 'Directa',
+    'motivo_consulta': 'Sin especificar',
+    'apellido_nombre_usuario': 'No especificado',
+    'sexo': 'Hombre',
+    'nacionalidad': 'Argentina',
+    'ciudad': 'No especificada',
+}
+
+# Textos que se consideran "sin dato"
+VALORES_NULOS = ['nan', 'none', 'null', '', 'no lo aporto', 'sin dato', 'sin datos', 's/d']
+
+FORMATOS_FECHA = ['%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d', '%d-%m-%Y']
+
+TAMANIO_LOTE = 1000
+
+# Número entero escrito como texto, con ceros a la izquierda o ".0" (grupo 1: sus dígitos)
+PATRON_ENTERO = re.compile(r'0*(\d+?)(?:\.0+)?')
+
+# Campos que forman la huella de una fila, en orden fijo
+CAMPOS_HUELLA = list(COLUMNAS_CSV.values())
+
+# Campos que se actualizan al reimportar una fila ya existente (la narrativa se guarda aparte)
+CAMPOS_ACTUALIZABLES = [
+    campo for campo in CAMPOS_HUELLA if campo not in CAMPOS_NARRATIVA
+] + ['situacion_social_flags', 'nacimiento', 'edad_anios']
+
+
+def limpiar_columna(serie):
+    """Recorta espacios y convierte a nulo los valores vacíos o "sin dato" de una columna"""
+    texto = serie.astype('string').str.strip()
+    return texto.mask(texto.str.lower().isin(VALORES_NULOS))
+
+
+def parsear_fechas(serie):
+    """Parsea una columna de fechas probando cada formato conocido sobre toda la columna"""
+    texto = serie.astype('string').str.strip().str.split().str[0]
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+    for formato in FORMATOS_FECHA:
+        fechas = fechas.fillna(pd.to_datetime(texto, format=formato, errors='coerce'))
+    return fechas
+
+
+def preparar_datos(df):
+    """Convierte el DataFrame del CSV en columnas limpias con los nombres del modelo"""
+    datos = pd.DataFrame(index=df.index)
+    for columna, campo in COLUMNAS_CSV.items():
+        if campo == 'fecha':
+            continue
+        if columna in df.columns:
+            datos[campo] = limpiar_columna(df[columna])
+        else:
+            datos[campo] = pd.Series(pd.NA, index=df.index, dtype='string')
+
+    for campo, valor in VALORES_POR_DEFECTO.items():
+        datos[campo] = datos[campo].fillna(valor)
+
+    fechas = parsear_fechas(df['FECHA']) if 'FECHA' in df.columns else pd.Series(pd.NaT, index=df.index)
+    datos['fecha'] = fechas.dt.date
+
+    # Campos derivados que bulk_create no calcula (no llama a save())
+    mascaras = {
+        texto: Consulta.mascara_situacion_social(texto)
+        for texto in datos['situacion_social'].dropna().unique()
+    }
+    datos['situacion_social_flags'] = datos['situacion_social'].map(mascaras).fillna(0).astype(int)
+    # El nombre de operador queda para la huella; la consulta guarda la clave
+    datos['operador_id'] = datos['operador'].map(ids_operadores(datos['operador'].unique()))
+
+    return datos.astype(object).where(datos.notna(), None)
+
+
+def formatear_valor(valor):
+    """
+    Texto normalizado de un valor para calcular la huella. Los enteros se
+    escriben sin ceros a la izquierda ni ".0": el importador anterior leía
+    como float las columnas numéricas con algún vacío (DNI "30123456.0").
+    """
+    if valor is None:
+        return ''
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor)
+    entero = PATRON_ENTERO.fullmatch(texto)
+    return entero.group(1) if entero else texto
+
+
+def calcular_huella(valores):
+    """Calcula la huella de una fila a partir de sus valores en el orden de CAMPOS_HUELLA"""
+    texto = '\x1f'.join(formatear_valor(valor) for valor in valores)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def calcular_huellas(datos):
+    """Calcula la huella de cada fila de los datos preparados"""
+    return pd.Series(
+        [calcular_huella(valores) for valores in datos[CAMPOS_HUELLA].itertuples(index=False, name=None)],
+        index=datos.index,
+        dtype=object,
+    )
+
+
+def huellas_existentes(huellas, tamanio_lote=TAMANIO_LOTE):
+    """Devuelve las huellas que ya están cargadas en la base de datos"""
+    huellas = list(huellas)
+    existentes = set()
+    for desde in range(0, len(huellas), tamanio_lote):
+        existentes.update(
+            Consulta.objects.filter(huella__in=huellas[desde:desde + tamanio_lote]).values_list('huella', flat=True)
+        )
+    return existentes
+
+
+def guardar_consultas(consultas, actualizar):
+    """Inserta (o actualiza por huella) las consultas con su narrativa y sincroniza sus sustancias y el resumen diario"""
+    dias = {consulta.fecha for consulta in consultas}
+    if actualizar:
+        # Una FECHA inválida se guarda como la fecha del día de importación, así
+        # que la fila actualizada puede cambiar de día: el resumen se recalcula
+        # también en el día en que estaba guardada
+        dias.update(Consulta.objects.filter(
+            huella__in=[consulta.huella for consulta in consultas]
+        ).values_list('fecha', flat=True))
+        Consulta.objects.bulk_create(
+            consultas,
+            update_conflicts=True,
+            unique_fields=['huella'],
+            update_fields=CAMPOS_ACTUALIZABLES,
+        )
+        # Algunos motores no devuelven la clave de las filas actualizadas
+        if any(consulta.pk is None for consulta in consultas):
+            pks = dict(Consulta.objects.filter(
+                huella__in=[consulta.huella for consulta in consultas]
+            ).values_list('huella', 'pk'))
+            for consulta in consultas:
+                consulta.pk = pks[consulta.huella]
+    else:
+        Consulta.objects.bulk_create(consultas)
+    guardar_narrativas(consultas)
+    sincronizar_sustancias(consultas)
+    actualizar_resumen_diario(dias)
+
+
+def insertar_lote(consultas, filas, errores, actualizar=False):
+    """
+    Guarda un lote en una transacción; si falla, guarda fila por fila para
+    aislar los errores. Devuelve las consultas guardadas.
+    """
+    try:
+        with transaction.atomic():
+            guardar_consultas(consultas, actualizar)
+        return consultas
+    except Exception:
+        pass
+
+    guardadas = []
+    for consulta, fila in zip(consultas, filas):
+        consulta.pk = None
+        try:
+            with transaction.atomic():
+                guardar_consultas([consulta], actualizar)
+            guardadas.append(consulta)
+        except Exception as e:
+            errores.append({'fila': fila, 'error': str(e)})
+    return guardadas
+
+
+def importar_csv(ruta, tamanio_lote=TAMANIO_LOTE, actualizar=False, progreso=None):
+    """
+    Importa las consultas de un CSV del formulario y devuelve un resumen.
+
+    Las filas cuya huella ya existe se omiten, o se actualizan si
+    `actualizar` es verdadero. `progreso`, si se indica, se llama con
+    (filas procesadas, filas totales) después de cada lote.
+    """
+    inicio = time.monotonic()
+
+    # Todo como texto: evita que pandas convierta DNI y teléfonos a float
+    df = pd.read_csv(ruta, encoding='utf-8', dtype=str, keep_default_na=False)
+    datos = preparar_datos(df)
+    filas_leidas = len(datos)
+
+    # La huella se calcula antes de completar fechas inválidas, para que no dependa del día
+    datos['huella'] = calcular_huellas(datos)
+    duplicadas = datos['huella'].duplicated()
+    datos = datos[~duplicadas]
+
+    existentes = huellas_existentes(datos['huella'])
+    if not actualizar:
+        datos = datos[~datos['huella'].isin(existentes)]
+
+    avisos = []
+    errores = []
+
+    # Las fechas inválidas se reemplazan por la fecha actual, como en la carga manual
+    hoy = date.today()
+    for idx in datos.index[datos['fecha'].isna()]:
+        fecha_raw = df.at[idx, 'FECHA'] if 'FECHA' in df.columns else None
+        avisos.append({'fila': idx + 2, 'aviso': f"Fecha inválida '{fecha_raw}', usando fecha actual"})
+    datos['fecha'] = datos['fecha'].where(datos['fecha'].notna(), hoy)
+    # La edad calculada con la fecha de nacimiento depende de la fecha de la consulta
+    datos['nacimiento'], datos['edad_anios'] = calcular_edades(datos['edad'], datos['fecha_nacimiento'], datos['fecha'])
+
+    total = len(datos)
+    creadas = 0
+    actualizadas = 0
+    registros = datos.drop(columns='operador').to_dict('records')
+    for desde in range(0, total, tamanio_lote):
+        lote = registros[desde:desde + tamanio_lote]
+        consultas = [Consulta(**registro) for registro in lote]
+        filas = [idx + 2 for idx in datos.index[desde:desde + tamanio_lote]]
+        for consulta in insertar_lote(consultas, filas, errores, actualizar):
+            if consulta.huella in existentes:
+                actualizadas += 1
+            else:
+                creadas += 1
+        if progreso:
+            progreso(min(desde + tamanio_lote, total), total)
+
+    # bulk_create no dispara post_save: invalidar la caché a mano
+    if creadas or actualizadas:
+        invalidar_datos()
+
+    segundos = time.monotonic() - inicio
+    return {
+        'archivo': str(ruta),
+        'filas_leidas': filas_leidas,
+        'creadas': creadas,
+        'actualizadas': actualizadas,
+        'omitidas': filas_leidas - total - int(duplicadas.sum()),
+        'duplicadas_en_archivo': int(duplicadas.sum()),
+        'errores': errores,
+        'avisos': avisos,
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(filas_leidas / segundos, 1) if segundos else None,
+    }
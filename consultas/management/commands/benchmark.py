@@ -0,0 +1,64 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas.benchmark import FILAS_IMPORTACION, comparar, ejecutar_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Mide la duración y las consultas SQL de informes, búsqueda, exportación, formulario e importación y guarda los resultados en JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones medidas por escenario (por defecto 5)')
+        parser.add_argument('--solo', nargs='+', help='Ejecutar solo los escenarios indicados')
+        parser.add_argument('--filas-importacion', type=int, default=FILAS_IMPORTACION, help=f'Filas del CSV de importación (por defecto {FILAS_IMPORTACION}; 0 para omitirla)')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--comparar', help='Resultados JSON de una corrida anterior para comparar')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('Las repeticiones deben ser mayores que cero')
+        anterior = None
+        if options['comparar']:
+            ruta = Path(options['comparar'])
+            if not ruta.exists():
+                raise CommandError(f'No existe el archivo: {ruta}')
+            anterior = json.loads(ruta.read_text(encoding='utf-8'))
+
+        def progreso(nombre, resultado):
+            extra = f", {resultado['filas_por_segundo']} filas/s" if 'filas_por_segundo' in resultado else ''
+            self.stdout.write(
+                f"{nombre:<30} mediana {resultado['mediana_ms']:>9} ms  p90 {resultado['p90_ms']:>9} ms  "
+                f"{resultado['consultas_sql']:>4} consultas SQL{extra}"
+            )
+
+        self.stdout.write('Ejecutando benchmark...')
+        resultados = ejecutar_benchmark(
+            repeticiones=options['repeticiones'],
+            solo=options['solo'],
+            filas_importacion=options['filas_importacion'],
+            progreso=progreso,
+        )
+
+        if options['salida']:
+            Path(options['salida']).write_text(json.dumps(resultados, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en: {options['salida']}"))
+
+        if anterior:
+            self.stdout.write('=' * 50)
+            self.stdout.write(f"Comparación con {options['comparar']} ({anterior.get('commit') or 'sin commit'}, {anterior.get('consultas')} consultas)")
+            if anterior.get('consultas') != resultados['consultas']:
+                self.stdout.write(self.style.WARNING(
+                    f"La corrida anterior tenía {anterior.get('consultas')} consultas y esta {resultados['consultas']}: los tiempos no son comparables"
+                ))
+            for nombre, previo, actual, variacion in comparar(anterior, resultados):
+                texto = f'{nombre:<30} {previo:>9} ms -> {actual:>9} ms'
+                if variacion is None:
+                    self.stdout.write(texto)
+                elif variacion > 10:
+                    self.stdout.write(self.style.ERROR(f'{texto}  {variacion:+.1f}%'))
+                elif variacion < -10:
+                    self.stdout.write(self.style.SUCCESS(f'{texto}  {variacion:+.1f}%'))
+                else:
+                    self.stdout.write(f'{texto}  {variacion:+.1f}%')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas.cache import invalidar_datos
+from consultas.models import completar_edades
+
+
+class Command(BaseCommand):
+    help = 'Calcula la fecha de nacimiento y la edad tipadas de las consultas a partir de sus textos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Consultas leídas por lote (por defecto 5000)')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('El lote debe ser mayor que cero')
+
+        def progreso(procesadas, actualizadas):
+            self.stdout.write(f'Procesadas {procesadas} consultas, {actualizadas} actualizadas...')
+
+        actualizadas = completar_edades(options['lote'], progreso)
+        invalidar_datos()
+        self.stdout.write(self.style.SUCCESS(f'Edades completadas: {actualizadas} consultas actualizadas'))
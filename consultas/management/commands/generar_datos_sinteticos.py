@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas.datos_sinteticos import TAMANIO_LOTE, borrar_consultas_sinteticas, generar_consultas
+
+
+class Command(BaseCommand):
+    help = 'Genera consultas sintéticas con distribuciones realistas para medir el rendimiento a escala'
+
+    def add_arguments(self, parser):
+        parser.add_argument('cantidad', type=int, nargs='?', default=0, help='Cantidad de consultas a generar')
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primera fecha (AAAA-MM-DD; por defecto, hace dos años)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Última fecha (AAAA-MM-DD; por defecto, hoy)')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla del generador (la misma semilla genera los mismos datos)')
+        parser.add_argument('--lote', type=int, default=TAMANIO_LOTE, help=f'Consultas por lote (por defecto {TAMANIO_LOTE})')
+        parser.add_argument('--borrar', action='store_true', help='Borrar las consultas sintéticas existentes antes de generar')
+
+    def handle(self, *args, **options):
+        if options['cantidad'] < 0 or options['lote'] < 1:
+            raise CommandError('La cantidad no puede ser negativa y el lote debe ser mayor que cero')
+        if options['desde'] and options['hasta'] and options['desde'] > options['hasta']:
+            raise CommandError('La fecha desde es posterior a la fecha hasta')
+
+        if options['borrar']:
+            borradas = borrar_consultas_sinteticas()
+            self.stdout.write(self.style.SUCCESS(f'Consultas sintéticas borradas: {borradas}'))
+        if not options['cantidad']:
+            return
+
+        def progreso(insertadas, total):
+            self.stdout.write(f'Insertadas {insertadas} de {total} consultas...')
+
+        insertadas = generar_consultas(
+            options['cantidad'],
+            desde=options['desde'],
+            hasta=options['hasta'],
+            semilla=options['semilla'],
+            tamanio_lote=options['lote'],
+            progreso=progreso,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Consultas sintéticas generadas: {insertadas}'))
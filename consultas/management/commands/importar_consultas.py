@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consultas.importacion import TAMANIO_LOTE, importar_csv
+from consultas.models import Tarea
+from consultas.tareas import encolar
+
+
+class Command(BaseCommand):
+    help = 'Importa consultas desde el CSV del formulario de carga usando inserciones por lotes; las filas ya importadas se omiten'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV')
+        parser.add_argument('--lote', type=int, default=TAMANIO_LOTE, help=f'Filas por lote (por defecto {TAMANIO_LOTE})')
+        parser.add_argument('--actualizar', action='store_true', help='Actualizar las filas ya importadas en lugar de omitirlas')
+        parser.add_argument('--resumen', help='Archivo JSON donde guardar el resumen (por defecto, junto al CSV)')
+        parser.add_argument('--segundo-plano', action='store_true', help='Encolar la importación para el comando procesar_tareas en lugar de ejecutarla')
+
+    def handle(self, *args, **options):
+        archivo = Path(options['archivo'])
+        if not archivo.exists():
+            raise CommandError(f'No existe el archivo: {archivo}')
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor que cero')
+
+        if options['segundo_plano']:
+            tarea = encolar(Tarea.IMPORTACION, {
+                'archivo': str(archivo.resolve()),
+                'lote': options['lote'],
+                'actualizar': options['actualizar'],
+            })
+            self.stdout.write(self.style.SUCCESS(f'Importación encolada como tarea #{tarea.pk}'))
+            return
+
+        self.stdout.write(f'Leyendo archivo: {archivo}')
+
+        def progreso(procesadas, total):
+            self.stdout.write(f'Procesadas {procesadas} de {total} filas...')
+
+        resumen = importar_csv(archivo, tamanio_lote=options['lote'], actualizar=options['actualizar'], progreso=progreso)
+
+        ruta_resumen = Path(options['resumen'] or archivo.with_suffix('.resumen.json'))
+        ruta_resumen.write_text(json.dumps(resumen, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        for aviso in resumen['avisos']:
+            self.stdout.write(self.style.WARNING(f"Fila {aviso['fila']}: {aviso['aviso']}"))
+        for error in resumen['errores']:
+            self.stdout.write(self.style.ERROR(f"Error en fila {error['fila']}: {error['error']}"))
+
+        self.stdout.write('=' * 50)
+        self.stdout.write(self.style.SUCCESS('Importación completada!'))
+        self.stdout.write(f"Filas leídas: {resumen['filas_leidas']}")
+        self.stdout.write(f"Registros creados: {resumen['creadas']}")
+        self.stdout.write(f"Registros actualizados: {resumen['actualizadas']}")
+        self.stdout.write(f"Ya importados (omitidos): {resumen['omitidas']}")
+        self.stdout.write(f"Duplicados en el archivo: {resumen['duplicadas_en_archivo']}")
+        self.stdout.write(f"Errores: {len(resumen['errores'])}")
+        self.stdout.write(f"Tiempo: {resumen['segundos']} s ({resumen['filas_por_segundo']} filas/s)")
+        self.stdout.write(f'Resumen guardado en: {ruta_resumen}')
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from consultas.tareas import ejecutar, limpiar_vencidas, marcar_interrumpidas, tomar_siguiente
+
+
+# Segundos entre dos limpiezas de tareas vencidas
+INTERVALO_LIMPIEZA = 3600
+
+
+class Command(BaseCommand):
+    help = 'Procesa las tareas en segundo plano (exportaciones e importaciones) encoladas en la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay tareas (por defecto 2)')
+        parser.add_argument('--una-vez', action='store_true', help='Procesar las tareas pendientes y terminar')
+
+    def handle(self, *args, **options):
+        interrumpidas = marcar_interrumpidas()
+        if interrumpidas:
+            self.stdout.write(self.style.WARNING(f'Tareas interrumpidas marcadas con error: {interrumpidas}'))
+
+        self.stdout.write('Esperando tareas...')
+        ultima_limpieza = None
+        try:
+            while True:
+                close_old_connections()
+                if ultima_limpieza is None or time.monotonic() - ultima_limpieza >= INTERVALO_LIMPIEZA:
+                    borradas = limpiar_vencidas()
+                    if borradas:
+                        self.stdout.write(f'Tareas vencidas borradas con sus archivos: {borradas}')
+                    ultima_limpieza = time.monotonic()
+                tarea = tomar_siguiente()
+                if tarea is None:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f'Ejecutando {tarea}')
+                if ejecutar(tarea):
+                    self.stdout.write(self.style.SUCCESS(f'Tarea #{tarea.pk} completada'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'Tarea #{tarea.pk} terminó con error'))
+        except KeyboardInterrupt:
+            self.stdout.write('Proceso de tareas detenido')
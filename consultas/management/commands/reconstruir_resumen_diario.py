@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from consultas.cache import invalidar_datos
+from consultas.models import reconstruir_resumen_diario
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de consultas usado por el panel de informes'
+
+    def handle(self, *args, **options):
+        dias = reconstruir_resumen_diario()
+        invalidar_datos()
+        self.stdout.write(self.style.SUCCESS(f'Resumen diario reconstruido: {dias} días'))
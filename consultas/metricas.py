@@ -0,0 +1,194 @@
+"""
+Métricas de latencia y SQL por vista.
+
+MetricasMiddleware mide cada request: duración total, cantidad de consultas
+SQL y tiempo en la base (con connection.execute_wrapper). Los valores se
+agrupan por nombre de ruta en un registro en memoria del proceso, que se ve en
+la página de métricas y en formato de texto de Prometheus.
+
+Con varios procesos de Gunicorn cada uno tiene su propio registro: Prometheus
+los distingue por la etiqueta de la instancia o se suman al consultar.
+
+En las respuestas por streaming (exportaciones) solo se mide hasta que empieza
+la descarga; las consultas hechas mientras se genera el archivo no se cuentan.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+# Duraciones guardadas por vista para calcular percentiles
+MUESTRAS_POR_VISTA = 1000
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+# Requests que no corresponden a ninguna ruta (404) se agrupan en una sola vista
+SIN_RUTA = 'sin_ruta'
+
+
+def percentil(valores_ordenados, fraccion):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, max(0, math.ceil(fraccion * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+class MedicionSQL:
+    """execute_wrapper que cuenta las consultas SQL y su tiempo"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class MetricasVista:
+    """Acumulados de una vista y las últimas duraciones para los percentiles"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errores = 0
+        self.segundos = 0.0
+        self.consultas_sql = 0
+        self.segundos_sql = 0.0
+        self.max_consultas_sql = 0
+        self.duraciones = deque(maxlen=MUESTRAS_POR_VISTA)
+        self.consultas_por_request = deque(maxlen=MUESTRAS_POR_VISTA)
+
+
+class RegistroMetricas:
+    """Métricas de todas las vistas del proceso"""
+
+    def __init__(self):
+        self.vistas = {}
+        self.lock = threading.Lock()
+
+    def registrar(self, vista, segundos, medicion, error=False):
+        with self.lock:
+            metricas = self.vistas.get(vista)
+            if metricas is None:
+                metricas = self.vistas[vista] = MetricasVista()
+            metricas.requests += 1
+            metricas.errores += int(error)
+            metricas.segundos += segundos
+            metricas.consultas_sql += medicion.consultas
+            metricas.segundos_sql += medicion.segundos
+            metricas.max_consultas_sql = max(metricas.max_consultas_sql, medicion.consultas)
+            metricas.duraciones.append(segundos)
+            metricas.consultas_por_request.append(medicion.consultas)
+
+    def limpiar(self):
+        with self.lock:
+            self.vistas.clear()
+
+    def resumen(self):
+        """Una fila por vista con requests, percentiles de latencia (ms) y SQL, de la más lenta a la más rápida"""
+        with self.lock:
+            copia = [
+                (vista, metricas.requests, metricas.errores, metricas.segundos, metricas.consultas_sql,
+                 metricas.segundos_sql, metricas.max_consultas_sql, sorted(metricas.duraciones),
+                 sorted(metricas.consultas_por_request))
+                for vista, metricas in self.vistas.items()
+            ]
+        filas = []
+        for vista, requests, errores, segundos, consultas_sql, segundos_sql, max_sql, duraciones, por_request in copia:
+            filas.append({
+                'vista': vista,
+                'requests': requests,
+                'errores': errores,
+                'segundos': segundos,
+                'promedio_ms': round(segundos / requests * 1000, 1),
+                'percentiles_ms': {p: round(percentil(duraciones, p) * 1000, 1) for p in PERCENTILES},
+                'consultas_sql': consultas_sql,
+                'consultas_promedio': round(consultas_sql / requests, 1),
+                'consultas_p90': percentil(por_request, 0.9),
+                'max_consultas_sql': max_sql,
+                'segundos_sql': segundos_sql,
+                'sql_promedio_ms': round(segundos_sql / requests * 1000, 1),
+            })
+        filas.sort(key=lambda fila: fila['percentiles_ms'][0.9], reverse=True)
+        return filas
+
+
+REGISTRO = RegistroMetricas()
+
+
+class MetricasMiddleware:
+    """Mide la latencia y las consultas SQL de cada request y las registra por vista"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = MedicionSQL()
+        inicio = time.perf_counter()
+        error = True
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion))
+                response = self.get_response(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            coincidencia = getattr(request, 'resolver_match', None)
+            vista = (coincidencia.view_name if coincidencia else None) or SIN_RUTA
+            REGISTRO.registrar(vista, time.perf_counter() - inicio, medicion, error)
+
+
+def escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def texto_prometheus(registro=REGISTRO, caches=None):
+    """Métricas en el formato de texto de Prometheus; `caches` es {nombre: CacheLRU}"""
+    filas = registro.resumen()
+    lineas = [
+        '# HELP sistema0800_request_duration_seconds Duración de los requests por vista',
+        '# TYPE sistema0800_request_duration_seconds summary',
+    ]
+    for fila in filas:
+        vista = escapar_etiqueta(fila['vista'])
+        for p, valor in fila['percentiles_ms'].items():
+            lineas.append(f'sistema0800_request_duration_seconds{{vista="{vista}",quantile="{p}"}} {round(valor / 1000, 4)}')
+        lineas.append(f'sistema0800_request_duration_seconds_sum{{vista="{vista}"}} {fila["segundos"]}')
+        lineas.append(f'sistema0800_request_duration_seconds_count{{vista="{vista}"}} {fila["requests"]}')
+
+    metricas_vista = [
+        ('requests_errors_total', 'counter', 'Requests con respuesta 5xx o excepción', 'errores'),
+        ('sql_queries_total', 'counter', 'Consultas SQL ejecutadas', 'consultas_sql'),
+        ('sql_duration_seconds_total', 'counter', 'Tiempo en consultas SQL', 'segundos_sql'),
+        ('sql_queries_max', 'gauge', 'Máximo de consultas SQL en un request', 'max_consultas_sql'),
+    ]
+    for nombre, tipo, ayuda, clave in metricas_vista:
+        lineas.append(f'# HELP sistema0800_{nombre} {ayuda}')
+        lineas.append(f'# TYPE sistema0800_{nombre} {tipo}')
+        for fila in filas:
+            lineas.append(f'sistema0800_{nombre}{{vista="{escapar_etiqueta(fila["vista"])}"}} {fila[clave]}')
+
+    if caches:
+        metricas_cache = [
+            ('cache_hits_total', 'counter', 'Aciertos de la caché', 'aciertos'),
+            ('cache_misses_total', 'counter', 'Fallos de la caché', 'fallos'),
+            ('cache_evictions_total', 'counter', 'Entradas desalojadas de la caché', 'desalojos'),
+            ('cache_entries', 'gauge', 'Entradas actuales de la caché', 'entradas'),
+        ]
+        estadisticas = {nombre: cache.estadisticas() for nombre, cache in caches.items()}
+        for nombre, tipo, ayuda, clave in metricas_cache:
+            lineas.append(f'# HELP sistema0800_{nombre} {ayuda}')
+            lineas.append(f'# TYPE sistema0800_{nombre} {tipo}')
+            for cache, valores in estadisticas.items():
+                lineas.append(f'sistema0800_{nombre}{{cache="{escapar_etiqueta(cache)}"}} {valores[clave]}')
+    return '\n'.join(lineas) + '\n'
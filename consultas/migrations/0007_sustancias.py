@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0006_alter_consulta_sexo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sustancia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=200, unique=True, verbose_name='Nombre')),
+            ],
+            options={
+                'verbose_name': 'Sustancia',
+                'verbose_name_plural': 'Sustancias',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsultaSustancia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consulta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consulta_sustancias', to='consultas.consulta')),
+                ('sustancia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consulta_sustancias', to='consultas.sustancia')),
+            ],
+            options={
+                'verbose_name': 'Sustancia de la consulta',
+                'verbose_name_plural': 'Sustancias de la consulta',
+            },
+        ),
+        migrations.AddField(
+            model_name='consulta',
+            name='sustancias',
+            field=models.ManyToManyField(blank=True, related_name='consultas', through='consultas.ConsultaSustancia', to='consultas.sustancia', verbose_name='Sustancias'),
+        ),
+        migrations.AddIndex(
+            model_name='consultasustancia',
+            index=models.Index(fields=['sustancia', 'consulta'], name='sustancia_consulta_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='consultasustancia',
+            constraint=models.UniqueConstraint(fields=('consulta', 'sustancia'), name='consulta_sustancia_unica'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def completar_sustancias(apps, schema_editor):
+    """Crea las sustancias y los vínculos a partir del texto tipo_sustancia existente"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    Sustancia = apps.get_model('consultas', 'Sustancia')
+    ConsultaSustancia = apps.get_model('consultas', 'ConsultaSustancia')
+
+    registros = Consulta.objects.exclude(
+        tipo_sustancia__isnull=True
+    ).exclude(
+        tipo_sustancia=''
+    ).values_list('id', 'tipo_sustancia')
+
+    nombres_por_consulta = {}
+    for pk, texto in registros.iterator(chunk_size=2000):
+        nombres = {s.strip() for s in texto.replace(', ', ',').split(',') if s.strip()}
+        if nombres:
+            nombres_por_consulta[pk] = nombres
+
+    todos = set().union(*nombres_por_consulta.values()) if nombres_por_consulta else set()
+    Sustancia.objects.bulk_create([Sustancia(nombre=n) for n in sorted(todos)], ignore_conflicts=True)
+    ids = dict(Sustancia.objects.values_list('nombre', 'id'))
+
+    ConsultaSustancia.objects.bulk_create(
+        [
+            ConsultaSustancia(consulta_id=pk, sustancia_id=ids[nombre])
+            for pk, nombres in nombres_por_consulta.items()
+            for nombre in nombres
+        ],
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0007_sustancias'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_sustancias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0008_completar_sustancias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='situacion_social_flags',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, verbose_name='Situación Social (máscara)'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+# Copia de Consulta.SITUACION_SOCIAL_CHOICES al momento de esta migración
+SITUACIONES = [
+    'Situación de Calle',
+    'Infancia',
+    'Violencia',
+    'Pueblos Originarios',
+    'Judicializado',
+]
+
+
+def completar_flags(apps, schema_editor):
+    """Calcula la máscara de situación social a partir del texto existente"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    bits = {valor.lower(): 1 << i for i, valor in enumerate(SITUACIONES)}
+
+    registros = Consulta.objects.exclude(
+        situacion_social__isnull=True
+    ).exclude(
+        situacion_social=''
+    ).values_list('id', 'situacion_social')
+
+    ids_por_mascara = {}
+    for pk, texto in registros.iterator(chunk_size=2000):
+        mascara = 0
+        for valor in texto.replace(', ', ',').split(','):
+            mascara |= bits.get(valor.strip().lower(), 0)
+        if mascara:
+            ids_por_mascara.setdefault(mascara, []).append(pk)
+
+    # Una actualización por cada combinación distinta (como máximo 32)
+    for mascara, ids in ids_por_mascara.items():
+        for inicio in range(0, len(ids), 500):
+            Consulta.objects.filter(id__in=ids[inicio:inicio + 500]).update(situacion_social_flags=mascara)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0009_situacion_social_flags'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_flags, migrations.RunPython.noop),
+    ]
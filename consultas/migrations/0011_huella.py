@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0010_completar_situacion_social_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='huella',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Huella de importación'),
+        ),
+    ]
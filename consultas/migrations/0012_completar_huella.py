@@ -0,0 +1,94 @@
+import hashlib
+import re
+from datetime import date, timezone as tz
+
+from django.db import migrations
+from django.utils import timezone
+
+
+# Copia de consultas.importacion.CAMPOS_HUELLA al momento de esta migración
+CAMPOS_HUELLA = [
+    'fecha', 'zona', 'operador', 'apellido_nombre_interlocutor', 'consulta',
+    'telefono_interlocutor', 'tipo_vinculo', 'motivo_consulta', 'apellido_nombre_usuario',
+    'dni', 'fecha_nacimiento', 'edad', 'sexo', 'nacionalidad', 'ciudad', 'barrio',
+    'direccion', 'telefono', 'escolarizado', 'etapa_escolar', 'obra_social',
+    'nombre_obra_social', 'ocupacion', 'apellido_nombre_referencia', 'dni_referencia',
+    'telefono_referencia', 'tiempo_consumo', 'tipo_sustancia', 'tratamiento_anterior',
+    'tipo_tratamiento_anterior', 'efector_salud_referencia', 'riesgo_inminente',
+    'institucion_derivado', 'seguimiento', 'situacion_social', 'caracteristica_judicial',
+    'intervencion_propuesta',
+]
+
+
+# Copia de consultas.importacion.PATRON_ENTERO al momento de esta migración
+PATRON_ENTERO = re.compile(r'0*(\d+?)(?:\.0+)?')
+
+
+def formatear_valor(valor):
+    """Copia de consultas.importacion.formatear_valor: los enteros sin ceros a la izquierda ni ".0" """
+    if valor is None:
+        return ''
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor)
+    entero = PATRON_ENTERO.fullmatch(texto)
+    return entero.group(1) if entero else texto
+
+
+def fecha_de_importacion(fecha, marca_temporal):
+    """
+    Indica si la fecha es el día en que se importó la fila: el importador
+    anterior guardaba así una FECHA ilegible, que la huella toma como vacía.
+    """
+    # El importador tomaba el día del servidor: puede ser el de UTC o el local
+    return fecha in {marca_temporal.astimezone(tz.utc).date(), timezone.localtime(marca_temporal).date()}
+
+
+def calcular_huella(valores, marca_temporal):
+    """Huella de una fila guardada por el importador anterior, como la calcula el importador actual"""
+    valores = dict(zip(CAMPOS_HUELLA, valores))
+    if fecha_de_importacion(valores['fecha'], marca_temporal):
+        valores['fecha'] = None
+    texto = '\x1f'.join(formatear_valor(valor) for valor in valores.values())
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def completar_huella(apps, schema_editor):
+    """
+    Calcula la huella de las consultas importadas antes de existir el campo
+    (las que no tienen creado_por), para que una nueva importación del mismo
+    archivo no las duplique. Si hay filas repetidas, solo la primera recibe huella.
+
+    Una fila fechada el mismo día en que se importó se toma como de FECHA
+    ilegible: no hay forma de distinguirla de una consulta real de ese día.
+    """
+    Consulta = apps.get_model('consultas', 'Consulta')
+
+    registros = Consulta.objects.filter(
+        creado_por__isnull=True, huella__isnull=True
+    ).order_by('id').values_list('id', 'marca_temporal', *CAMPOS_HUELLA)
+
+    vistas = set()
+    ids_por_huella = {}
+    for pk, marca_temporal, *valores in registros.iterator(chunk_size=2000):
+        huella = calcular_huella(valores, marca_temporal)
+        if huella not in vistas:
+            vistas.add(huella)
+            ids_por_huella[pk] = huella
+
+    Consulta.objects.bulk_update(
+        [Consulta(id=pk, huella=huella) for pk, huella in ids_por_huella.items()],
+        ['huella'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0011_huella'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_huella, migrations.RunPython.noop),
+    ]
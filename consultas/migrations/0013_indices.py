@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0012_completar_huella'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['-fecha', '-marca_temporal'], name='consulta_orden_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['creado_por', '-fecha', '-marca_temporal'], name='consulta_creado_orden_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['operador', '-fecha', '-marca_temporal'], name='consulta_operador_orden_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['zona', '-fecha', '-marca_temporal'], name='consulta_zona_orden_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['riesgo_inminente', '-fecha', '-marca_temporal'], name='consulta_riesgo_orden_idx'),
+        ),
+    ]
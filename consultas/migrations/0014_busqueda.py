@@ -0,0 +1,72 @@
+from django.db import migrations
+
+
+# Definición congelada al momento de esta migración (ver consultas.busqueda)
+TABLA_FTS = 'consultas_consulta_busqueda'
+CAMPOS = [
+    'apellido_nombre_usuario', 'apellido_nombre_interlocutor', 'dni', 'ciudad', 'barrio',
+    'telefono', 'telefono_interlocutor', 'motivo_consulta', 'tipo_sustancia',
+    'intervencion_propuesta', 'zona', 'consulta', 'caracteristica_judicial',
+]
+COLUMNAS = ', '.join(CAMPOS)
+NUEVOS = ', '.join(f'new.{campo}' for campo in CAMPOS)
+DOCUMENTO_PG = " || ' ' || ".join(f"coalesce({campo}, '')" for campo in CAMPOS)
+
+SQL_SQLITE = [
+    f"""CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+        {COLUMNAS},
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON consultas_consulta BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) VALUES (new.id, {NUEVOS});
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON consultas_consulta BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {COLUMNAS} ON consultas_consulta BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) VALUES (new.id, {NUEVOS});
+    END""",
+    f"INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) SELECT id, {COLUMNAS} FROM consultas_consulta",
+]
+
+SQL_SQLITE_REVERSO = [
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai',
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au',
+    f'DROP TABLE IF EXISTS {TABLA_FTS}',
+]
+
+SQL_POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    'CREATE TEXT SEARCH CONFIGURATION consultas_es (COPY = spanish)',
+    'ALTER TEXT SEARCH CONFIGURATION consultas_es ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem',
+    f"CREATE INDEX consulta_busqueda_gin ON consultas_consulta USING GIN (to_tsvector('consultas_es'::regconfig, {DOCUMENTO_PG}))",
+]
+
+SQL_POSTGRESQL_REVERSO = [
+    'DROP INDEX IF EXISTS consulta_busqueda_gin',
+    'DROP TEXT SEARCH CONFIGURATION IF EXISTS consultas_es',
+]
+
+
+def ejecutar(sentencias_por_motor):
+    def operacion(apps, schema_editor):
+        for sentencia in sentencias_por_motor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sentencia)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0013_indices'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            ejecutar({'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL}),
+            ejecutar({'sqlite': SQL_SQLITE_REVERSO, 'postgresql': SQL_POSTGRESQL_REVERSO}),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0014_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='operador_usuario',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='consultas_operadas', to=settings.AUTH_USER_MODEL, verbose_name='Usuario operador'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['operador_usuario', '-fecha', '-marca_temporal'], name='consulta_op_usuario_orden_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+
+
+def completar_operador_usuario(apps, schema_editor):
+    """
+    Resuelve el usuario operador de las consultas existentes comparando el
+    texto de operador con "Apellido Nombre" de cada usuario; si no hay
+    coincidencia se usa el usuario que cargó la consulta.
+    """
+    Consulta = apps.get_model('consultas', 'Consulta')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    for user in User.objects.all():
+        nombre = f"{user.last_name} {user.first_name}".strip() or user.username
+        Consulta.objects.filter(operador=nombre, operador_usuario__isnull=True).update(operador_usuario=user)
+
+    Consulta.objects.filter(
+        operador_usuario__isnull=True, creado_por__isnull=False
+    ).update(operador_usuario=F('creado_por'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0015_operador_usuario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_operador_usuario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0016_completar_operador_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('zona', models.CharField(max_length=50, verbose_name='Zona')),
+                ('operador', models.CharField(max_length=100, verbose_name='Operador')),
+                ('consulta', models.CharField(max_length=20, verbose_name='Consulta')),
+                ('sexo', models.CharField(max_length=50, verbose_name='Sexo')),
+                ('ciudad', models.CharField(max_length=100, verbose_name='Ciudad')),
+                ('tiempo_consumo', models.CharField(max_length=50, null=True, verbose_name='Tiempo de Consumo')),
+                ('tratamiento_anterior', models.CharField(max_length=5, null=True, verbose_name='Tratamiento Anterior')),
+                ('situacion_social_flags', models.PositiveSmallIntegerField(default=0, verbose_name='Situación Social (máscara)')),
+                ('obra_social', models.CharField(max_length=5, null=True, verbose_name='Obra Social')),
+                ('escolarizado', models.CharField(max_length=5, null=True, verbose_name='Escolarizado')),
+                ('riesgo_inminente', models.CharField(max_length=20, null=True, verbose_name='Riesgo Inminente')),
+                ('seguimiento', models.CharField(max_length=10, null=True, verbose_name='Seguimiento')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='Cantidad')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'indexes': [models.Index(fields=['fecha'], name='resumen_diario_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioSustancia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('zona', models.CharField(max_length=50, verbose_name='Zona')),
+                ('operador', models.CharField(max_length=100, verbose_name='Operador')),
+                ('consulta', models.CharField(max_length=20, verbose_name='Consulta')),
+                ('sexo', models.CharField(max_length=50, verbose_name='Sexo')),
+                ('ciudad', models.CharField(max_length=100, verbose_name='Ciudad')),
+                ('tiempo_consumo', models.CharField(max_length=50, null=True, verbose_name='Tiempo de Consumo')),
+                ('tratamiento_anterior', models.CharField(max_length=5, null=True, verbose_name='Tratamiento Anterior')),
+                ('situacion_social_flags', models.PositiveSmallIntegerField(default=0, verbose_name='Situación Social (máscara)')),
+                ('obra_social', models.CharField(max_length=5, null=True, verbose_name='Obra Social')),
+                ('escolarizado', models.CharField(max_length=5, null=True, verbose_name='Escolarizado')),
+                ('riesgo_inminente', models.CharField(max_length=20, null=True, verbose_name='Riesgo Inminente')),
+                ('seguimiento', models.CharField(max_length=10, null=True, verbose_name='Seguimiento')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='Cantidad')),
+                ('sustancia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='consultas.sustancia')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario por sustancia',
+                'verbose_name_plural': 'Resúmenes diarios por sustancia',
+                'indexes': [models.Index(fields=['fecha'], name='resumen_sustancia_fecha_idx')],
+            },
+        ),
+    ]
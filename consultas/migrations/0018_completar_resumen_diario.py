@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+# Copia fija de CAMPOS_RESUMEN_DIARIO al momento de esta migración
+CAMPOS = [
+    'fecha',
+    'zona',
+    'operador',
+    'consulta',
+    'sexo',
+    'ciudad',
+    'tiempo_consumo',
+    'tratamiento_anterior',
+    'situacion_social_flags',
+    'obra_social',
+    'escolarizado',
+    'riesgo_inminente',
+    'seguimiento',
+]
+
+
+def completar_resumen_diario(apps, schema_editor):
+    """Carga el resumen diario agrupando las consultas existentes"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    ConsultaSustancia = apps.get_model('consultas', 'ConsultaSustancia')
+    ResumenDiario = apps.get_model('consultas', 'ResumenDiario')
+    ResumenDiarioSustancia = apps.get_model('consultas', 'ResumenDiarioSustancia')
+
+    filas = Consulta.objects.order_by().values(*CAMPOS).annotate(cantidad=Count('id'))
+    ResumenDiario.objects.bulk_create(
+        (ResumenDiario(**fila) for fila in filas.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+    campos_vinculo = {f'consulta__{campo}': campo for campo in CAMPOS}
+    filas = ConsultaSustancia.objects.order_by().values('sustancia_id', *campos_vinculo).annotate(cantidad=Count('id'))
+    ResumenDiarioSustancia.objects.bulk_create(
+        (
+            ResumenDiarioSustancia(
+                sustancia_id=fila['sustancia_id'],
+                cantidad=fila['cantidad'],
+                **{campo: fila[origen] for origen, campo in campos_vinculo.items()},
+            )
+            for fila in filas.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0017_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_resumen_diario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0019_tareas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultaNarrativa',
+            fields=[
+                ('consulta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='narrativa', serialize=False, to='consultas.consulta')),
+                ('motivo_consulta', models.TextField(verbose_name='Motivo de la Consulta')),
+                ('direccion', models.CharField(blank=True, max_length=200, null=True, verbose_name='Dirección')),
+                ('tipo_tratamiento_anterior', models.TextField(blank=True, null=True, verbose_name='Tipo de Tratamiento Anterior')),
+                ('intervencion_propuesta', models.TextField(blank=True, null=True, verbose_name='Intervención Propuesta')),
+            ],
+            options={
+                'verbose_name': 'Narrativa de la consulta',
+                'verbose_name_plural': 'Narrativas de las consultas',
+            },
+        ),
+    ]
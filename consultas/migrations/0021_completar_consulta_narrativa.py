@@ -0,0 +1,134 @@
+from django.db import migrations
+
+
+# Definiciones congeladas al momento de esta migración (ver consultas.busqueda)
+TABLA_FTS = 'consultas_consulta_busqueda'
+CAMPOS_NARRATIVA = ['motivo_consulta', 'direccion', 'tipo_tratamiento_anterior', 'intervencion_propuesta']
+CAMPOS_BUSQUEDA = [
+    'apellido_nombre_usuario', 'apellido_nombre_interlocutor', 'dni', 'ciudad', 'barrio',
+    'telefono', 'telefono_interlocutor', 'motivo_consulta', 'tipo_sustancia',
+    'intervencion_propuesta', 'zona', 'consulta', 'caracteristica_judicial',
+]
+CAMPOS_BUSQUEDA_CONSULTA = [campo for campo in CAMPOS_BUSQUEDA if campo not in CAMPOS_NARRATIVA]
+CAMPOS_BUSQUEDA_NARRATIVA = [campo for campo in CAMPOS_BUSQUEDA if campo in CAMPOS_NARRATIVA]
+
+COLUMNAS = ', '.join(CAMPOS_BUSQUEDA)
+COLUMNAS_NARRATIVA = ', '.join(CAMPOS_NARRATIVA)
+
+
+def documento_pg(campos):
+    return " || ' ' || ".join(f"coalesce({campo}, '')" for campo in campos)
+
+
+def fila_fts(condicion):
+    valores = ', '.join(f'n.{campo}' if campo in CAMPOS_NARRATIVA else f'c.{campo}' for campo in CAMPOS_BUSQUEDA)
+    return (
+        f'INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) SELECT c.id, {valores} '
+        f'FROM consultas_consulta c LEFT JOIN consultas_consultanarrativa n ON n.consulta_id = c.id WHERE {condicion}'
+    )
+
+
+COPIAR = [
+    f"""INSERT INTO consultas_consultanarrativa (consulta_id, {COLUMNAS_NARRATIVA})
+        SELECT id, coalesce(motivo_consulta, ''), direccion, tipo_tratamiento_anterior, intervencion_propuesta
+        FROM consultas_consulta""",
+]
+
+COPIAR_REVERSO = [
+    *(
+        f"""UPDATE consultas_consulta SET {campo} = (
+            SELECT n.{campo} FROM consultas_consultanarrativa n WHERE n.consulta_id = consultas_consulta.id
+        )"""
+        for campo in CAMPOS_NARRATIVA
+    ),
+    'DELETE FROM consultas_consultanarrativa',
+]
+
+TRIGGERS_ANTERIORES = [f'{TABLA_FTS}_ai', f'{TABLA_FTS}_ad', f'{TABLA_FTS}_au']
+TRIGGERS_NARRATIVA = [f'{TABLA_FTS}_narrativa_ai', f'{TABLA_FTS}_narrativa_ad', f'{TABLA_FTS}_narrativa_au']
+
+SQL_SQLITE = [
+    *(f'DROP TRIGGER IF EXISTS {nombre}' for nombre in TRIGGERS_ANTERIORES),
+    f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON consultas_consulta BEGIN
+        {fila_fts('c.id = new.id')};
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON consultas_consulta BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {', '.join(CAMPOS_BUSQUEDA_CONSULTA)} ON consultas_consulta BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        {fila_fts('c.id = new.id')};
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_narrativa_ai AFTER INSERT ON consultas_consultanarrativa BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = new.consulta_id;
+        {fila_fts('c.id = new.consulta_id')};
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_narrativa_ad AFTER DELETE ON consultas_consultanarrativa BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.consulta_id;
+        {fila_fts('c.id = old.consulta_id')};
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_narrativa_au AFTER UPDATE OF {', '.join(CAMPOS_BUSQUEDA_NARRATIVA)} ON consultas_consultanarrativa BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.consulta_id;
+        {fila_fts('c.id = new.consulta_id')};
+    END""",
+    f'DELETE FROM {TABLA_FTS}',
+    fila_fts('1 = 1'),
+]
+
+# Los triggers de 0014_busqueda; el índice se vuelve a cargar al copiar los textos de vuelta
+SQL_SQLITE_REVERSO = [
+    *(f'DROP TRIGGER IF EXISTS {nombre}' for nombre in TRIGGERS_ANTERIORES + TRIGGERS_NARRATIVA),
+    f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON consultas_consulta BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) VALUES (new.id, {', '.join(f'new.{campo}' for campo in CAMPOS_BUSQUEDA)});
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON consultas_consulta BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {COLUMNAS} ON consultas_consulta BEGIN
+        DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) VALUES (new.id, {', '.join(f'new.{campo}' for campo in CAMPOS_BUSQUEDA)});
+    END""",
+]
+
+SQL_POSTGRESQL = [
+    'DROP INDEX IF EXISTS consulta_busqueda_gin',
+    f"CREATE INDEX consulta_busqueda_gin ON consultas_consulta USING GIN (to_tsvector('consultas_es'::regconfig, {documento_pg(CAMPOS_BUSQUEDA_CONSULTA)}))",
+    f"CREATE INDEX narrativa_busqueda_gin ON consultas_consultanarrativa USING GIN (to_tsvector('consultas_es'::regconfig, {documento_pg(CAMPOS_BUSQUEDA_NARRATIVA)}))",
+]
+
+SQL_POSTGRESQL_REVERSO = [
+    'DROP INDEX IF EXISTS narrativa_busqueda_gin',
+    'DROP INDEX IF EXISTS consulta_busqueda_gin',
+    f"CREATE INDEX consulta_busqueda_gin ON consultas_consulta USING GIN (to_tsvector('consultas_es'::regconfig, {documento_pg(CAMPOS_BUSQUEDA)}))",
+]
+
+
+def ejecutar(sentencias_por_motor):
+    def operacion(apps, schema_editor):
+        for sentencia in sentencias_por_motor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sentencia)
+    return operacion
+
+
+def ejecutar_siempre(sentencias):
+    def operacion(apps, schema_editor):
+        for sentencia in sentencias:
+            schema_editor.execute(sentencia)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0020_consulta_narrativa'),
+    ]
+
+    operations = [
+        # Copia los textos largos de cada consulta a su narrativa
+        migrations.RunPython(ejecutar_siempre(COPIAR), ejecutar_siempre(COPIAR_REVERSO)),
+        # La búsqueda pasa a leer los textos de la narrativa
+        migrations.RunPython(
+            ejecutar({'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL}),
+            ejecutar({'sqlite': SQL_SQLITE_REVERSO, 'postgresql': SQL_POSTGRESQL_REVERSO}),
+        ),
+    ]
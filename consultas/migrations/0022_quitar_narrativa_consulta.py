@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0021_completar_consulta_narrativa'),
+    ]
+
+    operations = [
+        # Solo en el estado: al revertir, la columna se vuelve a agregar sin valor por defecto
+        # y se completa después desde la narrativa (0021)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='consulta',
+                    name='motivo_consulta',
+                    field=models.TextField(null=True, verbose_name='Motivo de la Consulta'),
+                ),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='direccion',
+        ),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='intervencion_propuesta',
+        ),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='motivo_consulta',
+        ),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='tipo_tratamiento_anterior',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0022_quitar_narrativa_consulta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='edad_anios',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True, verbose_name='Edad (años)'),
+        ),
+        migrations.AddField(
+            model_name='consulta',
+            name='nacimiento',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Fecha de Nacimiento (fecha)'),
+        ),
+    ]
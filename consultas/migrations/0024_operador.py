@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0023_edad_tipada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Operador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('usuario', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operador', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Operador',
+                'verbose_name_plural': 'Operadores',
+                'ordering': ['nombre'],
+            },
+        ),
+        # Claves provisorias: el texto de operador se resuelve en 0025 y se reemplaza en 0026
+        migrations.AddField(
+            model_name='consulta',
+            name='operador_ref',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='consultas.operador'),
+        ),
+        migrations.AddField(
+            model_name='resumendiario',
+            name='operador_ref',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='consultas.operador'),
+        ),
+        migrations.AddField(
+            model_name='resumendiariosustancia',
+            name='operador_ref',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='consultas.operador'),
+        ),
+    ]
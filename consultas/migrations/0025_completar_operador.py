@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+
+
+MODELOS_CON_OPERADOR = ['Consulta', 'ResumenDiario', 'ResumenDiarioSustancia']
+
+
+def completar_operadores(apps, schema_editor):
+    """
+    Crea un Operador por cada texto de operador distinto y apunta a él las
+    consultas y los resúmenes diarios.
+
+    Cada operador se vincula solo al usuario cuyo "Apellido Nombre" coincide
+    exactamente con su texto; quién cargó las consultas no cuenta (el
+    respaldo por creado_por de 0016 no se usa). Si varios usuarios tienen el
+    mismo nombre, se elige el que 0016 resolvió para más consultas de ese
+    operador y, a igualdad, el más antiguo.
+    """
+    Consulta = apps.get_model('consultas', 'Consulta')
+    Operador = apps.get_model('consultas', 'Operador')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    nombres = set()
+    for modelo in MODELOS_CON_OPERADOR:
+        nombres.update(apps.get_model('consultas', modelo).objects.order_by().values_list('operador', flat=True).distinct())
+    Operador.objects.bulk_create([Operador(nombre=nombre) for nombre in sorted(nombres)], batch_size=1000)
+    operadores = {operador.nombre: operador for operador in Operador.objects.all()}
+
+    candidatos = {}
+    for user in User.objects.order_by('pk'):
+        nombre = f"{user.last_name} {user.first_name}".strip() or user.username
+        if nombre in operadores:
+            candidatos.setdefault(nombre, []).append(user.pk)
+
+    cantidades = {
+        (fila['operador'], fila['operador_usuario']): fila['cantidad']
+        for fila in Consulta.objects.filter(operador__in=list(candidatos), operador_usuario__isnull=False).order_by()
+        .values('operador', 'operador_usuario').annotate(cantidad=Count('id'))
+    }
+    for nombre, pks in candidatos.items():
+        # max() se queda con el primero (el más antiguo) ante un empate
+        operadores[nombre].usuario_id = max(pks, key=lambda pk: cantidades.get((nombre, pk), 0))
+
+    Operador.objects.bulk_update(operadores.values(), ['usuario'], batch_size=1000)
+
+    por_nombre = Operador.objects.filter(nombre=OuterRef('operador'))
+    for modelo in MODELOS_CON_OPERADOR:
+        apps.get_model('consultas', modelo).objects.update(operador_ref=Subquery(por_nombre.values('pk')[:1]))
+
+
+def restaurar_textos_operador(apps, schema_editor):
+    """Vuelve a copiar el nombre del operador como texto y su usuario como usuario operador"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    Operador = apps.get_model('consultas', 'Operador')
+
+    por_clave = Operador.objects.filter(pk=OuterRef('operador_ref'))
+    for modelo in MODELOS_CON_OPERADOR:
+        apps.get_model('consultas', modelo).objects.update(operador=Subquery(por_clave.values('nombre')[:1]))
+    Consulta.objects.update(operador_usuario=Subquery(por_clave.values('usuario')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0024_operador'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_operadores, restaurar_textos_operador),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Triggers de búsqueda al momento de esta migración (ver consultas.busqueda)
+TABLA_FTS = 'consultas_consulta_busqueda'
+TRIGGERS = [f'{TABLA_FTS}_{sufijo}' for sufijo in ['ai', 'ad', 'au', 'narrativa_ai', 'narrativa_ad', 'narrativa_au']]
+
+
+def quitar_triggers_busqueda(apps, schema_editor):
+    """
+    En SQLite, quitar o cambiar una clave foránea reconstruye consultas_consulta
+    y los triggers que la nombran impiden renombrar la tabla nueva. Se quitan
+    antes; asegurar_indice_busqueda (post_migrate) los recrea y recarga el índice.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for nombre in TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0025_completar_operador'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_triggers_busqueda, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='consulta',
+            name='consulta_operador_orden_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='consulta',
+            name='consulta_op_usuario_orden_idx',
+        ),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='operador_usuario',
+        ),
+        # Solo en el estado: al revertir, las columnas de texto se vuelven a agregar sin valor
+        # por defecto y se completan después desde la tabla de operadores (0025)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name=modelo,
+                    name='operador',
+                    field=models.CharField(max_length=100, null=True, verbose_name='Operador'),
+                )
+                for modelo in ['consulta', 'resumendiario', 'resumendiariosustancia']
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='operador',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='operador',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiariosustancia',
+            name='operador',
+        ),
+        migrations.RenameField(
+            model_name='consulta',
+            old_name='operador_ref',
+            new_name='operador',
+        ),
+        migrations.RenameField(
+            model_name='resumendiario',
+            old_name='operador_ref',
+            new_name='operador',
+        ),
+        migrations.RenameField(
+            model_name='resumendiariosustancia',
+            old_name='operador_ref',
+            new_name='operador',
+        ),
+        migrations.AlterField(
+            model_name='consulta',
+            name='operador',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='consultas', to='consultas.operador', verbose_name='Operador'),
+        ),
+        migrations.AlterField(
+            model_name='resumendiario',
+            name='operador',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='consultas.operador', verbose_name='Operador'),
+        ),
+        migrations.AlterField(
+            model_name='resumendiariosustancia',
+            name='operador',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='consultas.operador', verbose_name='Operador'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['operador', '-fecha', '-marca_temporal'], name='consulta_operador_orden_idx'),
+        ),
+        # Al revertir, la tabla también se reconstruye
+        migrations.RunPython(migrations.RunPython.noop, quitar_triggers_busqueda),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0026_operador_clave'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='fecha_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+
+# Copia fija de CAMPOS_RESUMEN_DIARIO al momento de esta migración
+CAMPOS_RESUMEN = [
+    'fecha',
+    'zona',
+    'operador_id',
+    'consulta',
+    'sexo',
+    'ciudad',
+    'tiempo_consumo',
+    'tratamiento_anterior',
+    'situacion_social_flags',
+    'obra_social',
+    'escolarizado',
+    'riesgo_inminente',
+    'seguimiento',
+]
+
+
+def operador_de_usuario(Operador, user):
+    """Copia fija de models.operador_de_usuario"""
+    operador = Operador.objects.filter(usuario=user).first()
+    if operador:
+        return operador
+    nombre = f"{user.last_name} {user.first_name}".strip() or user.username
+    operador, _ = Operador.objects.get_or_create(nombre=nombre)
+    if operador.usuario_id is None:
+        operador.usuario = user
+        operador.save(update_fields=['usuario'])
+    elif operador.usuario_id != user.pk:
+        operador, _ = Operador.objects.get_or_create(nombre=f'{nombre} ({user.username})', defaults={'usuario': user})
+    return operador
+
+
+def reconstruir_resumen(apps, fechas):
+    """Recalcula el resumen diario de las fechas indicadas (como actualizar_resumen_diario)"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    ConsultaSustancia = apps.get_model('consultas', 'ConsultaSustancia')
+    ResumenDiario = apps.get_model('consultas', 'ResumenDiario')
+    ResumenDiarioSustancia = apps.get_model('consultas', 'ResumenDiarioSustancia')
+
+    ResumenDiario.objects.filter(fecha__in=fechas).delete()
+    ResumenDiarioSustancia.objects.filter(fecha__in=fechas).delete()
+    filas = Consulta.objects.filter(fecha__in=fechas).order_by().values(*CAMPOS_RESUMEN).annotate(cantidad=Count('id'))
+    ResumenDiario.objects.bulk_create((ResumenDiario(**fila) for fila in filas.iterator(chunk_size=2000)), batch_size=2000)
+
+    campos_vinculo = {f'consulta__{campo}': campo for campo in CAMPOS_RESUMEN}
+    filas = ConsultaSustancia.objects.filter(consulta__fecha__in=fechas).order_by().values(
+        'sustancia_id', *campos_vinculo
+    ).annotate(cantidad=Count('id'))
+    ResumenDiarioSustancia.objects.bulk_create(
+        (
+            ResumenDiarioSustancia(
+                sustancia_id=fila['sustancia_id'],
+                cantidad=fila['cantidad'],
+                **{campo: fila[origen] for origen, campo in campos_vinculo.items()},
+            )
+            for fila in filas.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+def completar_operador_creador(apps, schema_editor):
+    """
+    Deja cada consulta cargada por un usuario a nombre del operador de ese
+    usuario, para que mis_consultas filtre solo por operador; recalcula el
+    resumen diario de los días cambiados.
+    """
+    Consulta = apps.get_model('consultas', 'Consulta')
+    Operador = apps.get_model('consultas', 'Operador')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    fechas = set()
+    creadores = Consulta.objects.filter(creado_por__isnull=False).order_by().values_list('creado_por', flat=True).distinct()
+    for user in User.objects.filter(pk__in=list(creadores)).order_by('pk'):
+        operador = operador_de_usuario(Operador, user)
+        ajenas = Consulta.objects.filter(creado_por=user).exclude(operador=operador)
+        fechas.update(ajenas.order_by().values_list('fecha', flat=True).distinct())
+        ajenas.update(operador=operador)
+
+    fechas = sorted(fechas)
+    for desde in range(0, len(fechas), 500):
+        reconstruir_resumen(apps, fechas[desde:desde + 500])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0027_tarea_latido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # El operador anterior de esas consultas no se conserva: la vuelta atrás no lo restaura
+        migrations.RunPython(completar_operador_creador, migrations.RunPython.noop),
+    ]
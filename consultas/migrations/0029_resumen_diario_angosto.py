@@ -0,0 +1,71 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0028_completar_operador_creador'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='ciudad',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='consulta',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='escolarizado',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='obra_social',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='riesgo_inminente',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='seguimiento',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='sexo',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='situacion_social_flags',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='tiempo_consumo',
+        ),
+        migrations.RemoveField(
+            model_name='resumendiario',
+            name='tratamiento_anterior',
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioDimension',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('dimension', models.CharField(max_length=30, verbose_name='Dimensión')),
+                ('valor', models.CharField(max_length=200, null=True, verbose_name='Valor')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='Cantidad')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario por dimensión',
+                'verbose_name_plural': 'Resúmenes diarios por dimensión',
+                'indexes': [models.Index(fields=['dimension', 'fecha'], name='resumen_dimension_fecha_idx')],
+            },
+        ),
+        migrations.DeleteModel(
+            name='ResumenDiarioSustancia',
+        ),
+    ]
@@ -0,0 +1,77 @@
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import Count
+
+
+# Copias fijas de CAMPOS_RESUMEN_DIARIO y COLUMNAS_RESUMEN_DIMENSION al momento de esta migración
+CAMPOS_RESUMEN = [
+    'fecha',
+    'zona',
+    'operador_id',
+]
+COLUMNAS_DIMENSION = [
+    'consulta',
+    'sexo',
+    'tiempo_consumo',
+    'tratamiento_anterior',
+    'ciudad',
+]
+
+# Copia fija de Consulta.SITUACION_SOCIAL_CHOICES: situación -> bit de la máscara
+SITUACIONES = {
+    situacion: 1 << i
+    for i, situacion in enumerate(['Situación de Calle', 'Infancia', 'Violencia', 'Pueblos Originarios', 'Judicializado'])
+}
+
+
+def filas_dimension(apps, fechas):
+    """Filas de ResumenDiarioDimension de esas fechas (como models.filas_resumen_dimension)"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    ConsultaSustancia = apps.get_model('consultas', 'ConsultaSustancia')
+    ResumenDiarioDimension = apps.get_model('consultas', 'ResumenDiarioDimension')
+
+    consultas = Consulta.objects.filter(fecha__in=fechas).order_by()
+    for columna in COLUMNAS_DIMENSION:
+        for fila in consultas.values('fecha', columna).annotate(cantidad=Count('id')):
+            yield ResumenDiarioDimension(fecha=fila['fecha'], dimension=columna, valor=fila[columna], cantidad=fila['cantidad'])
+
+    situaciones = Counter()
+    for fila in consultas.values('fecha', 'situacion_social_flags').annotate(cantidad=Count('id')):
+        for situacion, bit in SITUACIONES.items():
+            if fila['situacion_social_flags'] & bit:
+                situaciones[fila['fecha'], situacion] += fila['cantidad']
+    for (fecha, situacion), cantidad in situaciones.items():
+        yield ResumenDiarioDimension(fecha=fecha, dimension='situacion_social', valor=situacion, cantidad=cantidad)
+
+    vinculos = ConsultaSustancia.objects.filter(consulta__fecha__in=fechas).order_by()
+    for fila in vinculos.values('consulta__fecha', 'sustancia__nombre').annotate(cantidad=Count('id')):
+        yield ResumenDiarioDimension(
+            fecha=fila['consulta__fecha'], dimension='sustancia', valor=fila['sustancia__nombre'], cantidad=fila['cantidad'],
+        )
+
+
+def completar_resumen_diario(apps, schema_editor):
+    """Reconstruye ResumenDiario por día, zona y operador y carga ResumenDiarioDimension, de a 100 días"""
+    Consulta = apps.get_model('consultas', 'Consulta')
+    ResumenDiario = apps.get_model('consultas', 'ResumenDiario')
+    ResumenDiarioDimension = apps.get_model('consultas', 'ResumenDiarioDimension')
+
+    ResumenDiario.objects.all().delete()
+    fechas = list(Consulta.objects.order_by('fecha').values_list('fecha', flat=True).distinct())
+    for desde in range(0, len(fechas), 100):
+        lote = fechas[desde:desde + 100]
+        filas = Consulta.objects.filter(fecha__in=lote).order_by().values(*CAMPOS_RESUMEN).annotate(cantidad=Count('id'))
+        ResumenDiario.objects.bulk_create([ResumenDiario(**fila) for fila in filas], batch_size=2000)
+        ResumenDiarioDimension.objects.bulk_create(list(filas_dimension(apps, lote)), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0029_resumen_diario_angosto'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_resumen_diario, migrations.RunPython.noop),
+    ]
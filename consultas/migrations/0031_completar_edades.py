@@ -0,0 +1,99 @@
+import re
+from datetime import datetime
+
+from django.db import migrations
+
+
+# Copias fijas de consultas.edades al momento de esta migración
+FORMATOS_FECHA_NACIMIENTO = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y']
+EDAD_MAXIMA = 110
+ANIO_MINIMO_NACIMIENTO = 1900
+PATRON_ANIOS = r'(?<!\d)(\d{1,3})\s*a(?:ñ|ni)o'
+PATRON_MESES = r'(?<!\d)(\d{1,3})\s*mes'
+PATRON_DIAS = r'\d\s*d[ií]a'
+PATRON_NUMERO = r'^(\d{1,3})(?!\d)'
+
+
+def parsear_nacimiento(texto):
+    """Copia de edades.parsear_nacimiento"""
+    partes = '' if texto is None else str(texto).split()
+    if not partes:
+        return None
+    for formato in FORMATOS_FECHA_NACIMIENTO:
+        try:
+            nacimiento = datetime.strptime(partes[0], formato).date()
+        except ValueError:
+            continue
+        return nacimiento if nacimiento.year >= ANIO_MINIMO_NACIMIENTO else None
+    return None
+
+
+def parsear_edad(texto):
+    """Copia de edades.parsear_edad"""
+    texto = '' if texto is None else str(texto).strip().lower()
+    anios = re.search(PATRON_ANIOS, texto)
+    meses = re.search(PATRON_MESES, texto)
+    numero = re.search(PATRON_NUMERO, texto)
+    if anios:
+        edad = int(anios.group(1))
+    elif meses:
+        edad = int(meses.group(1)) // 12
+    elif re.search(PATRON_DIAS, texto):
+        edad = 0
+    elif numero:
+        edad = int(numero.group(1))
+    else:
+        return None
+    return edad if edad <= EDAD_MAXIMA else None
+
+
+def calcular_edad(edad, fecha_nacimiento, fecha):
+    """Copia de edades.calcular_edad (la fecha de la consulta ya es date)"""
+    nacimiento = parsear_nacimiento(fecha_nacimiento)
+    if nacimiento and fecha and nacimiento > fecha:
+        nacimiento = None
+    anios = parsear_edad(edad)
+    if anios is None and nacimiento and fecha:
+        anios = fecha.year - nacimiento.year - ((fecha.month, fecha.day) < (nacimiento.month, nacimiento.day))
+        anios = anios if anios <= EDAD_MAXIMA else None
+    return nacimiento, anios
+
+
+def completar_edades(apps, schema_editor):
+    """
+    Completa nacimiento y edad_anios de las consultas existentes (como
+    models.completar_edades), de a 5000, para que los gráficos por edad no
+    queden vacíos después de actualizar. También corrige las edades con años
+    y meses que antes se leían como 0.
+    """
+    Consulta = apps.get_model('consultas', 'Consulta')
+
+    ultimo = 0
+    while True:
+        filas = list(
+            Consulta.objects.filter(pk__gt=ultimo).order_by('pk').values_list(
+                'pk', 'edad', 'fecha_nacimiento', 'fecha', 'nacimiento', 'edad_anios',
+            )[:5000]
+        )
+        if not filas:
+            return
+        ids_por_valores = {}
+        for pk, edad, fecha_nacimiento, fecha, nacimiento, edad_anios in filas:
+            valores = calcular_edad(edad, fecha_nacimiento, fecha)
+            if valores != (nacimiento, edad_anios):
+                ids_por_valores.setdefault(valores, []).append(pk)
+        for (nacimiento, edad_anios), ids in ids_por_valores.items():
+            for inicio in range(0, len(ids), 500):
+                Consulta.objects.filter(pk__in=ids[inicio:inicio + 500]).update(nacimiento=nacimiento, edad_anios=edad_anios)
+        ultimo = filas[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultas', '0030_completar_resumen_diario_angosto'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_edades, migrations.RunPython.noop),
+    ]
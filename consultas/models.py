@@ -1,6 +1,146 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connection, models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Left
 from django.contrib.auth.models import User
 
+from .edades import calcular_edad, calcular_edades
+
+
+def nombre_operador(user):
+    """Nombre de operador de un usuario: "Apellido Nombre", o el usuario si no tiene nombre"""
+    return f"{user.last_name} {user.first_name}".strip() or user.username
+
+
+def separar_valores(texto):
+    """Separa un texto de valores separados por comas en una lista"""
+    if not texto:
+        return []
+    return [v.strip() for v in str(texto).replace(', ', ',').split(',') if v.strip()]
+
+
+# Columnas de los listados paginados: las que muestra cada tabla más las del
+# orden (fecha, marca_temporal, id), que necesita el cursor de paginación
+CAMPOS_LISTADO_INFORMES = [
+    'id', 'fecha', 'marca_temporal', 'zona', 'apellido_nombre_usuario', 'consulta', 'ciudad', 'tipo_sustancia',
+]
+CAMPOS_LISTADO_OPERADOR = [
+    'id', 'fecha', 'marca_temporal', 'zona', 'apellido_nombre_usuario', 'consulta', 'ciudad',
+]
+
+# Caracteres del motivo que se leen para mostrarlo recortado en los listados
+LARGO_RESUMEN_MOTIVO = 200
+
+
+class ConsultaQuerySet(models.QuerySet):
+
+    def listado(self, campos=CAMPOS_LISTADO_INFORMES, **expresiones):
+        """
+        Filas livianas (namedtuple) con solo las columnas del listado, en lugar
+        de instancias completas de Consulta con todos sus textos largos. Las
+        anotaciones ya hechas (por ejemplo, el rango de la búsqueda) se incluyen.
+        """
+        queryset = self.annotate(**expresiones) if expresiones else self
+        columnas = list(dict.fromkeys([*campos, *queryset.query.annotations]))
+        return queryset.values_list(*columnas, named=True)
+
+    def listado_informes(self):
+        """
+        Filas del listado de informes, con el nombre del operador leído por clave
+        solo para las filas de la página (un JOIN haría que SQLite ordene toda la tabla)
+        """
+        return self.listado(nombre_operador=Subquery(Operador.objects.filter(pk=OuterRef('operador')).values('nombre')))
+
+    def listado_operador(self):
+        """Filas del listado de mis consultas, con el motivo recortado en la base de datos"""
+        return self.listado(CAMPOS_LISTADO_OPERADOR, motivo_resumen=Left('narrativa__motivo_consulta', LARGO_RESUMEN_MOTIVO))
+
+
+# Textos largos de la consulta, guardados en ConsultaNarrativa
+CAMPOS_NARRATIVA = ['motivo_consulta', 'direccion', 'tipo_tratamiento_anterior', 'intervencion_propuesta']
+
+
+def campo_narrativa(nombre):
+    """Propiedad de Consulta que lee y escribe un campo de su ConsultaNarrativa"""
+
+    def obtener(self):
+        return getattr(self.obtener_narrativa(), nombre)
+
+    def asignar(self, valor):
+        setattr(self.obtener_narrativa(), nombre, valor)
+
+    return property(obtener, asignar)
+
+
+class Sustancia(models.Model):
+    nombre = models.CharField(max_length=200, unique=True, verbose_name="Nombre")
+
+    class Meta:
+        verbose_name = "Sustancia"
+        verbose_name_plural = "Sustancias"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+class Operador(models.Model):
+    """
+    Operador de la línea. Las consultas lo referencian por clave, de modo que
+    los filtros y agrupamientos son por entero; el usuario vinculado es el
+    dueño de sus consultas en "Mis Consultas".
+    """
+    nombre = models.CharField(max_length=100, unique=True, verbose_name="Nombre")
+    usuario = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='operador', verbose_name="Usuario")
+
+    class Meta:
+        verbose_name = "Operador"
+        verbose_name_plural = "Operadores"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+def operador_de_usuario(user):
+    """Operador vinculado al usuario; si no tiene, se vincula (o se crea) el de su nombre"""
+    try:
+        return user.operador
+    except Operador.DoesNotExist:
+        pass
+    nombre = nombre_operador(user)
+    operador, _ = Operador.objects.get_or_create(nombre=nombre)
+    if operador.usuario_id is None:
+        operador.usuario = user
+        operador.save(update_fields=['usuario'])
+    elif operador.usuario_id != user.pk:
+        # Otro usuario ya tiene ese nombre de operador
+        operador, _ = Operador.objects.get_or_create(nombre=f'{nombre} ({user.username})', defaults={'usuario': user})
+    user.operador = operador
+    return operador
+
+
+def ids_operadores(nombres):
+    """
+    Diccionario {nombre: id} de los operadores indicados; crea los que faltan
+    y los vincula al usuario con ese nombre de operador, si lo hay.
+    """
+    nombres = set(nombres)
+    if not nombres:
+        return {}
+    Operador.objects.bulk_create([Operador(nombre=nombre) for nombre in nombres], ignore_conflicts=True)
+    sin_usuario = list(Operador.objects.filter(nombre__in=nombres, usuario__isnull=True))
+    if sin_usuario:
+        usuarios = {
+            nombre_operador(user): user.pk
+            for user in User.objects.filter(operador__isnull=True).only('pk', 'username', 'first_name', 'last_name')
+        }
+        for operador in sin_usuario:
+            if operador.nombre in usuarios:
+                Operador.objects.filter(pk=operador.pk).update(usuario_id=usuarios.pop(operador.nombre))
+    return dict(Operador.objects.filter(nombre__in=nombres).values_list('nombre', 'id'))
+
 
 class Consulta(models.Model):
     ZONA_CHOICES = [
@@ -71,6 +211,9 @@ class Consulta(models.Model):
         ('Judicializado', 'Judicializado'),
     ]
     
+    # Un bit por cada situación social, para guardar la selección múltiple como entero
+    SITUACION_SOCIAL_BITS = {valor: 1 << i for i, (valor, _) in enumerate(SITUACION_SOCIAL_CHOICES)}
+    
     CARACTERISTICA_JUDICIAL_CHOICES = [
         ('Judicializado', 'Judicializado'),
         ('', 'Sin especificar'),
@@ -80,25 +223,28 @@ class Consulta(models.Model):
     marca_temporal = models.DateTimeField(auto_now_add=True, verbose_name="Marca temporal")
     fecha = models.DateField(verbose_name="Fecha")
     zona = models.CharField(max_length=50, choices=ZONA_CHOICES, verbose_name="Zona")
-    operador = models.CharField(max_length=100, verbose_name="Operador")
+    operador = models.ForeignKey(Operador, on_delete=models.PROTECT, db_index=False, related_name='consultas', verbose_name="Operador")
     
     # Datos del interlocutor
     apellido_nombre_interlocutor = models.CharField(max_length=200, verbose_name="Apellido y Nombre Interlocutor")
     consulta = models.CharField(max_length=20, choices=CONSULTA_CHOICES, verbose_name="Consulta")
     telefono_interlocutor = models.CharField(max_length=50, blank=True, null=True, verbose_name="Teléfono Interlocutor")
     tipo_vinculo = models.CharField(max_length=100, blank=True, null=True, verbose_name="Tipo de Vínculo (Consulta Indirecta)")
-    motivo_consulta = models.TextField(verbose_name="Motivo de la Consulta")
+    motivo_consulta = campo_narrativa('motivo_consulta')
     
     # Datos del usuario
     apellido_nombre_usuario = models.CharField(max_length=200, verbose_name="Apellido y Nombre Usuario")
     dni = models.CharField(max_length=20, blank=True, null=True, verbose_name="DNI")
     fecha_nacimiento = models.CharField(max_length=50, blank=True, null=True, verbose_name="Fecha de Nacimiento")
     edad = models.CharField(max_length=20, blank=True, null=True, verbose_name="Edad")
+    # Derivados de fecha_nacimiento y edad (ver consultas.edades)
+    nacimiento = models.DateField(blank=True, null=True, editable=False, verbose_name="Fecha de Nacimiento (fecha)")
+    edad_anios = models.SmallIntegerField(blank=True, null=True, editable=False, verbose_name="Edad (años)")
     sexo = models.CharField(max_length=50, choices=SEXO_CHOICES, verbose_name="Sexo")
     nacionalidad = models.CharField(max_length=50, default="Argentina", verbose_name="Nacionalidad")
     ciudad = models.CharField(max_length=100, verbose_name="Ciudad")
     barrio = models.CharField(max_length=100, blank=True, null=True, verbose_name="Barrio")
-    direccion = models.CharField(max_length=200, blank=True, null=True, verbose_name="Dirección")
+    direccion = campo_narrativa('direccion')
     telefono = models.CharField(max_length=50, blank=True, null=True, verbose_name="Teléfono")
     
     # Datos educativos
@@ -120,8 +266,9 @@ class Consulta(models.Model):
     # Datos de consumo
     tiempo_consumo = models.CharField(max_length=50, choices=TIEMPO_CONSUMO_CHOICES, blank=True, null=True, verbose_name="Tiempo de Consumo")
     tipo_sustancia = models.TextField(blank=True, null=True, verbose_name="Tipo de Sustancia que Consume")
+    sustancias = models.ManyToManyField(Sustancia, through='ConsultaSustancia', blank=True, related_name='consultas', verbose_name="Sustancias")
     tratamiento_anterior = models.CharField(max_length=5, choices=TRATAMIENTO_ANTERIOR_CHOICES, blank=True, null=True, verbose_name="Tratamiento Anterior")
-    tipo_tratamiento_anterior = models.TextField(blank=True, null=True, verbose_name="Tipo de Tratamiento Anterior")
+    tipo_tratamiento_anterior = campo_narrativa('tipo_tratamiento_anterior')
     
     # Datos de salud
     efector_salud_referencia = models.CharField(max_length=200, blank=True, null=True, verbose_name="Efector de Salud de Referencia")
@@ -131,18 +278,413 @@ class Consulta(models.Model):
     
     # Datos sociales
     situacion_social = models.TextField(blank=True, null=True, verbose_name="Situación Social")
+    situacion_social_flags = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False, verbose_name="Situación Social (máscara)")
     caracteristica_judicial = models.CharField(max_length=200, blank=True, null=True, verbose_name="Característica Judicial")
-    intervencion_propuesta = models.TextField(blank=True, null=True, verbose_name="Intervención Propuesta")
+    intervencion_propuesta = campo_narrativa('intervencion_propuesta')
     
     # Auditoría
     creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='consultas_creadas')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
+    huella = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="Huella de importación")
+
+    objects = ConsultaQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Consulta"
         verbose_name_plural = "Consultas"
         ordering = ['-fecha', '-marca_temporal']
+        indexes = [
+            # Orden por defecto de los listados
+            models.Index(fields=['-fecha', '-marca_temporal'], name='consulta_orden_idx'),
+            # Mis consultas: búsqueda por dueño ya ordenada
+            models.Index(fields=['creado_por', '-fecha', '-marca_temporal'], name='consulta_creado_orden_idx'),
+            models.Index(fields=['operador', '-fecha', '-marca_temporal'], name='consulta_operador_orden_idx'),
+            # Filtros de informes combinados con el rango de fechas
+            models.Index(fields=['zona', '-fecha', '-marca_temporal'], name='consulta_zona_orden_idx'),
+            models.Index(fields=['riesgo_inminente', '-fecha', '-marca_temporal'], name='consulta_riesgo_orden_idx'),
+        ]
 
     def __str__(self):
         return f"{self.fecha} - {self.apellido_nombre_usuario} - {self.zona}"
+
+    @classmethod
+    def mascara_situacion_social(cls, texto):
+        """Convierte el texto de situaciones sociales separadas por comas en una máscara de bits"""
+        bits = {valor.lower(): bit for valor, bit in cls.SITUACION_SOCIAL_BITS.items()}
+        mascara = 0
+        for valor in separar_valores(texto):
+            mascara |= bits.get(valor.lower(), 0)
+        return mascara
+    
+    @classmethod
+    def situaciones_de_mascara(cls, mascara):
+        """Devuelve las situaciones sociales incluidas en una máscara"""
+        return [valor for valor, bit in cls.SITUACION_SOCIAL_BITS.items() if mascara & bit]
+    
+    @classmethod
+    def mascaras_con_situacion(cls, valor):
+        """Devuelve todas las máscaras posibles que incluyen la situación indicada"""
+        bit = cls.SITUACION_SOCIAL_BITS.get(valor)
+        if not bit:
+            return []
+        return [mascara for mascara in range(1 << len(cls.SITUACION_SOCIAL_BITS)) if mascara & bit]
+
+    def obtener_narrativa(self):
+        """Narrativa de la consulta; si no tiene, una nueva (sin guardar) para completar"""
+        try:
+            return self.narrativa
+        except ConsultaNarrativa.DoesNotExist:
+            self.narrativa = ConsultaNarrativa(consulta=self)
+            return self.narrativa
+
+    def narrativa_en_memoria(self):
+        """Narrativa ya leída o asignada, sin consultar la base de datos (None si no hay)"""
+        return Consulta.narrativa.related.get_cached_value(self, default=None)
+
+    def save(self, *args, **kwargs):
+        # Un solo dueño por consulta: la cargada por un usuario queda a nombre de su operador
+        if self.creado_por_id and (self._state.adding or not self.operador_id):
+            self.operador = operador_de_usuario(self.creado_por)
+        self.situacion_social_flags = self.mascara_situacion_social(self.situacion_social)
+        self.nacimiento, self.edad_anios = calcular_edad(self.edad, self.fecha_nacimiento, self.fecha)
+        # Una sola transacción: el resumen del día se recalcula viendo la consulta
+        # guardada y otra carga del mismo día espera a que termine
+        with transaction.atomic():
+            fecha_anterior = Consulta.objects.filter(pk=self.pk).values_list('fecha', flat=True).first() if self.pk else None
+            super().save(*args, **kwargs)
+            guardar_narrativas([self])
+            sincronizar_sustancias([self])
+            actualizar_resumen_diario([fecha_anterior, self.fecha])
+
+
+class ConsultaNarrativa(models.Model):
+    """
+    Textos largos de una consulta. Están en una tabla aparte para que los
+    recorridos de informes lean filas angostas de consultas_consulta; Consulta
+    los expone como atributos propios (motivo_consulta, direccion, ...).
+    """
+    consulta = models.OneToOneField(Consulta, on_delete=models.CASCADE, primary_key=True, related_name='narrativa')
+    motivo_consulta = models.TextField(verbose_name="Motivo de la Consulta")
+    direccion = models.CharField(max_length=200, blank=True, null=True, verbose_name="Dirección")
+    tipo_tratamiento_anterior = models.TextField(blank=True, null=True, verbose_name="Tipo de Tratamiento Anterior")
+    intervencion_propuesta = models.TextField(blank=True, null=True, verbose_name="Intervención Propuesta")
+
+    class Meta:
+        verbose_name = "Narrativa de la consulta"
+        verbose_name_plural = "Narrativas de las consultas"
+
+
+def guardar_narrativas(consultas):
+    """Inserta o actualiza la narrativa en memoria de cada consulta ya guardada"""
+    narrativas = []
+    for consulta in consultas:
+        narrativa = consulta.narrativa_en_memoria()
+        if narrativa is not None:
+            # La clave puede haber cambiado (por ejemplo, al reintentar un lote de importación)
+            narrativa.consulta = consulta
+            narrativas.append(narrativa)
+    if narrativas:
+        ConsultaNarrativa.objects.bulk_create(
+            narrativas,
+            update_conflicts=True,
+            unique_fields=['consulta'],
+            update_fields=CAMPOS_NARRATIVA,
+            batch_size=1000,
+        )
+
+
+class ConsultaSustancia(models.Model):
+    consulta = models.ForeignKey(Consulta, on_delete=models.CASCADE, related_name='consulta_sustancias')
+    sustancia = models.ForeignKey(Sustancia, on_delete=models.CASCADE, related_name='consulta_sustancias')
+
+    class Meta:
+        verbose_name = "Sustancia de la consulta"
+        verbose_name_plural = "Sustancias de la consulta"
+        constraints = [
+            models.UniqueConstraint(fields=['consulta', 'sustancia'], name='consulta_sustancia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['sustancia', 'consulta'], name='sustancia_consulta_idx'),
+        ]
+
+
+def sincronizar_sustancias(consultas):
+    """Sincroniza la tabla de sustancias de cada consulta con su texto tipo_sustancia"""
+    nombres_por_consulta = {c.pk: set(separar_valores(c.tipo_sustancia)) for c in consultas}
+    if not nombres_por_consulta:
+        return
+    
+    todos = set().union(*nombres_por_consulta.values())
+    ids = {}
+    if todos:
+        Sustancia.objects.bulk_create([Sustancia(nombre=n) for n in todos], ignore_conflicts=True)
+        ids = dict(Sustancia.objects.filter(nombre__in=todos).values_list('nombre', 'id'))
+    
+    ConsultaSustancia.objects.filter(consulta_id__in=nombres_por_consulta.keys()).delete()
+    ConsultaSustancia.objects.bulk_create([
+        ConsultaSustancia(consulta_id=pk, sustancia_id=ids[nombre])
+        for pk, nombres in nombres_por_consulta.items()
+        for nombre in nombres
+    ])
+
+
+# Columnas de Consulta que forman la clave del resumen diario
+CAMPOS_RESUMEN_DIARIO = [
+    'fecha',
+    'zona',
+    'operador_id',
+]
+
+# Columnas de Consulta que se resumen por día y valor en ResumenDiarioDimension
+COLUMNAS_RESUMEN_DIMENSION = [
+    'consulta',
+    'sexo',
+    'tiempo_consumo',
+    'tratamiento_anterior',
+    'ciudad',
+]
+
+# Primera clave de los advisory locks de PostgreSQL del resumen diario (la segunda es el día)
+CLAVE_BLOQUEO_RESUMEN = 800
+
+
+class ResumenDiario(models.Model):
+    """Cantidad de consultas por día, zona y operador, para el panel de informes"""
+    fecha = models.DateField(verbose_name="Fecha")
+    zona = models.CharField(max_length=50, verbose_name="Zona")
+    operador = models.ForeignKey(Operador, on_delete=models.PROTECT, db_index=False, related_name='+', verbose_name="Operador")
+    cantidad = models.PositiveIntegerField(default=0, verbose_name="Cantidad")
+
+    class Meta:
+        verbose_name = "Resumen diario"
+        verbose_name_plural = "Resúmenes diarios"
+        indexes = [
+            models.Index(fields=['fecha'], name='resumen_diario_fecha_idx'),
+        ]
+
+
+class ResumenDiarioDimension(models.Model):
+    """
+    Cantidad de consultas por día y valor de una dimensión del panel (las
+    COLUMNAS_RESUMEN_DIMENSION, cada situación social y cada sustancia)
+    """
+    fecha = models.DateField(verbose_name="Fecha")
+    dimension = models.CharField(max_length=30, verbose_name="Dimensión")
+    valor = models.CharField(max_length=200, null=True, verbose_name="Valor")
+    cantidad = models.PositiveIntegerField(default=0, verbose_name="Cantidad")
+
+    class Meta:
+        verbose_name = "Resumen diario por dimensión"
+        verbose_name_plural = "Resúmenes diarios por dimensión"
+        indexes = [
+            models.Index(fields=['dimension', 'fecha'], name='resumen_dimension_fecha_idx'),
+        ]
+
+
+def bloquear_dias_resumen(fechas):
+    """
+    Serializa la reconstrucción del resumen de cada día hasta el fin de la
+    transacción. En PostgreSQL (READ COMMITTED) toma un advisory lock por día,
+    en orden para no cruzarse; en SQLite las transacciones son IMMEDIATE y ya
+    se ejecutan de a una.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for fecha in sorted(fechas):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [CLAVE_BLOQUEO_RESUMEN, fecha.toordinal()])
+
+
+def filas_resumen_dimension(fechas):
+    """
+    Filas de ResumenDiarioDimension de las consultas de esas fechas: una por
+    día, dimensión y valor. Cada consulta cuenta una vez en cada una de sus
+    situaciones sociales y de sus sustancias.
+    """
+    consultas = Consulta.objects.filter(fecha__in=fechas).order_by()
+    for columna in COLUMNAS_RESUMEN_DIMENSION:
+        for fila in consultas.values('fecha', columna).annotate(cantidad=Count('id')):
+            yield ResumenDiarioDimension(fecha=fila['fecha'], dimension=columna, valor=fila[columna], cantidad=fila['cantidad'])
+
+    situaciones = Counter()
+    for fila in consultas.values('fecha', 'situacion_social_flags').annotate(cantidad=Count('id')):
+        for situacion in Consulta.situaciones_de_mascara(fila['situacion_social_flags']):
+            situaciones[fila['fecha'], situacion] += fila['cantidad']
+    for (fecha, situacion), cantidad in situaciones.items():
+        yield ResumenDiarioDimension(fecha=fecha, dimension='situacion_social', valor=situacion, cantidad=cantidad)
+
+    vinculos = ConsultaSustancia.objects.filter(consulta__fecha__in=fechas).order_by()
+    for fila in vinculos.values('consulta__fecha', 'sustancia__nombre').annotate(cantidad=Count('id')):
+        yield ResumenDiarioDimension(
+            fecha=fila['consulta__fecha'], dimension='sustancia', valor=fila['sustancia__nombre'], cantidad=fila['cantidad'],
+        )
+
+
+def actualizar_resumen_diario(fechas):
+    """
+    Recalcula el resumen diario de las fechas indicadas a partir de las consultas.
+
+    Solo se reagrupan las consultas de esos días, así que el costo depende de
+    la cantidad de consultas del día y no del total de la tabla. Dos
+    recálculos del mismo día se ejecutan de a uno (bloquear_dias_resumen).
+    """
+    fechas = {fecha for fecha in fechas if fecha is not None}
+    if not fechas:
+        return
+
+    consultas = Consulta.objects.filter(fecha__in=fechas).order_by()
+    with transaction.atomic():
+        bloquear_dias_resumen(fechas)
+        ResumenDiario.objects.filter(fecha__in=fechas).delete()
+        ResumenDiarioDimension.objects.filter(fecha__in=fechas).delete()
+        ResumenDiario.objects.bulk_create(
+            [ResumenDiario(**fila) for fila in consultas.values(*CAMPOS_RESUMEN_DIARIO).annotate(cantidad=Count('id'))],
+            batch_size=1000,
+        )
+        ResumenDiarioDimension.objects.bulk_create(list(filas_resumen_dimension(fechas)), batch_size=1000)
+
+
+class ResumenPendiente:
+    """Días a recalcular al confirmar la transacción (callback de on_commit)"""
+
+    def __init__(self):
+        self.fechas = set()
+
+    def __call__(self):
+        # Queda vacío si ya se recalculó antes de confirmar (recalcular_resumen_pendiente)
+        fechas, self.fechas = self.fechas, set()
+        if fechas:
+            actualizar_resumen_diario(fechas)
+
+
+def actualizar_resumen_al_confirmar(fechas, using=None):
+    """
+    Agrega los días al recálculo pendiente de la transacción en curso, así
+    borrar muchas consultas recalcula cada día una sola vez al confirmar.
+    Fuera de una transacción recalcula en el momento.
+    """
+    conexion = transaction.get_connection(using)
+    if not conexion.in_atomic_block:
+        actualizar_resumen_diario(fechas)
+        return
+    # Si el savepoint donde se registró se deshace, Django lo quita de la lista y se registra otro
+    pendiente = next((funcion for _, funcion, _ in conexion.run_on_commit if isinstance(funcion, ResumenPendiente)), None)
+    if pendiente is None:
+        pendiente = ResumenPendiente()
+        transaction.on_commit(pendiente, using)
+    pendiente.fechas.update(fechas)
+
+
+def recalcular_resumen_pendiente(using=None):
+    """Recalcula ya, dentro de la transacción, los días pendientes de recalcular al confirmar"""
+    conexion = transaction.get_connection(using)
+    for _, funcion, _ in conexion.run_on_commit:
+        if isinstance(funcion, ResumenPendiente):
+            funcion()
+
+
+def reconstruir_resumen_diario(dias_por_lote=100):
+    """Reconstruye el resumen diario completo; devuelve la cantidad de días procesados"""
+    fechas = list(Consulta.objects.order_by('fecha').values_list('fecha', flat=True).distinct())
+    with transaction.atomic():
+        ResumenDiario.objects.all().delete()
+        ResumenDiarioDimension.objects.all().delete()
+        for desde in range(0, len(fechas), dias_por_lote):
+            actualizar_resumen_diario(fechas[desde:desde + dias_por_lote])
+    return len(fechas)
+
+
+def completar_edades(tamanio_lote=5000, progreso=None):
+    """
+    Recalcula nacimiento y edad_anios de todas las consultas desde sus textos,
+    por lotes de claves, y guarda solo las que cambiaron. Devuelve la cantidad
+    actualizada; `progreso`, si se indica, se llama con (procesadas, actualizadas).
+    """
+    campos = ['pk', 'edad', 'fecha_nacimiento', 'fecha', 'nacimiento', 'edad_anios']
+    ultimo = 0
+    procesadas = 0
+    actualizadas = 0
+    while True:
+        filas = list(Consulta.objects.filter(pk__gt=ultimo).order_by('pk').values_list(*campos)[:tamanio_lote])
+        if not filas:
+            return actualizadas
+        pks, edades, textos_nacimiento, fechas, nacimientos_actuales, edades_actuales = zip(*filas)
+        nacimientos, edades_anios = calcular_edades(edades, textos_nacimiento, fechas)
+        # Un UPDATE por cada combinación distinta: pocas en datos reales, y más
+        # rápido que bulk_update, que arma un CASE con una rama por fila
+        ids_por_valores = {}
+        for pk, nacimiento, edad, nacimiento_actual, edad_actual in zip(
+            pks, nacimientos, edades_anios, nacimientos_actuales, edades_actuales
+        ):
+            if (nacimiento, edad) != (nacimiento_actual, edad_actual):
+                ids_por_valores.setdefault((nacimiento, edad), []).append(pk)
+        with transaction.atomic():
+            for (nacimiento, edad), ids in ids_por_valores.items():
+                for inicio in range(0, len(ids), 500):
+                    Consulta.objects.filter(pk__in=ids[inicio:inicio + 500]).update(nacimiento=nacimiento, edad_anios=edad)
+                actualizadas += len(ids)
+        ultimo = pks[-1]
+        procesadas += len(filas)
+        if progreso:
+            progreso(procesadas, actualizadas)
+
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano (exportación o importación) que ejecuta el comando procesar_tareas"""
+    EXPORTACION = 'exportacion'
+    IMPORTACION = 'importacion'
+    TIPO_CHOICES = [
+        (EXPORTACION, 'Exportación CSV'),
+        (IMPORTACION, 'Importación CSV'),
+    ]
+
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    ERROR = 'error'
+    ESTADO_CHOICES = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (COMPLETADA, 'Completada'),
+        (ERROR, 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE, verbose_name="Estado")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parámetros")
+    procesadas = models.PositiveIntegerField(default=0, verbose_name="Filas procesadas")
+    total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Filas totales")
+    archivo = models.CharField(max_length=500, blank=True, verbose_name="Archivo generado")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    error = models.TextField(blank=True, verbose_name="Error")
+    creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tareas')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # Último progreso del proceso que la ejecuta: sin latidos recientes, la tarea quedó interrumpida
+    fecha_latido = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # Cola: la pendiente más antigua primero
+            models.Index(fields=['estado', 'fecha_creacion'], name='tarea_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def terminada(self):
+        return self.estado in (self.COMPLETADA, self.ERROR)
+
+    @property
+    def porcentaje(self):
+        if self.estado == self.COMPLETADA:
+            return 100
+        if not self.total:
+            return 0
+        return min(100, round(self.procesadas * 100 / self.total))
@@ -0,0 +1,171 @@
+"""
+Paginación por cursor (keyset) para los listados de consultas.
+
+En lugar de OFFSET, cada página se pide con un cursor opaco que guarda los
+valores de orden de la última (o primera) fila mostrada; la siguiente página
+se obtiene con un WHERE sobre esos valores, que los índices de orden resuelven
+sin recorrer las filas anteriores. El costo de una página no depende de su
+posición en el listado.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import Q
+
+
+POR_PAGINA = 20
+
+# Conteo acotado: por encima de este número solo se informa "más de"
+LIMITE_CONTEO = 10000
+
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+def contar_acotado(queryset, limite=LIMITE_CONTEO):
+    """Cuenta las filas hasta `limite`; devuelve (cantidad, si el total real es mayor)"""
+    # Solo la clave: las columnas y anotaciones del listado no hacen falta para contar
+    cantidad = queryset.order_by().values('pk')[:limite + 1].count()
+    return min(cantidad, limite), cantidad > limite
+
+
+def invertir(campo):
+    return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+
+class PaginaCursor:
+    """Una página de resultados con los cursores para moverse a la anterior y la siguiente"""
+
+    def __init__(self, object_list, cursor_siguiente=None, cursor_anterior=None, total=None, total_es_minimo=False):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+        self.total_es_minimo = total_es_minimo
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class PaginadorCursor:
+    """
+    Pagina un queryset según su orden (o el del modelo), con la clave primaria
+    como desempate. `total` permite pasar un total ya conocido; con `contar`
+    se calcula un total acotado a LIMITE_CONTEO.
+    """
+
+    def __init__(self, queryset, por_pagina=POR_PAGINA, total=None, contar=False, limite_conteo=LIMITE_CONTEO):
+        self.queryset = queryset
+        self.por_pagina = por_pagina
+        self.total = total
+        self.contar = contar
+        self.limite_conteo = limite_conteo
+        self.orden = self.calcular_orden()
+
+    def calcular_orden(self):
+        modelo = self.queryset.model
+        orden = [campo for campo in (self.queryset.query.order_by or modelo._meta.ordering) if isinstance(campo, str)]
+        pk = modelo._meta.pk.name
+        if not any(campo.lstrip('-') in (pk, 'pk') for campo in orden):
+            orden.append(f'-{pk}' if orden and orden[-1].startswith('-') else pk)
+        return ['-' + pk if campo == '-pk' else pk if campo == 'pk' else campo for campo in orden]
+
+    def valores_de(self, fila):
+        valores = []
+        for campo in self.orden:
+            nombre = campo.lstrip('-')
+            valores.append(fila[nombre] if isinstance(fila, dict) else getattr(fila, nombre))
+        return valores
+
+    def codificar(self, direccion, fila):
+        datos = json.dumps([direccion, self.valores_de(fila)], default=lambda valor: valor.isoformat())
+        return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decodificar(self, cursor):
+        """Devuelve (dirección, valores) del cursor, o (None, None) si es inválido"""
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            direccion, valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if direccion not in (SIGUIENTE, ANTERIOR) or len(valores) != len(self.orden):
+                return None, None
+            convertidos = []
+            for campo, valor in zip(self.orden, valores):
+                field, admite_nulo = self.campo_de_orden(campo.lstrip('-'))
+                convertido = field.to_python(valor)
+                if convertido is None and not admite_nulo:
+                    return None, None
+                convertidos.append(convertido)
+            return direccion, convertidos
+        except (TypeError, ValueError, ValidationError, FieldError):
+            return None, None
+
+    def campo_de_orden(self, nombre):
+        """
+        Campo con el que se valida un valor del cursor y si admite nulos: el del
+        modelo o el output_field de la anotación (por ejemplo, el rango de la
+        búsqueda; sin output_field declarado lanza FieldError).
+        """
+        try:
+            field = self.queryset.model._meta.get_field(nombre)
+            return field, field.null
+        except FieldDoesNotExist:
+            pass
+        anotacion = self.queryset.query.annotations.get(nombre)
+        if anotacion is None:
+            raise ValueError(f'Campo de orden desconocido: {nombre}')
+        return anotacion.output_field, True
+
+    def condicion(self, orden, valores):
+        """WHERE de keyset: filas que van después de `valores` en el orden indicado"""
+        condicion = Q()
+        iguales = Q()
+        for campo, valor in zip(orden, valores):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            condicion |= iguales & Q(**{f'{nombre}__{operador}': valor})
+            iguales &= Q(**{nombre: valor})
+        return condicion
+
+    def get_page(self, cursor=None):
+        direccion, valores = self.decodificar(cursor) if cursor else (None, None)
+
+        orden = self.orden if direccion != ANTERIOR else [invertir(campo) for campo in self.orden]
+        queryset = self.queryset.order_by(*orden)
+        if valores is not None:
+            queryset = queryset.filter(self.condicion(orden, valores))
+
+        filas = list(queryset[:self.por_pagina + 1])
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina]
+        if direccion == ANTERIOR:
+            filas.reverse()
+
+        hay_siguiente = hay_mas if direccion != ANTERIOR else True
+        hay_anterior = hay_mas if direccion == ANTERIOR else direccion == SIGUIENTE
+
+        total, total_es_minimo = self.total, False
+        if total is None and self.contar:
+            total, total_es_minimo = contar_acotado(self.queryset, self.limite_conteo)
+
+        return PaginaCursor(
+            filas,
+            cursor_siguiente=self.codificar(SIGUIENTE, filas[-1]) if filas and hay_siguiente else None,
+            cursor_anterior=self.codificar(ANTERIOR, filas[0]) if filas and hay_anterior else None,
+            total=total,
+            total_es_minimo=total_es_minimo,
+        )
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .busqueda import asegurar_indice_busqueda
+from .cache import invalidar_datos
+from .models import Consulta, Operador, Sustancia, actualizar_resumen_al_confirmar, nombre_operador
+
+
+class InvalidacionPendiente:
+    """Invalidación de la caché registrada en on_commit, para no repetirla en la misma transacción"""
+
+    def __init__(self):
+        self.ejecutada = False
+
+    def __call__(self):
+        self.ejecutada = True
+        invalidar_datos()
+
+
+@receiver(post_save, sender=Consulta)
+@receiver(post_delete, sender=Consulta)
+@receiver(post_save, sender=Sustancia)
+@receiver(post_delete, sender=Sustancia)
+def invalidar_cache_consultas(sender, **kwargs):
+    """
+    Invalida los datos cacheados cuando cambia una consulta o una sustancia.
+    Se hace al confirmar la transacción: post_save llega antes de que
+    Consulta.save sincronice las sustancias y el resumen diario. Se registra
+    una sola vez por transacción, aunque se borren muchas consultas.
+    """
+    using = kwargs.get('using')
+    conexion = transaction.get_connection(using)
+    if not any(isinstance(funcion, InvalidacionPendiente) and not funcion.ejecutada for _, funcion, _ in conexion.run_on_commit):
+        transaction.on_commit(InvalidacionPendiente(), using)
+
+
+@receiver(post_delete, sender=Consulta)
+def actualizar_resumen_consulta_eliminada(sender, instance, using, **kwargs):
+    """Recalcula el resumen diario del día de la consulta eliminada, una vez por día al confirmar"""
+    actualizar_resumen_al_confirmar([instance.fecha], using)
+
+
+@receiver(post_save, sender=User)
+def vincular_operador_usuario(sender, instance, created, **kwargs):
+    """Vincula al usuario nuevo el operador sin usuario que tiene su nombre (y con él, sus consultas)"""
+    if created:
+        Operador.objects.filter(usuario__isnull=True, nombre=nombre_operador(instance)).update(usuario=instance)
+
+
+# Las migraciones que reconstruyen la tabla en SQLite eliminan los triggers de búsqueda
+post_migrate.connect(asegurar_indice_busqueda, dispatch_uid='consultas_asegurar_indice_busqueda')
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    """Aplica SQLITE_PRAGMAS (WAL, synchronous, busy_timeout, mmap) a cada conexión nueva de SQLite"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nombre, valor in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
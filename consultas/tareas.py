@@ -0,0 +1,150 @@
+"""
+Cola de tareas en segundo plano sobre la base de datos.
+
+Las vistas y comandos encolan una Tarea; el comando procesar_tareas la toma
+(con un UPDATE condicionado al estado, para que dos procesos no tomen la misma),
+la ejecuta y va guardando el progreso. No hace falta ningún broker externo.
+Las tareas terminadas y sus archivos se borran después de
+TAREAS_RETENCION_DIAS días (limpiar_vencidas).
+"""
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+
+from .exportacion import FORMATOS_EXPORTACION, exportar_archivo
+from .filters import ConsultaFilter
+from .importacion import TAMANIO_LOTE, importar_csv
+from .models import Consulta, Tarea
+
+
+# Tiempo sin progreso tras el cual una tarea en curso se da por interrumpida
+# (cada lote de importación o exportación renueva el latido)
+INACTIVIDAD_MAXIMA = timedelta(minutes=10)
+
+
+def encolar(tipo, parametros, usuario=None):
+    """Crea una tarea pendiente y la devuelve"""
+    return Tarea.objects.create(tipo=tipo, parametros=parametros, creado_por=usuario)
+
+
+def encolar_importacion(archivo, actualizar=False, usuario=None):
+    """
+    Guarda en TAREAS_DIR el CSV subido (un UploadedFile, que puede estar en
+    memoria o en un temporal que se borra al terminar el request) y encola su
+    importación.
+    """
+    directorio = settings.TAREAS_DIR / 'importaciones'
+    directorio.mkdir(parents=True, exist_ok=True)
+    ruta = directorio / f'{uuid.uuid4().hex}.csv'
+    with open(ruta, 'wb') as destino:
+        for bloque in archivo.chunks():
+            destino.write(bloque)
+    return encolar(Tarea.IMPORTACION, {'archivo': str(ruta), 'nombre': archivo.name, 'actualizar': actualizar}, usuario)
+
+
+def tomar_siguiente():
+    """Marca como en curso la tarea pendiente más antigua y la devuelve, o None si no hay"""
+    while True:
+        pk = Tarea.objects.filter(estado=Tarea.PENDIENTE).order_by('fecha_creacion', 'pk').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        # Solo un proceso logra pasarla de pendiente a en curso
+        ahora = timezone.now()
+        if Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(estado=Tarea.EN_CURSO, fecha_inicio=ahora, fecha_latido=ahora):
+            return Tarea.objects.get(pk=pk)
+
+
+def registrar_progreso(tarea):
+    """Devuelve una función (procesadas, total) que guarda el progreso de la tarea"""
+    def progreso(procesadas, total):
+        tarea.procesadas, tarea.total = procesadas, total
+        Tarea.objects.filter(pk=tarea.pk).update(procesadas=procesadas, total=total, fecha_latido=timezone.now())
+    return progreso
+
+
+def ejecutar_exportacion(tarea):
+    """Exporta a un archivo (CSV, Parquet, Arrow o Excel) las consultas que cumplen los filtros de la tarea"""
+    filterset = ConsultaFilter(QueryDict(tarea.parametros.get('filtros', '')), queryset=Consulta.objects.all())
+    directorio = settings.TAREAS_DIR
+    directorio.mkdir(parents=True, exist_ok=True)
+    formato = tarea.parametros.get('formato', 'csv')
+    ruta = directorio / f'exportacion_{tarea.pk}.{FORMATOS_EXPORTACION[formato][0]}'
+    Tarea.objects.filter(pk=tarea.pk).update(archivo=str(ruta))
+    filas = exportar_archivo(filterset.qs, ruta, formato, progreso=registrar_progreso(tarea))
+    return {'filas': filas}
+
+
+def ejecutar_importacion(tarea):
+    """Importa el CSV indicado en la tarea"""
+    return importar_csv(
+        tarea.parametros['archivo'],
+        tamanio_lote=tarea.parametros.get('lote') or TAMANIO_LOTE,
+        actualizar=tarea.parametros.get('actualizar', False),
+        progreso=registrar_progreso(tarea),
+    )
+
+
+EJECUTORES = {
+    Tarea.EXPORTACION: ejecutar_exportacion,
+    Tarea.IMPORTACION: ejecutar_importacion,
+}
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea ya tomada y guarda su resultado o su error"""
+    try:
+        resultado = EJECUTORES[tarea.tipo](tarea)
+    except Exception:
+        Tarea.objects.filter(pk=tarea.pk).update(
+            estado=Tarea.ERROR, error=traceback.format_exc(), fecha_fin=timezone.now()
+        )
+        return False
+    Tarea.objects.filter(pk=tarea.pk).update(
+        estado=Tarea.COMPLETADA, resultado=resultado, fecha_fin=timezone.now()
+    )
+    return True
+
+
+def marcar_interrumpidas(inactividad=INACTIVIDAD_MAXIMA):
+    """
+    Marca con error las tareas en curso sin latido en el último `inactividad`
+    (el proceso que las ejecutaba se detuvo); devuelve cuántas. Las que otro
+    proceso sigue ejecutando no se tocan.
+    """
+    ahora = timezone.now()
+    return Tarea.objects.filter(estado=Tarea.EN_CURSO).filter(
+        Q(fecha_latido__lt=ahora - inactividad) | Q(fecha_latido__isnull=True)
+    ).update(
+        estado=Tarea.ERROR, error='Interrumpida: el proceso de tareas se detuvo antes de terminarla', fecha_fin=ahora
+    )
+
+
+def archivos_de_tarea(tarea):
+    """Archivos de TAREAS_DIR que usó la tarea: el exportado y el CSV subido para importar"""
+    directorio = Path(settings.TAREAS_DIR).resolve()
+    rutas = [tarea.archivo, tarea.parametros.get('archivo') if tarea.tipo == Tarea.IMPORTACION else None]
+    # Los CSV importados desde la línea de comandos quedan donde estaban
+    return [Path(ruta) for ruta in rutas if ruta and Path(ruta).resolve().is_relative_to(directorio)]
+
+
+def limpiar_vencidas(retencion=None):
+    """
+    Borra las tareas terminadas hace más de `retencion` (por defecto
+    TAREAS_RETENCION_DIAS días) con sus archivos; devuelve cuántas.
+    """
+    if retencion is None:
+        retencion = timedelta(days=settings.TAREAS_RETENCION_DIAS)
+    vencidas = list(Tarea.objects.filter(
+        estado__in=[Tarea.COMPLETADA, Tarea.ERROR], fecha_fin__lt=timezone.now() - retencion,
+    ))
+    for tarea in vencidas:
+        for ruta in archivos_de_tarea(tarea):
+            ruta.unlink(missing_ok=True)
+    Tarea.objects.filter(pk__in=[tarea.pk for tarea in vencidas]).delete()
+    return len(vencidas)
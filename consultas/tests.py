@@ -1,3 +1,873 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import tempfile
+from datetime import date, timedelta
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Sum
+from django.db.migrations.executor import MigrationExecutor
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .datos_sinteticos import borrar_consultas_sinteticas, generar_consultas
+from .edades import calcular_edad, calcular_edades, parsear_edad, parsear_edades
+from .estadisticas import (
+    DIMENSIONES, MAX_PUNTOS_SERIE, SIN_EDAD, calcular_resumen, calcular_resumen_diario, carga_por_hora_semana,
+    contar_rangos_edad, serie_temporal, usa_resumen_diario,
+)
+from .filters import ConsultaFilter
+from .forms import ConsultaForm
+from .graficos import CACHE_GRAFICOS, datos_filtros, grafico_informes, grafico_mapa_calor
+from .busqueda import TABLA_FTS, buscar
+from .cache import CacheLRU, invalidar_datos, version_datos
+from .exportacion import COLUMNAS_EXPORTACION, FORMATOS_EXPORTACION, exportar_archivo
+from .importacion import importar_csv
+from .metricas import REGISTRO, SIN_RUTA
+from .paginacion import PaginadorCursor
+from .tareas import INACTIVIDAD_MAXIMA, encolar, ejecutar, limpiar_vencidas, marcar_interrumpidas, tomar_siguiente
+from .models import (
+    Consulta, ConsultaNarrativa, ConsultaSustancia, Operador, ResumenDiario, ResumenDiarioDimension, Tarea,
+    actualizar_resumen_diario, completar_edades, ids_operadores,
+)
+
+
+# Las pruebas no escriben en cache/ ni en tareas/ del proyecto, con cualquier ejecutor
+DIRECTORIO_PRUEBAS = tempfile.TemporaryDirectory()
+CONFIGURACION_PRUEBAS = override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    TAREAS_DIR=Path(DIRECTORIO_PRUEBAS.name) / 'tareas',
+)
+
+
+def setUpModule():
+    CONFIGURACION_PRUEBAS.enable()
+
+
+def tearDownModule():
+    CONFIGURACION_PRUEBAS.disable()
+    DIRECTORIO_PRUEBAS.cleanup()
+
+
+def crear_consulta(**campos):
+    """Crea una consulta con los campos obligatorios completos; `campos` reemplaza los valores por defecto"""
+    valores = {
+        'fecha': date(2025, 6, 1), 'zona': 'Sur', 'apellido_nombre_interlocutor': 'X', 'consulta': 'Directa',
+        'motivo_consulta': 'Prueba', 'apellido_nombre_usuario': 'Y', 'sexo': 'Mujer', 'ciudad': 'Rosario',
+    }
+    valores.update(campos)
+    if 'operador' not in valores:
+        valores['operador'] = Operador.objects.get_or_create(nombre='Sistema')[0]
+    return Consulta.objects.create(**valores)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es propio de SQLite')
+class IndicesConsultaTests(TestCase):
+    """Verifica con EXPLAIN QUERY PLAN que las consultas frecuentes usen índices"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave', first_name='Ana', last_name='Gómez')
+        cls.operador = Operador.objects.create(nombre='Gómez Ana', usuario=cls.usuario)
+
+    def assertUsaIndice(self, queryset, indice):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {indice}', plan)
+        # El índice también resuelve el orden: no hay ordenamiento en memoria
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def filtrar(self, **parametros):
+        return ConsultaFilter(parametros, queryset=Consulta.objects.all()).qs[:20]
+
+    def test_listado_ordenado(self):
+        self.assertUsaIndice(Consulta.objects.all()[:20], 'consulta_orden_idx')
+
+    def test_informes_rango_de_fechas(self):
+        qs = self.filtrar(fecha_desde='2025-01-01', fecha_hasta='2025-03-31')
+        self.assertUsaIndice(qs, 'consulta_orden_idx')
+
+    def test_informes_zona(self):
+        qs = self.filtrar(zona='Sur', fecha_desde='2025-01-01')
+        self.assertUsaIndice(qs, 'consulta_zona_orden_idx')
+
+    def test_informes_operador(self):
+        qs = self.filtrar(operador=str(self.operador.pk))
+        self.assertUsaIndice(qs, 'consulta_operador_orden_idx')
+
+    def test_informes_riesgo_inminente(self):
+        qs = self.filtrar(riesgo_inminente='Emergencia')
+        self.assertUsaIndice(qs, 'consulta_riesgo_orden_idx')
+
+    def test_mis_consultas(self):
+        qs = Consulta.objects.filter(operador=self.operador).order_by('-fecha', '-marca_temporal').listado_operador()[:21]
+        self.assertUsaIndice(qs, 'consulta_operador_orden_idx')
+
+    def test_consultas_por_creador(self):
+        qs = Consulta.objects.filter(creado_por=self.usuario)[:20]
+        self.assertUsaIndice(qs, 'consulta_creado_orden_idx')
+
+    def test_busqueda_ordenada_une_el_indice_una_vez(self):
+        # El MATCH se resuelve una vez desde la tabla FTS5 y cada fila se busca por clave;
+        # repetirlo por consulta candidata (subconsulta correlacionada) no escala
+        consultas = buscar(Consulta.objects.filter(operador=self.operador).order_by('-fecha', '-marca_temporal'), 'rosario')
+        for qs in (consultas.listado_operador()[:21], consultas.order_by().values('pk')[:10001]):
+            plan = qs.explain()
+            self.assertRegex(plan, rf'SCAN {TABLA_FTS} VIRTUAL TABLE INDEX \d+:M')
+            self.assertIn('SEARCH consultas_consulta USING INTEGER PRIMARY KEY', plan)
+            self.assertNotIn('CORRELATED', plan)
+
+
+class DatosSinteticosTests(TestCase):
+    """Verifica que las consultas sintéticas queden completas y se puedan borrar"""
+
+    def generar(self, semilla=0):
+        return generar_consultas(60, desde=date(2025, 1, 1), hasta=date(2025, 1, 31), semilla=semilla, tamanio_lote=25)
+
+    def test_genera_consultas_con_sustancias_y_resumen(self):
+        self.assertEqual(self.generar(), 60)
+        self.assertEqual(Consulta.objects.count(), 60)
+        self.assertTrue(ConsultaSustancia.objects.exists())
+        self.assertEqual(sum(ResumenDiario.objects.values_list('cantidad', flat=True)), 60)
+        self.assertFalse(Consulta.objects.filter(operador__usuario=None).exists())
+
+    def test_misma_semilla_mismos_datos(self):
+        self.generar(semilla=7)
+        primera = list(Consulta.objects.order_by('huella').values_list('huella', 'narrativa__motivo_consulta'))
+        borrar_consultas_sinteticas()
+        self.generar(semilla=7)
+        self.assertEqual(list(Consulta.objects.order_by('huella').values_list('huella', 'narrativa__motivo_consulta')), primera)
+
+    def test_borrar_solo_sinteticas(self):
+        self.generar()
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_consulta(fecha=date(2025, 1, 10), motivo_consulta='Real')
+            # Un operador sintético con una consulta real se conserva
+            crear_consulta(fecha=date(2025, 1, 10), operador=Operador.objects.get(nombre='Vogel Gonzalo'))
+        version = version_datos()
+        with mock.patch('consultas.models.actualizar_resumen_diario', wraps=actualizar_resumen_diario) as actualizar:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.assertEqual(borrar_consultas_sinteticas(tamanio_lote=25), 60)
+        actualizar.assert_called_once()
+        self.assertEqual(len(callbacks), 2)
+        self.assertNotEqual(version_datos(), version)
+        self.assertEqual(Consulta.objects.count(), 2)
+        self.assertEqual(sum(ResumenDiario.objects.values_list('cantidad', flat=True)), 2)
+        self.assertFalse(ConsultaSustancia.objects.exists())
+        self.assertEqual(list(Operador.objects.values_list('nombre', flat=True)), ['Sistema', 'Vogel Gonzalo'])
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['op_vogel_gonzalo'])
+
+
+class ResumenInformesTests(TestCase):
+    """Verifica los desgloses del panel sobre un conjunto chico de consultas"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_consulta(tiempo_consumo='Menos de 1 año', tipo_sustancia='Alcohol, Cocaína')
+            crear_consulta(sexo='Hombre', tipo_sustancia='Alcohol')
+            crear_consulta(zona='Centro - Norte', consulta='Indirecta', ciudad='Funes')
+
+    def test_desgloses(self):
+        resumen = calcular_resumen(Consulta.objects.all())
+        self.assertEqual(resumen.total, 3)
+        self.assertEqual(resumen.zona, [('Sur', 2), ('Centro - Norte', 1)])
+        self.assertEqual(resumen.sexo, [('Mujer', 2), ('Hombre', 1)])
+        self.assertEqual(resumen.consulta, [('Directa', 2), ('Indirecta', 1)])
+        self.assertEqual(resumen.ciudad, [('Rosario', 2), ('Funes', 1)])
+        # Los vacíos no se grafican
+        self.assertEqual(resumen.tiempo_consumo, [('Menos de 1 año', 1)])
+        self.assertEqual(resumen.tratamiento_anterior, [])
+        self.assertEqual(resumen.operador, [('Sistema', 3)])
+        self.assertEqual(resumen.sustancias, [('Alcohol', 2), ('Cocaína', 1)])
+
+    def test_solo_las_dimensiones_pedidas(self):
+        resumen = calcular_resumen(Consulta.objects.filter(zona='Sur'), ['sexo'], False)
+        self.assertEqual(resumen.total, 2)
+        self.assertEqual(resumen.sexo, [('Hombre', 1), ('Mujer', 1)])
+        self.assertEqual((resumen.zona, resumen.sustancias), ([], []))
+
+    def test_situacion_social_cuenta_en_cada_categoria(self):
+        doble = crear_consulta(situacion_social='Violencia, Infancia')
+        crear_consulta(situacion_social='violencia')
+        bits = Consulta.SITUACION_SOCIAL_BITS
+        self.assertEqual(doble.situacion_social_flags, bits['Violencia'] | bits['Infancia'])
+
+        resumen = calcular_resumen(Consulta.objects.all(), ['situacion_social_flags'], False)
+        self.assertEqual(resumen.total, 5)
+        self.assertEqual(resumen.situacion_social, [('Violencia', 2), ('Infancia', 1)])
+
+    def test_filtro_situacion_social(self):
+        doble = crear_consulta(situacion_social='Violencia, Infancia')
+        simple = crear_consulta(situacion_social='Violencia')
+        for valor, esperadas in (('Infancia', {doble.pk}), ('Violencia', {doble.pk, simple.pk}), ('Judicializado', set()), ('Otra', set())):
+            with self.subTest(valor=valor):
+                filterset = ConsultaFilter({'situacion_social': valor}, queryset=Consulta.objects.all())
+                self.assertEqual(set(filterset.qs.values_list('pk', flat=True)), esperadas)
+
+
+class ResumenDiarioTests(TestCase):
+    """Verifica que los resúmenes diarios den los mismos desgloses que las consultas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generar_consultas(120, desde=date(2025, 1, 1), hasta=date(2025, 1, 10), semilla=3, tamanio_lote=50)
+        cls.consulta = Consulta.objects.order_by('pk').first()
+
+    def comparar(self, parametros, dimensiones, sustancias):
+        filterset = ConsultaFilter(parametros, queryset=Consulta.objects.all())
+        self.assertTrue(usa_resumen_diario(filterset, dimensiones, sustancias))
+        self.assertEqual(
+            calcular_resumen_diario(filterset, dimensiones, sustancias),
+            calcular_resumen(filterset.qs, dimensiones, sustancias),
+        )
+
+    def test_mismos_desgloses_que_las_consultas(self):
+        for parametros in ({}, {'fecha_desde': '2025-01-03', 'fecha_hasta': '2025-01-06'}):
+            with self.subTest(parametros=parametros):
+                self.comparar(parametros, DIMENSIONES, True)
+                self.comparar(parametros, [], False)
+        for parametros in ({'zona': self.consulta.zona}, {'operador': str(self.consulta.operador_id), 'fecha_desde': '2025-01-05'}):
+            with self.subTest(parametros=parametros):
+                self.comparar(parametros, ['zona', 'operador'], False)
+                self.comparar(parametros, [], False)
+
+    def test_filtros_fuera_del_resumen_usan_las_consultas(self):
+        filterset = ConsultaFilter({'zona': self.consulta.zona}, queryset=Consulta.objects.all())
+        self.assertFalse(usa_resumen_diario(filterset, ['sexo'], False))
+        self.assertFalse(usa_resumen_diario(filterset, [], True))
+        filterset = ConsultaFilter({'sexo': self.consulta.sexo}, queryset=Consulta.objects.all())
+        self.assertFalse(usa_resumen_diario(filterset, [], False))
+
+    def test_situacion_social_por_categoria(self):
+        filas = ResumenDiarioDimension.objects.filter(dimension='situacion_social').values_list('valor').annotate(Sum('cantidad'))
+        esperadas = calcular_resumen(Consulta.objects.all(), ['situacion_social_flags'], False).situacion_social
+        self.assertEqual(dict(filas), dict(esperadas))
+
+    def test_borrar_recalcula_cada_dia_una_vez_al_confirmar(self):
+        borradas = Consulta.objects.filter(fecha__lte=date(2025, 1, 4))
+        fechas = set(borradas.values_list('fecha', flat=True))
+        with mock.patch('consultas.models.actualizar_resumen_diario', wraps=actualizar_resumen_diario) as actualizar:
+            with self.captureOnCommitCallbacks(execute=True):
+                borradas.delete()
+        actualizar.assert_called_once_with(fechas)
+        self.assertFalse(ResumenDiario.objects.filter(fecha__lte=date(2025, 1, 4)).exists())
+        self.assertEqual(ResumenDiario.objects.aggregate(Sum('cantidad'))['cantidad__sum'], Consulta.objects.count())
+
+
+class EdadesTests(TestCase):
+    """Verifica la edad tipada derivada de los textos, el filtro por edad y los rangos"""
+
+    def test_edad_desde_textos(self):
+        self.assertEqual(crear_consulta(edad='40 años').edad_anios, 40)
+        self.assertEqual(crear_consulta(edad='8 meses').edad_anios, 0)
+        # Sin edad escrita se calcula con el nacimiento a la fecha de la consulta
+        consulta = crear_consulta(fecha_nacimiento='02/06/1990')
+        self.assertEqual((consulta.nacimiento, consulta.edad_anios), (date(1990, 6, 2), 34))
+        self.assertIsNone(crear_consulta(edad='sin dato').edad_anios)
+
+    def test_edad_con_anios_y_meses(self):
+        casos = {
+            '1 año y 8 meses': 1,
+            '2 anios 3 meses': 2,
+            'aprox. 40 años': 40,
+            '18 meses': 1,
+            '8 meses': 0,
+            '15 días': 0,
+            '40': 40,
+            '1234': None,
+        }
+        self.assertEqual(list(parsear_edades(list(casos))), [pd.NA if edad is None else edad for edad in casos.values()])
+        self.assertEqual({texto: parsear_edad(texto) for texto in casos}, casos)
+
+    def test_una_consulta_igual_que_un_lote(self):
+        filas = [
+            ('1 año y 8 meses', None, date(2025, 6, 1)),
+            (None, '02/06/1990', date(2025, 6, 1)),
+            (None, '1990-06-01 00:00', date(2025, 6, 1)),
+            ('200', '2026-01-01', date(2025, 6, 1)),
+            (None, '01/01/1850', date(2025, 6, 1)),
+        ]
+        nacimientos, edades = calcular_edades(*zip(*filas))
+        self.assertEqual([calcular_edad(*fila) for fila in filas], list(zip(nacimientos, edades)))
+
+    def test_completar_edades(self):
+        consulta = crear_consulta(edad='17')
+        Consulta.objects.filter(pk=consulta.pk).update(edad_anios=None)
+        self.assertEqual(completar_edades(), 1)
+        self.assertEqual(completar_edades(), 0)
+        consulta.refresh_from_db()
+        self.assertEqual(consulta.edad_anios, 17)
+
+    def test_filtro_y_rangos(self):
+        for edad in ['15', '17', '30', '72', None]:
+            crear_consulta(edad=edad)
+        filtradas = ConsultaFilter({'edad_desde': '16', 'edad_hasta': '30'}, queryset=Consulta.objects.all()).qs
+        self.assertEqual(filtradas.count(), 2)
+        self.assertEqual(
+            contar_rangos_edad(Consulta.objects.all()),
+            [('0-17', 2), ('25-34', 1), ('60 o más', 1), (SIN_EDAD, 1)],
+        )
+
+
+class SerieTemporalTests(TestCase):
+    """Verifica la tendencia sin huecos, su reagrupación automática y la carga por hora"""
+
+    def serie(self, periodo=None, **filtros):
+        return serie_temporal(ConsultaFilter(filtros, queryset=Consulta.objects.all()), periodo)
+
+    def test_completa_periodos_sin_consultas(self):
+        crear_consulta(fecha=date(2025, 1, 2))
+        crear_consulta(fecha=date(2025, 1, 2))
+        crear_consulta(fecha=date(2025, 1, 5))
+        self.assertEqual(self.serie('dia', fecha_desde='2025-01-01', fecha_hasta='2025-01-05'), ('dia', [
+            (date(2025, 1, 1), 0), (date(2025, 1, 2), 2), (date(2025, 1, 3), 0), (date(2025, 1, 4), 0), (date(2025, 1, 5), 1),
+        ]))
+        self.assertEqual(self.serie('mes', zona='Sur'), ('mes', [(date(2025, 1, 1), 3)]))
+
+    def test_periodo_automatico_reagrupa_rangos_largos(self):
+        crear_consulta(fecha=date(2024, 1, 1))
+        crear_consulta(fecha=date(2025, 6, 30))
+        periodo, serie = self.serie()
+        self.assertEqual(periodo, 'semana')
+        self.assertLessEqual(len(serie), MAX_PUNTOS_SERIE)
+        self.assertEqual(sum(cantidad for _, cantidad in serie), 2)
+
+    def test_periodo_pedido_respeta_el_tope(self):
+        crear_consulta(fecha=date(2024, 1, 1))
+        crear_consulta(fecha=date(2025, 6, 30))
+        self.assertEqual(len(self.serie('dia', fecha_desde='2025-06-01')[1]), 30)
+        periodo, serie = self.serie('dia', fecha_desde='2024-01-01', fecha_hasta='2025-06-30')
+        self.assertEqual((periodo, len(serie)), ('semana', 79))
+        # Un rango de siglos, ni por mes entra: se recorta a las fechas con consultas
+        periodo, serie = self.serie('dia', fecha_desde='1000-01-01', fecha_hasta='2999-12-31')
+        self.assertEqual((periodo, serie[0], serie[-1], len(serie)), ('semana', (date(2024, 1, 1), 1), (date(2025, 6, 30), 1), 79))
+
+    def test_carga_por_hora_semana(self):
+        consulta = crear_consulta(fecha=timezone.localdate())
+        matriz = carga_por_hora_semana(Consulta.objects.all())
+        hora = timezone.localtime(consulta.marca_temporal)
+        self.assertEqual(matriz[hora.isoweekday() - 1][hora.hour], 1)
+        self.assertEqual(sum(map(sum, matriz)), 1)
+
+    def test_carga_por_hora_semana_excluye_importadas(self):
+        crear_consulta(fecha=timezone.localdate() - timedelta(days=3))
+        self.assertEqual(sum(map(sum, carga_por_hora_semana(Consulta.objects.all()))), 0)
+        self.assertIn('no incluye las importadas', grafico_mapa_calor([[0] * 24] * 7)['layout']['title']['text'])
+
+
+class OperadoresTests(TestCase):
+    """Verifica el vínculo entre operadores y usuarios y el listado de mis consultas"""
+
+    def test_usuario_nuevo_se_vincula_a_su_operador(self):
+        operador = Operador.objects.create(nombre='Gómez Ana')
+        crear_consulta(operador=operador)
+        crear_consulta(operador=Operador.objects.create(nombre='Pérez Juan'))
+        usuario = User.objects.create_user('agomez', password='clave', first_name='Ana', last_name='Gómez')
+        operador.refresh_from_db()
+        self.assertEqual(operador.usuario, usuario)
+
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('mis_consultas'))
+        self.assertEqual(respuesta.context['total_consultas'], 1)
+
+    def test_ids_operadores_crea_y_vincula(self):
+        usuario = User.objects.create_user('jperez', first_name='Juan', last_name='Pérez')
+        ids = ids_operadores(['Pérez Juan', 'Sistema', 'Sistema'])
+        self.assertEqual(set(ids), {'Pérez Juan', 'Sistema'})
+        self.assertEqual(Operador.objects.get(usuario=usuario).pk, ids['Pérez Juan'])
+        self.assertEqual(ids_operadores(['Sistema']), {'Sistema': ids['Sistema']})
+
+    def test_operador_sin_nombre_no_se_grafica(self):
+        crear_consulta(operador=Operador.objects.create(nombre=''))
+        crear_consulta()
+        resumen = calcular_resumen(Consulta.objects.all())
+        self.assertEqual(resumen.total, 2)
+        self.assertEqual(resumen.operador, [('Sistema', 1)])
+
+    def test_consulta_cargada_por_el_usuario_queda_a_nombre_de_su_operador(self):
+        crear_consulta(operador=Operador.objects.create(nombre='Gómez Ana'))
+        usuario = User.objects.create_user('agomez', password='clave', first_name='Ana', last_name='Gómez')
+        cargada = crear_consulta(operador=Operador.objects.create(nombre='Pérez Juan'), creado_por=usuario)
+        crear_consulta(operador=Operador.objects.get(nombre='Pérez Juan'))
+        self.assertEqual(cargada.operador.nombre, 'Gómez Ana')
+
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('mis_consultas'))
+        self.assertEqual(respuesta.context['total_consultas'], 2)
+
+
+class ImportacionTests(TestCase):
+    """Verifica la reimportación por huella y el resumen diario de las filas actualizadas"""
+
+    def importar(self, filas, **opciones):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / 'consultas.csv'
+            with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+                escritor = csv.DictWriter(archivo, fieldnames=['FECHA', 'ZONA', 'OPERADOR', 'SEXO'])
+                escritor.writeheader()
+                escritor.writerows(filas)
+            return importar_csv(ruta, **opciones)
+
+    def test_reimportar_omite_filas_existentes(self):
+        filas = [
+            {'FECHA': '01/06/2025', 'ZONA': 'Norte', 'OPERADOR': 'Gómez Ana', 'SEXO': 'Mujer'},
+            {'FECHA': '02/06/2025', 'ZONA': 'Sur', 'OPERADOR': 'Pérez Juan', 'SEXO': 'Hombre'},
+        ]
+        self.assertEqual(self.importar(filas)['creadas'], 2)
+        resultado = self.importar(filas + [dict(filas[0], ZONA='Oeste')])
+        self.assertEqual((resultado['creadas'], resultado['omitidas']), (1, 2))
+        self.assertEqual(Consulta.objects.count(), 3)
+
+        resultado = self.importar(filas, actualizar=True)
+        self.assertEqual((resultado['creadas'], resultado['actualizadas']), (0, 2))
+        self.assertEqual(Consulta.objects.count(), 3)
+        self.assertEqual(ResumenDiario.objects.filter(fecha=date(2025, 6, 1)).aggregate(Sum('cantidad'))['cantidad__sum'], 2)
+
+    def test_actualizar_fila_con_fecha_invalida_mueve_el_resumen(self):
+        filas = [{'FECHA': 'sin fecha', 'ZONA': 'Norte', 'OPERADOR': 'Gómez Ana', 'SEXO': 'Mujer'}]
+        self.importar(filas)
+        # La fila se importó otro día: quedó guardada con esa fecha
+        ayer = date.today() - timedelta(days=1)
+        Consulta.objects.update(fecha=ayer)
+        actualizar_resumen_diario({ayer, date.today()})
+
+        self.assertEqual(self.importar(filas, actualizar=True)['actualizadas'], 1)
+        self.assertEqual(Consulta.objects.get().fecha, date.today())
+        self.assertFalse(ResumenDiario.objects.filter(fecha=ayer).exists())
+        self.assertEqual(ResumenDiario.objects.get(fecha=date.today()).cantidad, 1)
+
+
+class HuellaLegadaTests(TransactionTestCase):
+    """Verifica que la huella calculada por la migración 0012 coincida con la del importador actual"""
+
+    desde = [('consultas', '0011_huella')]
+
+    def test_reimportar_fila_del_importador_anterior(self):
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate(self.desde)
+        ConsultaAnterior = ejecutor.loader.project_state(self.desde).apps.get_model('consultas', 'Consulta')
+        # Como la guardaba el importador anterior: columnas numéricas leídas como float y
+        # la FECHA ilegible reemplazada por el día de la importación
+        ConsultaAnterior.objects.create(
+            fecha=date.today(), zona='Norte', operador='Gómez Ana', apellido_nombre_interlocutor='No especificado',
+            consulta='Directa', motivo_consulta='Sin especificar', apellido_nombre_usuario='No especificado',
+            dni='30123456.0', edad='34.0', telefono='3415551234.0', sexo='Mujer', nacionalidad='Argentina',
+            ciudad='No especificada',
+        )
+
+        ejecutor = MigrationExecutor(connection)
+        ejecutor.migrate(ejecutor.loader.graph.leaf_nodes('consultas'))
+
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / 'consultas.csv'
+            ruta.write_text(
+                'FECHA,ZONA,OPERADOR,DNI,EDAD,TELEFONO,SEXO\n'
+                'sin fecha,Norte,Gómez Ana,30123456,34,3415551234,Mujer\n'
+                '01/06/2025,Sur,Gómez Ana,,,,Hombre\n',
+                encoding='utf-8',
+            )
+            resultado = importar_csv(ruta)
+        self.assertEqual((resultado['creadas'], resultado['omitidas']), (1, 1))
+        self.assertEqual(Consulta.objects.count(), 2)
+
+
+class PaginacionCursorTests(TestCase):
+    """Verifica que los cursores recorren el listado sin repetir ni saltear filas, también con empates"""
+
+    def setUp(self):
+        # Empates en fecha y marca temporal: solo el id desempata
+        for dia in (1, 1, 1, 2, 2):
+            crear_consulta(fecha=date(2025, 6, dia))
+        Consulta.objects.update(marca_temporal=timezone.now())
+        self.orden = list(Consulta.objects.order_by('-fecha', '-marca_temporal', '-id').values_list('id', flat=True))
+
+    def paginador(self):
+        return PaginadorCursor(Consulta.objects.order_by('-fecha', '-marca_temporal'), 2, contar=True)
+
+    def test_siguiente_y_anterior(self):
+        paginas = [self.paginador().get_page()]
+        while paginas[-1].has_next:
+            paginas.append(self.paginador().get_page(paginas[-1].cursor_siguiente))
+        self.assertEqual([consulta.id for pagina in paginas for consulta in pagina], self.orden)
+        self.assertEqual([len(pagina) for pagina in paginas], [2, 2, 1])
+        self.assertFalse(paginas[0].has_previous)
+        self.assertEqual(paginas[0].total, 5)
+
+        anterior = self.paginador().get_page(paginas[2].cursor_anterior)
+        self.assertEqual([consulta.id for consulta in anterior], [consulta.id for consulta in paginas[1]])
+        primera = self.paginador().get_page(anterior.cursor_anterior)
+        self.assertEqual([consulta.id for consulta in primera], self.orden[:2])
+        self.assertFalse(primera.has_previous)
+        self.assertTrue(primera.has_next)
+
+    def test_cursor_invalido_vuelve_al_principio(self):
+        pagina = self.paginador().get_page('no-es-un-cursor')
+        self.assertEqual([consulta.id for consulta in pagina], self.orden[:2])
+
+    def test_cursor_con_rango_invalido_vuelve_al_principio(self):
+        paginador = PaginadorCursor(buscar(Consulta.objects.all(), 'rosario'), 2)
+        primera = paginador.get_page()
+        self.assertEqual(len(paginador.get_page(primera.cursor_siguiente)), 2)
+
+        # El rango de la búsqueda se valida como número, igual que fecha e id según su campo
+        direccion, valores = json.loads(base64.urlsafe_b64decode(primera.cursor_siguiente + '=' * (-len(primera.cursor_siguiente) % 4)))
+        for rango in ('1) OR 1=1 --', [1], {'a': 1}):
+            cursor = base64.urlsafe_b64encode(json.dumps([direccion, [rango] + valores[1:]]).encode()).decode().rstrip('=')
+            pagina = paginador.get_page(cursor)
+            self.assertEqual([consulta.id for consulta in pagina], [consulta.id for consulta in primera])
+
+
+class CacheDatosTests(TestCase):
+    """Verifica la caché de datos, que se invalida al confirmar el guardado, y la LRU de gráficos"""
+
+    def test_invalida_al_confirmar(self):
+        version = version_datos()
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_consulta(tipo_sustancia='Alcohol')
+            self.assertEqual(version_datos(), version)
+        self.assertNotEqual(version_datos(), version)
+        self.assertEqual(ConsultaSustancia.objects.filter(sustancia__nombre='Alcohol').count(), 1)
+
+    def test_opciones_del_formulario_cacheadas_hasta_guardar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_consulta(tipo_vinculo='Madre', tipo_sustancia='Alcohol')
+        ConsultaForm()
+        # Con la versión vigente las opciones salen de la caché, sin consultas SQL
+        with self.assertNumQueries(0):
+            form = ConsultaForm()
+        self.assertIn(('Madre', 'Madre'), form.fields['tipo_vinculo'].choices)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_consulta(tipo_vinculo='Tía', tipo_sustancia='Cocaína')
+        form = ConsultaForm()
+        self.assertIn(('Tía', 'Tía'), form.fields['tipo_vinculo'].choices)
+        self.assertIn(('Cocaína', 'Cocaína'), form.fields['tipo_sustancia'].choices)
+
+    def test_invalidaciones_seguidas_no_repiten_version(self):
+        versiones = {version_datos()}
+        for _ in range(3):
+            invalidar_datos()
+            versiones.add(version_datos())
+        self.assertEqual(len(versiones), 4)
+
+    def test_lru_desaloja_la_menos_usada(self):
+        lru = CacheLRU(max_entradas=2, timeout=60)
+        lru.obtener('a', lambda: 1)
+        lru.obtener('b', lambda: 2)
+        # Usar 'a' la deja como la más reciente; al entrar 'c' sale 'b'
+        lru.obtener('a', lambda: 0)
+        lru.obtener('c', lambda: 3)
+        self.assertEqual(list(lru.entradas), ['a', 'c'])
+        self.assertEqual(lru.obtener('a', lambda: 0), 1)
+        self.assertEqual(lru.obtener('b', lambda: 20), 20)
+        self.assertEqual(lru.estadisticas()['desalojos'], 2)
+
+    def test_lru_vence_por_tiempo(self):
+        lru = CacheLRU(max_entradas=2, timeout=60)
+        with mock.patch('consultas.cache.time.monotonic', return_value=1000):
+            self.assertEqual(lru.obtener('a', lambda: 1), 1)
+        with mock.patch('consultas.cache.time.monotonic', return_value=1059):
+            self.assertEqual(lru.obtener('a', lambda: 2), 1)
+        with mock.patch('consultas.cache.time.monotonic', return_value=1060):
+            self.assertEqual(lru.obtener('a', lambda: 3), 3)
+        self.assertEqual((lru.aciertos, lru.fallos), (1, 2))
+
+    def filtro(self, consulta):
+        filterset = ConsultaFilter(QueryDict(consulta), queryset=Consulta.objects.all())
+        filterset.is_valid()
+        return filterset
+
+    def test_clave_de_graficos_normalizada(self):
+        clave = datos_filtros(self.filtro('zona=Sur&sexo=Mujer'))
+        self.assertEqual(datos_filtros(self.filtro('sexo=Mujer&zona=Sur')), clave)
+        # Los filtros vacíos no cambian la clave; un valor distinto sí
+        self.assertEqual(datos_filtros(self.filtro('sexo=Mujer&zona=Sur&ciudad=')), clave)
+        self.assertNotEqual(datos_filtros(self.filtro('sexo=Varón&zona=Sur')), clave)
+
+    def test_grafico_se_recalcula_con_version_nueva(self):
+        crear_consulta()
+        CACHE_GRAFICOS.limpiar()
+        filterset = self.filtro('sexo=Mujer&zona=Sur')
+        primero = grafico_informes(filterset, 'sexo')
+        fallos = CACHE_GRAFICOS.fallos
+        self.assertEqual(grafico_informes(self.filtro('zona=Sur&sexo=Mujer'), 'sexo'), primero)
+        self.assertEqual(CACHE_GRAFICOS.fallos, fallos)
+
+        invalidar_datos()
+        grafico_informes(filterset, 'sexo')
+        self.assertEqual(CACHE_GRAFICOS.fallos, fallos + 1)
+
+
+class GraficosInformesTests(TestCase):
+    """Verifica el endpoint JSON de cada gráfico del panel de informes"""
+
+    def setUp(self):
+        crear_consulta()
+        crear_consulta(sexo='Hombre')
+        crear_consulta(zona='Centro - Norte', sexo='Hombre')
+        # La caché de gráficos es del proceso y sobrevive entre pruebas
+        CACHE_GRAFICOS.limpiar()
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+    def pedir(self, nombre, **parametros):
+        return self.client.get(reverse('grafico_informes', args=[nombre]), parametros)
+
+    def test_forma_de_la_respuesta(self):
+        respuesta = self.pedir('sexo')
+        self.assertEqual(respuesta.status_code, 200)
+        grafico = respuesta.json()['grafico']
+        self.assertEqual(grafico['layout']['title']['text'], 'Consultas por Sexo')
+        self.assertEqual(len(grafico['data']), 1)
+        self.assertEqual(grafico['data'][0]['type'], 'bar')
+        self.assertEqual((grafico['data'][0]['x'], grafico['data'][0]['y']), (['Hombre', 'Mujer'], [2, 1]))
+
+    def test_aplica_los_filtros(self):
+        traza = self.pedir('sexo', zona='Sur').json()['grafico']['data'][0]
+        self.assertEqual((traza['x'], traza['y']), (['Hombre', 'Mujer'], [1, 1]))
+        traza = self.pedir('zona', sexo='Mujer').json()['grafico']['data'][0]
+        self.assertEqual((traza['labels'], traza['values']), (['Sur'], [1]))
+
+    def test_grafico_inexistente(self):
+        self.assertEqual(self.pedir('no-existe').status_code, 404)
+
+    def test_solo_administradores(self):
+        self.client.force_login(User.objects.create_user('operador'))
+        respuesta = self.pedir('sexo')
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertTrue(respuesta.url.startswith(reverse('login')))
+
+
+class ExportacionTests(TestCase):
+    """Verifica que cada formato de exportación se vuelve a leer con las mismas filas"""
+
+    def setUp(self):
+        self.consultas = [
+            crear_consulta(fecha=date(2025, 6, 1), apellido_nombre_usuario='Núñez Ramón', edad=30),
+            crear_consulta(fecha=date(2025, 6, 2), apellido_nombre_usuario='Gómez, "Ana"', motivo_consulta='Línea 1\nLínea 2'),
+        ]
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+
+    def exportar(self, formato):
+        ruta = Path(self.directorio.name) / f'consultas.{FORMATOS_EXPORTACION[formato][0]}'
+        self.assertEqual(exportar_archivo(Consulta.objects.order_by('id'), ruta, formato), 2)
+        return ruta
+
+    def verificar(self, filas):
+        encabezados = [encabezado for encabezado, _ in COLUMNAS_EXPORTACION]
+        self.assertEqual(list(filas[0]), encabezados)
+        columnas = [dict(zip(encabezados, fila)) for fila in filas[1:]]
+        self.assertEqual([fila['ID'] for fila in columnas], [consulta.id for consulta in self.consultas])
+        self.assertEqual(columnas[0]['Usuario'], 'Núñez Ramón')
+        self.assertEqual(columnas[1]['Usuario'], 'Gómez, "Ana"')
+        self.assertEqual(columnas[1]['Motivo'], 'Línea 1\nLínea 2')
+        self.assertEqual(columnas[0]['Operador'], 'Sistema')
+        return columnas
+
+    def test_csv(self):
+        with open(self.exportar('csv'), encoding='utf-8-sig', newline='') as archivo:
+            filas = list(csv.reader(archivo))
+        columnas = self.verificar([filas[0]] + [[int(fila[0])] + fila[1:] for fila in filas[1:]])
+        self.assertEqual(columnas[0]['Fecha'], '2025-06-01')
+
+    def test_descarga_csv_por_bloques(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        respuesta = self.client.get(reverse('exportar_datos'), {'zona': 'Sur'})
+        self.assertTrue(respuesta.streaming)
+        texto = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        filas = list(csv.reader(texto.splitlines(keepends=True)))
+        # El listado va de la más reciente a la más antigua
+        self.verificar([filas[0]] + sorted([int(fila[0])] + fila[1:] for fila in filas[1:]))
+
+    @skipUnless(find_spec('pyarrow'), 'pyarrow no está instalado')
+    def test_parquet_y_arrow(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for tabla in (pq.read_table(self.exportar('parquet')), pa.ipc.open_stream(self.exportar('arrow').read_bytes()).read_all()):
+            filas = [tabla.column_names] + [list(fila.values()) for fila in tabla.to_pylist()]
+            columnas = self.verificar(filas)
+            self.assertEqual(columnas[0]['Fecha'], date(2025, 6, 1))
+
+    @skipUnless(find_spec('openpyxl'), 'openpyxl no está instalado')
+    def test_xlsx(self):
+        import openpyxl
+
+        libro = openpyxl.load_workbook(self.exportar('xlsx'), read_only=True)
+        filas = list(libro['Consultas'].iter_rows(values_only=True))
+        libro.close()
+        columnas = self.verificar(filas)
+        self.assertEqual(columnas[0]['Fecha'].date(), date(2025, 6, 1))
+
+    @skipUnless(find_spec('openpyxl'), 'openpyxl no está instalado')
+    def test_descarga_xlsx(self):
+        import openpyxl
+
+        temporales = []
+        crear = tempfile.NamedTemporaryFile
+
+        def crear_temporal(*args, **kwargs):
+            temporales.append(crear(*args, **kwargs))
+            return temporales[-1]
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        with mock.patch('consultas.views.tempfile.NamedTemporaryFile', crear_temporal):
+            respuesta = self.client.get(reverse('exportar_datos'), {'formato': 'xlsx', 'zona': 'Sur'})
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="consultas_0800.xlsx"')
+        libro = openpyxl.load_workbook(io.BytesIO(b''.join(respuesta.streaming_content)), read_only=True)
+        filas = list(libro['Consultas'].iter_rows(values_only=True))
+        libro.close()
+        self.verificar([filas[0]] + sorted(filas[1:]))
+        # El archivo temporal se borra al cerrar la respuesta
+        respuesta.close()
+        self.assertFalse(Path(temporales[0].name).exists())
+
+
+class TareasTests(TestCase):
+    """Verifica que una tarea se toma una sola vez y guarda su progreso y su resultado"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = override_settings(TAREAS_DIR=Path(directorio.name))
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def test_toma_y_progreso_de_exportacion(self):
+        for _ in range(3):
+            crear_consulta()
+        primera = encolar(Tarea.EXPORTACION, {'filtros': 'zona=Sur', 'formato': 'csv'})
+        segunda = encolar(Tarea.EXPORTACION, {'filtros': 'zona=Norte', 'formato': 'csv'})
+
+        tarea = tomar_siguiente()
+        self.assertEqual(tarea.pk, primera.pk)
+        self.assertEqual(tarea.estado, Tarea.EN_CURSO)
+        self.assertEqual(tomar_siguiente().pk, segunda.pk)
+        self.assertIsNone(tomar_siguiente())
+
+        self.assertTrue(ejecutar(tarea))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, Tarea.COMPLETADA)
+        self.assertEqual((tarea.procesadas, tarea.total), (3, 3))
+        self.assertEqual(tarea.resultado, {'filas': 3})
+        self.assertEqual(len(Path(tarea.archivo).read_text(encoding='utf-8-sig').splitlines()), 4)
+
+    def test_error_queda_registrado(self):
+        tarea = encolar(Tarea.IMPORTACION, {'archivo': '/no/existe.csv'})
+        self.assertFalse(ejecutar(tomar_siguiente()))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, Tarea.ERROR)
+        self.assertIn('FileNotFoundError', tarea.error)
+
+    def test_marca_interrumpidas_solo_sin_latido_reciente(self):
+        activa, detenida, anterior = (encolar(Tarea.EXPORTACION, {}) for _ in range(3))
+        ahora = timezone.now()
+        Tarea.objects.update(estado=Tarea.EN_CURSO, fecha_inicio=ahora - timedelta(hours=1))
+        Tarea.objects.filter(pk=activa.pk).update(fecha_latido=ahora - timedelta(minutes=1))
+        Tarea.objects.filter(pk=detenida.pk).update(fecha_latido=ahora - INACTIVIDAD_MAXIMA - timedelta(minutes=1))
+
+        self.assertEqual(marcar_interrumpidas(), 2)
+        estados = dict(Tarea.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados, {activa.pk: Tarea.EN_CURSO, detenida.pk: Tarea.ERROR, anterior.pk: Tarea.ERROR})
+
+    def test_importacion_subida_desde_la_aplicacion(self):
+        archivo = SimpleUploadedFile('consultas.csv', 'FECHA,ZONA,OPERADOR,SEXO\n01/06/2025,Norte,Gómez Ana,Mujer\n'.encode('utf-8'))
+        self.client.force_login(User.objects.create_user('operador'))
+        self.assertEqual(self.client.post(reverse('importar_en_segundo_plano'), {'archivo': archivo}).status_code, 302)
+        self.assertFalse(Tarea.objects.exists())
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertContains(self.client.get(reverse('importar_en_segundo_plano')), 'enctype="multipart/form-data"')
+        archivo.seek(0)
+        respuesta = self.client.post(reverse('importar_en_segundo_plano'), {'archivo': archivo})
+        tarea = Tarea.objects.get()
+        self.assertRedirects(respuesta, reverse('detalle_tarea', args=[tarea.pk]), fetch_redirect_response=False)
+        self.assertEqual((tarea.tipo, tarea.creado_por.username), (Tarea.IMPORTACION, 'admin'))
+
+        self.assertTrue(ejecutar(tomar_siguiente()))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.resultado['creadas'], 1)
+        self.assertEqual(Consulta.objects.get().zona, 'Norte')
+
+    def test_limpia_tareas_vencidas_y_sus_archivos(self):
+        crear_consulta()
+        vieja, reciente = (encolar(Tarea.EXPORTACION, {'formato': 'csv'}) for _ in range(2))
+        for tarea in (tomar_siguiente(), tomar_siguiente()):
+            ejecutar(tarea)
+        en_curso = encolar(Tarea.EXPORTACION, {})
+        Tarea.objects.filter(pk=en_curso.pk).update(estado=Tarea.EN_CURSO)
+        Tarea.objects.exclude(pk=reciente.pk).update(fecha_fin=timezone.now() - timedelta(days=8))
+        vieja.refresh_from_db()
+
+        self.assertEqual(limpiar_vencidas(timedelta(days=7)), 1)
+        self.assertFalse(Path(vieja.archivo).exists())
+        self.assertEqual(set(Tarea.objects.values_list('pk', flat=True)), {reciente.pk, en_curso.pk})
+        self.assertTrue(Path(Tarea.objects.get(pk=reciente.pk).archivo).exists())
+
+
+class MetricasTests(TestCase):
+    """Verifica que el middleware cuenta requests, errores y consultas SQL por vista"""
+
+    def setUp(self):
+        REGISTRO.limpiar()
+        self.addCleanup(REGISTRO.limpiar)
+
+    def test_cuenta_por_vista(self):
+        self.client.force_login(User.objects.create_user('agomez'))
+        self.client.get(reverse('mis_consultas'))
+        self.client.get(reverse('mis_consultas'), {'q': 'perez'})
+        self.client.get('/no-existe/')
+
+        metricas = REGISTRO.vistas['mis_consultas']
+        self.assertEqual((metricas.requests, metricas.errores), (2, 0))
+        self.assertGreater(metricas.consultas_sql, 0)
+        self.assertEqual(metricas.consultas_sql, sum(metricas.consultas_por_request))
+        self.assertEqual(REGISTRO.vistas[SIN_RUTA].requests, 1)
+        self.assertEqual([fila['vista'] for fila in REGISTRO.resumen()].count('mis_consultas'), 1)
+
+
+class BusquedaTests(TestCase):
+    """Verifica la búsqueda sin acentos, por prefijo y sobre la narrativa editada"""
+
+    def ids(self, texto, ordenar=False):
+        return set(buscar(Consulta.objects.all(), texto, ordenar=ordenar).values_list('id', flat=True))
+
+    def test_acentos_y_prefijos(self):
+        consulta = crear_consulta(apellido_nombre_usuario='Núñez Ramón')
+        crear_consulta(apellido_nombre_usuario='Gómez Ana')
+        for ordenar in (False, True):
+            self.assertEqual(self.ids('nunez', ordenar), {consulta.id})
+            self.assertEqual(self.ids('RAM núñ', ordenar), {consulta.id})
+            self.assertEqual(self.ids('ramona', ordenar), set())
+
+    def test_orden_por_relevancia(self):
+        una = crear_consulta(apellido_nombre_usuario='Pérez', barrio='Centro')
+        dos = crear_consulta(apellido_nombre_usuario='Pérez Pérez', barrio='Pérez')
+        consultas = list(buscar(Consulta.objects.all(), 'perez'))
+        self.assertEqual([consulta.id for consulta in consultas], [dos.id, una.id])
+        self.assertLess(consultas[0].rango, consultas[1].rango)
+
+    def test_edicion_de_la_narrativa(self):
+        consulta = crear_consulta(motivo_consulta='Dolor de cabeza')
+        self.assertEqual(self.ids('cabeza'), {consulta.id})
+
+        consulta.motivo_consulta = 'Consumo de alcohol'
+        consulta.save()
+        self.assertEqual(self.ids('alcohol'), {consulta.id})
+        self.assertEqual(self.ids('cabeza'), set())
+
+        ConsultaNarrativa.objects.filter(consulta=consulta).update(intervencion_propuesta='Derivación al CAPS')
+        self.assertEqual(self.ids('derivacion caps'), {consulta.id})
+
+        ConsultaNarrativa.objects.filter(consulta=consulta).delete()
+        self.assertEqual(self.ids('alcohol'), set())
+        self.assertEqual(self.ids('rosario'), {consulta.id})
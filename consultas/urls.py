@@ -9,6 +9,14 @@ urlpatterns = [
     path('cargar/', views.cargar_consulta, name='cargar_consulta'),
     path('mis-consultas/', views.mis_consultas, name='mis_consultas'),
     path('informes/', views.informes, name='informes'),
+    path('informes/graficos/<str:nombre>/', views.grafico_informes_json, name='grafico_informes'),
     path('consulta/<int:pk>/', views.detalle_consulta, name='detalle_consulta'),
     path('exportar/', views.exportar_datos, name='exportar_datos'),
+    path('exportar/segundo-plano/', views.exportar_en_segundo_plano, name='exportar_en_segundo_plano'),
+    path('importar/', views.importar_en_segundo_plano, name='importar_en_segundo_plano'),
+    path('tareas/<int:pk>/', views.detalle_tarea, name='detalle_tarea'),
+    path('tareas/<int:pk>/estado/', views.estado_tarea, name='estado_tarea'),
+    path('tareas/<int:pk>/descargar/', views.descargar_tarea, name='descargar_tarea'),
+    path('metricas/', views.metricas, name='metricas'),
+    path('metricas/prometheus/', views.metricas_prometheus, name='metricas_prometheus'),
 ]
@@ -1,18 +1,25 @@
+import hmac
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Q
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-import json
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.utils import PlotlyJSONEncoder
-
-from .models import Consulta
-from .forms import ConsultaForm, CustomUserCreationForm
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from .models import Consulta, Operador, Sustancia, Tarea
+from .forms import ConsultaForm, CustomUserCreationForm, ImportacionForm
 from .filters import ConsultaFilter
+from .graficos import CACHE_GRAFICOS, GRAFICOS, grafico_informes, total_informes
+from .exportacion import FORMATOS_EXPORTACION, FormatoNoDisponible, escribir_xlsx, verificar_formato
+from .busqueda import buscar
+from .paginacion import PaginadorCursor
+from .tareas import encolar, encolar_importacion
+from .metricas import PERCENTILES, REGISTRO, texto_prometheus
 
 
 def is_admin(user):
@@ -86,43 +93,24 @@ def cargar_consulta(request):
 @login_required
 def mis_consultas(request):
     """Listado de consultas cargadas por el operador actual"""
-    # Obtener nombre del operador actual
-    nombre_operador = f"{request.user.last_name} {request.user.first_name}".strip()
-    
-    # Filtrar consultas por el operador actual (por nombre o por creado_por)
-    consultas = Consulta.objects.filter(
-        Q(operador=nombre_operador) | Q(creado_por=request.user)
-    ).distinct()
+    # Consultas del operador vinculado al usuario: una igualdad sobre
+    # consulta_operador_orden_idx, que también da el orden. Las cargadas por el
+    # usuario quedan a nombre de su operador al guardarse (Consulta.save)
+    operador = getattr(request.user, 'operador', None)
+    consultas = Consulta.objects.filter(operador=operador).order_by('-fecha', '-marca_temporal') if operador else Consulta.objects.none()
     
-    # Búsqueda general
+    # Búsqueda general (índice de texto completo, resultados por relevancia)
     busqueda = request.GET.get('q', '').strip()
     if busqueda:
-        consultas = consultas.filter(
-            Q(apellido_nombre_usuario__icontains=busqueda) |
-            Q(apellido_nombre_interlocutor__icontains=busqueda) |
-            Q(dni__icontains=busqueda) |
-            Q(ciudad__icontains=busqueda) |
-            Q(barrio__icontains=busqueda) |
-            Q(telefono__icontains=busqueda) |
-            Q(telefono_interlocutor__icontains=busqueda) |
-            Q(motivo_consulta__icontains=busqueda) |
-            Q(tipo_sustancia__icontains=busqueda) |
-            Q(intervencion_propuesta__icontains=busqueda) |
-            Q(zona__icontains=busqueda) |
-            Q(consulta__icontains=busqueda)
-        )
+        consultas = buscar(consultas, busqueda)
     
-    consultas = consultas.order_by('-fecha', '-marca_temporal')
-    
-    # Paginación
-    paginator = Paginator(consultas, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor, con un total acotado; solo las columnas de la tabla
+    page_obj = PaginadorCursor(consultas.listado_operador(), 20, contar=True).get_page(request.GET.get('cursor'))
     
     return render(request, 'consultas/mis_consultas.html', {
         'page_obj': page_obj,
-        'total_consultas': consultas.count(),
-        'nombre_operador': nombre_operador,
+        'total_consultas': page_obj.total,
+        'operador': operador,
         'busqueda': busqueda,
     })
 
@@ -134,133 +122,47 @@ def informes(request):
     filterset = ConsultaFilter(request.GET, queryset=Consulta.objects.all())
     consultas = filterset.qs
     
-    # Paginación
-    paginator = Paginator(consultas, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Estadísticas generales
-    total_consultas = consultas.count()
+    # Solo el total: los gráficos los pide la página a grafico_informes después de mostrarse
+    total_consultas = total_informes(filterset)
     
-    # Datos para gráficos
-    graficos = {}
+    # Paginación por cursor (el total ya lo da el resumen); solo las columnas de la tabla
+    page_obj = PaginadorCursor(consultas.listado_informes(), 20, total=total_consultas).get_page(request.GET.get('cursor'))
     
-    if total_consultas > 0:
-        # Gráfico de consultas por zona
-        zona_data = list(consultas.values('zona').annotate(count=Count('id')).order_by('-count'))
-        if zona_data:
-            labels = [d['zona'] or 'Sin zona' for d in zona_data]
-            values = [d['count'] for d in zona_data]
-            fig_zona = go.Figure(data=[go.Pie(labels=labels, values=values, hole=0.4)])
-            fig_zona.update_layout(title='Consultas por Zona', margin=dict(l=20, r=20, t=40, b=20))
-            graficos['zona'] = json.dumps(fig_zona, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de consultas por sexo
-        sexo_data = list(consultas.exclude(sexo__isnull=True).exclude(sexo='').values('sexo').annotate(count=Count('id')).order_by('-count'))
-        if sexo_data:
-            x_vals = [d['sexo'] for d in sexo_data]
-            y_vals = [d['count'] for d in sexo_data]
-            fig_sexo = go.Figure(data=[go.Bar(x=x_vals, y=y_vals, marker_color='#4e73df')])
-            fig_sexo.update_layout(title='Consultas por Sexo', xaxis_title='Sexo', yaxis_title='Cantidad', margin=dict(l=20, r=20, t=40, b=20))
-            graficos['sexo'] = json.dumps(fig_sexo, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de tiempo de consumo
-        tiempo_data = list(consultas.exclude(tiempo_consumo__isnull=True).exclude(tiempo_consumo='').values('tiempo_consumo').annotate(count=Count('id')).order_by('-count'))
-        if tiempo_data:
-            x_vals = [d['tiempo_consumo'] for d in tiempo_data]
-            y_vals = [d['count'] for d in tiempo_data]
-            fig_tiempo = go.Figure(data=[go.Bar(x=x_vals, y=y_vals, marker_color='#36b9cc')])
-            fig_tiempo.update_layout(title='Tiempo de Consumo', xaxis_title='Tiempo', yaxis_title='Cantidad', margin=dict(l=20, r=20, t=40, b=20))
-            graficos['tiempo_consumo'] = json.dumps(fig_tiempo, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de tipo de consulta
-        consulta_data = list(consultas.values('consulta').annotate(count=Count('id')).order_by('-count'))
-        if consulta_data:
-            labels = [d['consulta'] or 'Sin especificar' for d in consulta_data]
-            values = [d['count'] for d in consulta_data]
-            fig_consulta = go.Figure(data=[go.Pie(labels=labels, values=values)])
-            fig_consulta.update_layout(title='Tipo de Consulta (Directa/Indirecta)', margin=dict(l=20, r=20, t=40, b=20))
-            graficos['consulta'] = json.dumps(fig_consulta, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de tratamiento anterior
-        trat_data = list(consultas.exclude(tratamiento_anterior__isnull=True).exclude(tratamiento_anterior='').values('tratamiento_anterior').annotate(count=Count('id')).order_by('-count'))
-        if trat_data:
-            labels = ['Sí' if d['tratamiento_anterior'] == 'SI' else 'No' for d in trat_data]
-            values = [d['count'] for d in trat_data]
-            fig_trat = go.Figure(data=[go.Pie(labels=labels, values=values)])
-            fig_trat.update_layout(title='¿Tuvo Tratamiento Anterior?', margin=dict(l=20, r=20, t=40, b=20))
-            graficos['tratamiento'] = json.dumps(fig_trat, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de consultas por ciudad (top 10)
-        ciudad_data = list(consultas.exclude(ciudad__isnull=True).exclude(ciudad='').values('ciudad').annotate(count=Count('id')).order_by('-count')[:10])
-        if ciudad_data:
-            x_vals = [d['ciudad'] for d in ciudad_data]
-            y_vals = [d['count'] for d in ciudad_data]
-            fig_ciudad = go.Figure(data=[go.Bar(x=x_vals, y=y_vals, marker_color='#4e73df')])
-            fig_ciudad.update_layout(title='Top 10 Ciudades con más Consultas', xaxis_title='Ciudad', yaxis_title='Cantidad', margin=dict(l=20, r=20, t=40, b=20), xaxis_tickangle=-45)
-            graficos['ciudad'] = json.dumps(fig_ciudad, cls=PlotlyJSONEncoder)
-        
-        # Análisis de sustancias
-        sustancias_count = {}
-        for consulta_obj in consultas.exclude(tipo_sustancia__isnull=True).exclude(tipo_sustancia=''):
-            if consulta_obj.tipo_sustancia:
-                for sustancia in consulta_obj.tipo_sustancia.replace(', ', ',').split(','):
-                    sustancia = sustancia.strip()
-                    if sustancia:
-                        sustancias_count[sustancia] = sustancias_count.get(sustancia, 0) + 1
-        
-        if sustancias_count:
-            sorted_sustancias = sorted(sustancias_count.items(), key=lambda x: x[1], reverse=True)[:10]
-            x_vals = [s[0] for s in sorted_sustancias]
-            y_vals = [s[1] for s in sorted_sustancias]
-            fig_sustancias = go.Figure(data=[go.Bar(x=x_vals, y=y_vals, marker_color='#f6c23e')])
-            fig_sustancias.update_layout(title='Sustancias más Reportadas', xaxis_title='Sustancia', yaxis_title='Menciones', margin=dict(l=20, r=20, t=40, b=20), xaxis_tickangle=-45)
-            graficos['sustancias'] = json.dumps(fig_sustancias, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de situación social
-        sit_social_data = list(consultas.exclude(situacion_social__isnull=True).exclude(situacion_social='').values('situacion_social').annotate(count=Count('id')).order_by('-count'))
-        if sit_social_data:
-            labels = [d['situacion_social'] for d in sit_social_data]
-            values = [d['count'] for d in sit_social_data]
-            fig_social = go.Figure(data=[go.Pie(labels=labels, values=values)])
-            fig_social.update_layout(title='Situación Social', margin=dict(l=20, r=20, t=40, b=20))
-            graficos['situacion_social'] = json.dumps(fig_social, cls=PlotlyJSONEncoder)
-        
-        # Gráfico de consultas por operador
-        operador_data = list(consultas.exclude(operador__isnull=True).exclude(operador='').values('operador').annotate(count=Count('id')).order_by('-count'))
-        if operador_data:
-            x_vals = [d['operador'] for d in operador_data]
-            y_vals = [d['count'] for d in operador_data]
-            fig_operador = go.Figure(data=[go.Bar(x=x_vals, y=y_vals, marker_color='#6f42c1')])
-            fig_operador.update_layout(title='Consultas por Operador', xaxis_title='Operador', yaxis_title='Cantidad', margin=dict(l=20, r=20, t=40, b=20), xaxis_tickangle=-45)
-            graficos['operador'] = json.dumps(fig_operador, cls=PlotlyJSONEncoder)
+    # Operadores para el filtro, desde su tabla
+    operadores = Operador.objects.exclude(nombre='').order_by('nombre').values_list('pk', 'nombre')
     
-    # Obtener lista de operadores únicos para el filtro
-    operadores = Consulta.objects.exclude(
-        operador__isnull=True
-    ).exclude(
-        operador=''
-    ).values_list('operador', flat=True).distinct().order_by('operador')
+    # Lista de sustancias para el filtro
+    sustancias = Sustancia.objects.order_by('nombre').values_list('nombre', flat=True)
     
     context = {
         'filterset': filterset,
         'page_obj': page_obj,
         'total_consultas': total_consultas,
-        'graficos': graficos,
         'operadores': operadores,
+        'sustancias': sustancias,
     }
     return render(request, 'consultas/informes.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+async def grafico_informes_json(request, nombre):
+    """Un gráfico del panel de informes en JSON, con los mismos filtros que la página"""
+    if nombre not in GRAFICOS:
+        raise Http404('Gráfico inexistente')
+    filterset = ConsultaFilter(request.GET, queryset=Consulta.objects.all())
+    grafico = await sync_to_async(grafico_informes)(filterset, nombre, request.GET.get('periodo'))
+    return JsonResponse({'grafico': grafico})
+
+
 @login_required
 def detalle_consulta(request, pk):
     """Ver detalle de una consulta"""
-    consulta = get_object_or_404(Consulta, pk=pk)
+    consulta = get_object_or_404(Consulta.objects.select_related('narrativa', 'operador'), pk=pk)
     
     # Si no es admin, solo puede ver sus propias consultas
     if not is_admin(request.user):
-        nombre_operador = f"{request.user.last_name} {request.user.first_name}".strip()
-        if consulta.operador != nombre_operador and consulta.creado_por != request.user:
+        if request.user.pk not in (consulta.operador.usuario_id, consulta.creado_por_id):
             messages.error(request, 'No tienes permiso para ver esta consulta.')
             return redirect('mis_consultas')
     
@@ -270,44 +172,130 @@ def detalle_consulta(request, pk):
 @login_required
 @user_passes_test(is_admin)
 def exportar_datos(request):
-    """Exportar datos filtrados a CSV"""
-    import csv
-    from django.http import HttpResponse
-    
+    """Exportar datos filtrados a CSV, Parquet, Arrow o Excel (parámetro formato)"""
     filterset = ConsultaFilter(request.GET, queryset=Consulta.objects.all())
     consultas = filterset.qs
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="consultas_0800.csv"'
-    response.write('\ufeff')  # BOM para UTF-8
-    
-    writer = csv.writer(response)
+    formato = request.GET.get('formato', 'csv')
+    try:
+        verificar_formato(formato)
+    except FormatoNoDisponible as e:
+        messages.error(request, str(e))
+        return redirect('informes')
+    extension, content_type, generar, _ = FORMATOS_EXPORTACION[formato]
+    nombre = f'consultas_0800.{extension}'
     
-    # Encabezados
-    headers = [
-        'ID', 'Fecha', 'Zona', 'Operador', 'Interlocutor', 'Consulta', 'Tel. Interlocutor',
-        'Tipo Vínculo', 'Motivo', 'Usuario', 'DNI', 'Fecha Nac.', 'Edad', 'Sexo',
-        'Nacionalidad', 'Ciudad', 'Barrio', 'Dirección', 'Teléfono', 'Escolarizado',
-        'Etapa Escolar', 'Obra Social', 'Nombre OS', 'Ocupación', 'Ref. Afectiva',
-        'DNI Ref.', 'Tel. Ref.', 'Tiempo Consumo', 'Sustancia', 'Trat. Anterior',
-        'Tipo Trat. Anterior', 'Efector Salud', 'Riesgo', 'Institución Derivado',
-        'Seguimiento', 'Sit. Social', 'Car. Judicial', 'Intervención'
-    ]
-    writer.writerow(headers)
-    
-    for c in consultas:
-        writer.writerow([
-            c.id, c.fecha, c.zona, c.operador, c.apellido_nombre_interlocutor,
-            c.consulta, c.telefono_interlocutor, c.tipo_vinculo, c.motivo_consulta,
-            c.apellido_nombre_usuario, c.dni, c.fecha_nacimiento, c.edad, c.sexo,
-            c.nacionalidad, c.ciudad, c.barrio, c.direccion, c.telefono,
-            c.escolarizado, c.etapa_escolar, c.obra_social, c.nombre_obra_social,
-            c.ocupacion, c.apellido_nombre_referencia, c.dni_referencia,
-            c.telefono_referencia, c.tiempo_consumo, c.tipo_sustancia,
-            c.tratamiento_anterior, c.tipo_tratamiento_anterior,
-            c.efector_salud_referencia, c.riesgo_inminente, c.institucion_derivado,
-            c.seguimiento, c.situacion_social, c.caracteristica_judicial,
-            c.intervencion_propuesta
-        ])
+    if generar is None:
+        # Excel no se puede enviar mientras se genera: se escribe por bloques (solo
+        # escritura) en un archivo temporal, que se borra al terminar la descarga
+        archivo = tempfile.NamedTemporaryFile(suffix=f'.{extension}')
+        escribir_xlsx(consultas, archivo)
+        archivo.seek(0)
+        return FileResponse(archivo, as_attachment=True, filename=nombre, content_type=content_type)
     
+    # El archivo se genera a medida que se descarga
+    response = StreamingHttpResponse(generar(consultas), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
     return response
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def exportar_en_segundo_plano(request):
+    """Encola la exportación de los datos filtrados y muestra su progreso"""
+    formato = request.POST.get('formato', 'csv')
+    try:
+        verificar_formato(formato)
+    except FormatoNoDisponible as e:
+        messages.error(request, str(e))
+        return redirect('informes')
+    tarea = encolar(Tarea.EXPORTACION, {'filtros': request.GET.urlencode(), 'formato': formato}, request.user)
+    return redirect('detalle_tarea', pk=tarea.pk)
+
+
+@login_required
+@user_passes_test(is_admin)
+def importar_en_segundo_plano(request):
+    """Sube un CSV del formulario y encola su importación, para seguir su progreso"""
+    if request.method == 'POST':
+        form = ImportacionForm(request.POST, request.FILES)
+        if form.is_valid():
+            tarea = encolar_importacion(form.cleaned_data['archivo'], form.cleaned_data['actualizar'], request.user)
+            return redirect('detalle_tarea', pk=tarea.pk)
+    else:
+        form = ImportacionForm()
+    
+    return render(request, 'consultas/importar.html', {'form': form})
+
+
+def obtener_tarea(request, pk):
+    """Devuelve la tarea si el usuario es su creador o administrador"""
+    tarea = get_object_or_404(Tarea, pk=pk)
+    if not is_admin(request.user) and tarea.creado_por_id != request.user.pk:
+        raise Http404('Tarea inexistente')
+    return tarea
+
+
+@login_required
+def detalle_tarea(request, pk):
+    """Estado de una tarea en segundo plano"""
+    return render(request, 'consultas/tarea.html', {'tarea': obtener_tarea(request, pk)})
+
+
+@login_required
+def estado_tarea(request, pk):
+    """Estado y progreso de una tarea en JSON, para consultar periódicamente"""
+    tarea = obtener_tarea(request, pk)
+    descarga = tarea.estado == Tarea.COMPLETADA and tarea.tipo == Tarea.EXPORTACION
+    return JsonResponse({
+        'estado': tarea.estado,
+        'estado_display': tarea.get_estado_display(),
+        'procesadas': tarea.procesadas,
+        'total': tarea.total,
+        'porcentaje': tarea.porcentaje,
+        'terminada': tarea.terminada,
+        'resultado': tarea.resultado,
+        'error': tarea.error.strip().splitlines()[-1] if tarea.error else '',
+        'descarga': reverse('descargar_tarea', args=[tarea.pk]) if descarga else None,
+    })
+
+
+@login_required
+def descargar_tarea(request, pk):
+    """Descarga el archivo generado por una exportación terminada"""
+    tarea = obtener_tarea(request, pk)
+    if tarea.estado != Tarea.COMPLETADA or not tarea.archivo:
+        raise Http404('La tarea no generó un archivo')
+    try:
+        archivo = open(tarea.archivo, 'rb')
+    except FileNotFoundError:
+        raise Http404('El archivo ya no existe')
+    extension, content_type, _, _ = FORMATOS_EXPORTACION[tarea.parametros.get('formato', 'csv')]
+    return FileResponse(archivo, as_attachment=True, filename=f'consultas_0800_{tarea.pk}.{extension}', content_type=content_type)
+
+
+@login_required
+@user_passes_test(is_admin)
+def metricas(request):
+    """Latencia y consultas SQL por vista, medidas por MetricasMiddleware en este proceso"""
+    if request.method == 'POST':
+        REGISTRO.limpiar()
+        messages.info(request, 'Métricas reiniciadas.')
+        return redirect('metricas')
+    return render(request, 'consultas/metricas.html', {
+        'vistas': REGISTRO.resumen(),
+        'percentiles': PERCENTILES,
+        'cache_graficos': CACHE_GRAFICOS.estadisticas(),
+    })
+
+
+def metricas_prometheus(request):
+    """Métricas en formato de texto de Prometheus, para administradores o con el token METRICAS_TOKEN"""
+    token = settings.METRICAS_TOKEN
+    autorizacion = request.headers.get('Authorization', '')
+    con_token = bool(token) and hmac.compare_digest(autorizacion, f'Bearer {token}')
+    if not con_token and not (request.user.is_authenticated and is_admin(request.user)):
+        return HttpResponse('No autorizado', status=401, content_type='text/plain')
+    texto = texto_prometheus(caches={'graficos': CACHE_GRAFICOS})
+    return HttpResponse(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,5 @@
 """
-Script para crear usuarios de operadores existentes.
+Script para crear usuarios de los operadores que todavía no tienen uno.
 Username: primera letra del nombre + apellido (ej: vgustavo para Vogel Gustavo)
 Contraseña: Cambiar123
 """
@@ -10,24 +10,19 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema0800.settings')
 django.setup()
 
 from django.contrib.auth.models import User
-from consultas.models import Consulta
+from consultas.models import Operador
 
 
 def crear_usuarios_operadores():
-    # Obtener operadores únicos
-    operadores = Consulta.objects.exclude(
-        operador__isnull=True
-    ).exclude(
-        operador=''
-    ).values_list('operador', flat=True).distinct()
-    
-    operadores_unicos = set(operadores)
-    print(f"Operadores únicos encontrados: {len(operadores_unicos)}")
+    # Operadores sin usuario vinculado
+    operadores_sin_usuario = Operador.objects.filter(usuario__isnull=True).exclude(nombre='')
+    print(f"Operadores sin usuario: {len(operadores_sin_usuario)}")
     
     usuarios_creados = []
     usuarios_existentes = []
     
-    for operador in sorted(operadores_unicos):
+    for registro in operadores_sin_usuario:
+        operador = registro.nombre
         # Parsear nombre: "Apellido Nombre" o "Nombre Apellido"
         partes = operador.strip().split()
         
@@ -67,6 +62,9 @@ def crear_usuarios_operadores():
                 last_name=last_name,
                 email=f'{username}@sistema0800.local'
             )
+            # Vincular el operador (y con él sus consultas) al usuario nuevo
+            registro.usuario = user
+            registro.save(update_fields=['usuario'])
             usuarios_creados.append((operador, username))
             print(f"  Creado: {username} ({operador}) - {first_name} {last_name}")
             
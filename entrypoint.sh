@@ -1,7 +1,32 @@
 #!/bin/bash
 
+# SQLite en el volumen data/: no arrancar con una base vacía nueva si la de la
+# versión anterior (montada en /app/db.sqlite3) quedó fuera del volumen
+if [ "${DB_PROFILE:-sqlite}" = "sqlite" ] && [ -n "$SQLITE_PATH" ] && [ ! -f "$SQLITE_PATH" ]; then
+    if [ -f /app/db.sqlite3 ]; then
+        echo "Copiando la base anterior /app/db.sqlite3 a $SQLITE_PATH"
+        cp -p /app/db.sqlite3 "$SQLITE_PATH" || exit 1
+    elif [ "${SQLITE_CREAR:-False}" != "True" ]; then
+        echo "ERROR: no existe la base $SQLITE_PATH." >&2
+        echo "Si actualizás desde una versión que montaba ./db.sqlite3, movela a ./data/db.sqlite3 (ver README)." >&2
+        echo "Para crear una base nueva vacía, iniciá una vez con SQLITE_CREAR=True." >&2
+        exit 1
+    fi
+fi
+
 # Aplicar migraciones
 python manage.py migrate --noinput
 
+# Proceso de tareas en segundo plano (exportaciones e importaciones). Si se
+# detiene, se registra su código de salida en el log del contenedor y se
+# reinicia; al arrancar marca con error solo las tareas sin latido reciente.
+(
+    while true; do
+        python manage.py procesar_tareas 2>&1
+        echo "procesar_tareas terminó con código $?; reiniciando en 5 segundos" >&2
+        sleep 5
+    done
+) &
+
 # Iniciar Gunicorn
-exec gunicorn --bind 0.0.0.0:8000 --workers 3 sistema0800.wsgi:application
+exec gunicorn --bind 0.0.0.0:8000 --workers ${GUNICORN_WORKERS:-3} sistema0800.wsgi:application
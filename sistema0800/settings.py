@@ -30,6 +30,9 @@ ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
 
 CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', 'http://localhost:8000,http://127.0.0.1:8000').split(',')
 
+# Token para que Prometheus lea /metricas/prometheus/ sin sesión (Authorization: Bearer <token>)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
 
 # Application definition
 
@@ -47,6 +50,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Después de WhiteNoise: los archivos estáticos no se miden
+    'consultas.metricas.MetricasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,14 +82,80 @@ WSGI_APPLICATION = 'sistema0800.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DB_PROFILE elige el motor: 'sqlite' (por defecto, instalaciones chicas) o
+# 'postgresql' (producción con muchos operadores guardando a la vez)
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgresql':
+    # Pool de conexiones nativo de Django (requiere psycopg[pool]); sin pool, conexiones persistentes
+    DB_POOL = os.environ.get('DB_POOL', 'False').lower() in ('true', '1', 'yes')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'sistema0800'),
+            'USER': os.environ.get('DB_USER', 'sistema0800'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            # Verifica la conexión reutilizada antes de cada request
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+                    'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+                    'timeout': 10,
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Espera el lock de escritura en lugar de fallar con "database is locked"
+                'timeout': 20,
+                # Las transacciones toman el lock de escritura al empezar: dos
+                # escrituras concurrentes esperan su turno en lugar de fallar
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# PRAGMAs que se aplican a cada conexión de SQLite (consultas.signals).
+# Con WAL las lecturas no bloquean a las escrituras ni al revés.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
 
-DATABASES = {
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Basada en archivos por defecto para que todos los workers de Gunicorn
+# compartan la versión de datos que invalidan las señales de Consulta
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
     }
 }
 
+# Tareas en segundo plano
+# Directorio donde el comando procesar_tareas deja los archivos exportados
+
+TAREAS_DIR = Path(os.environ.get('TAREAS_DIR', BASE_DIR / 'tareas'))
+
+# Días que se conservan las tareas terminadas y sus archivos (exportados o subidos)
+TAREAS_RETENCION_DIAS = int(os.environ.get('TAREAS_RETENCION_DIAS', '7'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators